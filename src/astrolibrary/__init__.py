@@ -4,21 +4,53 @@ The numpy's main module docstring is a good example to follow:
 https://github.com/numpy/numpy/blob/main/numpy/__init__.py
 
 """
-from .data_acquisition.query_interface import QueryHandler
-from .data_acquisition.query_interface.cross_matching import cross_match
-from .data_acquisition.spectra_data_retrieval import get_spectra_data
-from .data_processing.data_preprocessing import DataPreprocessing
+from .data_acquisition.query_interface import (
+    LocalCatalog,
+    QueryCache,
+    QueryHandler,
+)
+from .data_acquisition.query_interface.cross_matching import (
+    cross_match,
+    local_cross_match,
+)
+from .data_acquisition.spectra_data_retrieval import (
+    get_spectra_data,
+    get_spectra_data_bulk,
+)
+from .data_processing.data_preprocessing import (
+    DataPreprocessing,
+    SpectrumBatch,
+)
+from .data_processing.continuum import fit_continuum
+from .data_processing.parallel import preprocess_files
+from .data_processing.pipeline import PreprocessingPipeline
+from .data_processing.spectral_store import SpectralStore
+from .data_processing.streaming_statistics import StreamingStatistics
 from .data_acquisition.query_interface.cross_matching import cross_match
 from .data_visualization.spectral_visualization import plot
-from .data_processing.metadata_extractor import MetaDataExtractor
+from .data_processing.metadata_extractor import (
+    BatchMetaDataExtractor,
+    MetaDataExtractor,
+)
 from .data_manipulation.machine_learning import MachineLearning
 
 __all__ = [
     "QueryHandler",
+    "QueryCache",
+    "LocalCatalog",
     "get_spectra_data",
+    "get_spectra_data_bulk",
     "DataPreprocessing",
+    "SpectrumBatch",
+    "fit_continuum",
+    "PreprocessingPipeline",
+    "SpectralStore",
+    "StreamingStatistics",
+    "preprocess_files",
     "cross_match",
+    "local_cross_match",
     "MetaDataExtractor",
+    "BatchMetaDataExtractor",
     "plot",
     "MachineLearning",
 ]
@@ -0,0 +1,78 @@
+"""Coalescing of identical concurrent calls.
+
+Responsibilities:
+    - `SingleFlight.do(key, function)` runs `function` once for all the
+      callers asking for the same `key` at the same time. The first caller
+      makes the call; the others wait for it, and every caller gets the same
+      result, or the same exception.
+    - Counts calls and shared calls, to measure how much duplicate load is
+      saved during fan-out bursts.
+
+Notes:
+    - Only calls that overlap in time are coalesced: once a call returns, the
+      next caller with the same key makes a new call. Caching the results is
+      left to `QueryCache` and to the files on disk.
+
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """A thread-safe group of in-flight calls, keyed by hashable keys."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict[object, Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, function):
+        """Calls `function`, unless a call with the same `key` is in flight.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifies the call. Callers with equal keys share one call.
+        function : callable
+            The call to make, taking no arguments.
+
+        Returns
+        -------
+        object
+            Whatever `function` returns, to every caller sharing the call.
+
+        Raises
+        ------
+        Exception : Whatever `function` raises, to every caller sharing the
+            call.
+
+        """
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+            else:
+                self.shared += 1
+
+        if not leader:
+            return flight.result()
+
+        try:
+            result = function()
+        except BaseException as error:
+            flight.set_exception(error)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    def stats(self) -> dict:
+        """Returns the number of calls, and how many of them were shared."""
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared}
@@ -1,4 +1,6 @@
 """ Query interface for the astrolibrary package. """
+from ._local_catalog_connector import LocalCatalog
+from ._query_cache import QueryCache
 from .query_handler import QueryHandler
 
-__all__ = ["QueryHandler"]
+__all__ = ["QueryHandler", "QueryCache", "LocalCatalog"]
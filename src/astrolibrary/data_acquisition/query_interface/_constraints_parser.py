@@ -1,7 +1,214 @@
-""" This module will parse user's constraints into a runnable query. """
+""" This module will parse user's constraints into a runnable query.
+
+Constraints are given as a dictionary, and compiled into a SQL query that
+pushes all the filtering and projection to the server, so only the needed
+rows and columns travel over the network:
+
+>>> ConstraintsParser().parse(
+...     {
+...         "table": "SpecObj",
+...         "columns": ["specobjid", "z", "class"],
+...         "where": {
+...             "z": (0.1, 0.3),            # range, bounds included
+...             "class": ["GALAXY", "QSO"], # IN-list
+...             "zWarning": 0,              # equality
+...         },
+...         "cone": {"ra": 180.0, "dec": 0.0, "radius": 2.0},  # arcmin
+...         "top": 1000,
+...     }
+... )
+
+Either bound of a range can be None to leave it open. Queries are compiled
+per *shape* (the table, columns, predicate kinds and IN-list sizes), and
+the compiled template is cached, so repeated constraints with different
+values only bind new literals.
+
+"""
+import math
+import numbers
+import re
+from functools import lru_cache
+
+_IDENTIFIER = re.compile(
+    r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$"
+)
+_KEYS = {"table", "columns", "where", "cone", "top"}
+_CONE_KEYS = {"ra", "dec", "radius", "ra_column", "dec_column"}
+
+
+def sql_literal(value) -> str:
+    """Formats a Python/NumPy scalar as a SQL literal."""
+    if isinstance(value, bytes):
+        value = value.decode("utf-8")
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real) and math.isfinite(value):
+        return repr(float(value))
+    raise ValueError(f"Cannot use {value!r} as a SQL literal.")
+
+
+def _identifier(name) -> str:
+    if not isinstance(name, str) or not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid table or column name: {name!r}.")
+    return name
 
 
 class ConstraintsParser:
     """Class for parsing user's constraints into a runnable query."""
 
-    raise NotImplementedError
+    def parse(self, constraints: dict) -> str:
+        """Compiles `constraints` into a SQL query.
+
+        Parameters
+        ----------
+        constraints : dict
+            The constraints, with the following keys:
+                - "table" (str, required): the table to query.
+                - "columns" (list of str): the columns to return. A single
+                  column may be given as a str. Defaults to all of them.
+                - "where" (dict): maps column names to a value (equality),
+                  a list of values (IN-list) or a (low, high) tuple (range).
+                - "cone" (dict): "ra", "dec" and "radius" of a cone search,
+                  in degrees, degrees and arcminutes. The "ra_column" and
+                  "dec_column" default to "ra" and "dec".
+                - "top" (int): the maximum number of rows to return.
+
+        Returns
+        -------
+        query : str
+            The compiled SQL query.
+
+        Raises
+        ------
+        ValueError : If the constraints are invalid.
+
+        """
+        if not isinstance(constraints, dict) or "table" not in constraints:
+            raise ValueError("Constraints must be a dict with a 'table' key.")
+        unknown = set(constraints) - _KEYS
+        if unknown:
+            raise ValueError(f"Unknown constraints: {sorted(unknown)}.")
+
+        shape, values = self._shape_and_values(constraints)
+        return _compile(shape).format(*values)
+
+    @staticmethod
+    def cache_info():
+        """Returns the hits and misses of the compiled query cache."""
+        return _compile.cache_info()
+
+    @staticmethod
+    def _shape_and_values(constraints: dict):
+        """Splits the constraints into a hashable shape and its literals."""
+        values = []
+
+        top = constraints.get("top")
+        if top is not None:
+            if not isinstance(top, numbers.Integral) or top < 1:
+                raise ValueError("'top' must be a positive integer.")
+            values.append(sql_literal(top))
+
+        columns = constraints.get("columns") or ()
+        if isinstance(columns, str):
+            columns = (columns,)
+        elif not isinstance(columns, (list, tuple)):
+            raise ValueError("'columns' must be a list of column names.")
+        columns = tuple(columns)
+
+        predicates = []
+        for column, condition in (constraints.get("where") or {}).items():
+            if isinstance(condition, tuple):
+                if len(condition) != 2:
+                    raise ValueError(
+                        f"Range of '{column}' must be (low, high)."
+                    )
+                bounds = tuple(bound is not None for bound in condition)
+                if not any(bounds):
+                    continue
+                predicates.append((column, "range", bounds))
+                values += [sql_literal(b) for b in condition if b is not None]
+            elif isinstance(condition, (list, set, frozenset)):
+                if not condition:
+                    raise ValueError(f"IN-list of '{column}' is empty.")
+                predicates.append((column, "in", len(condition)))
+                values += [sql_literal(value) for value in condition]
+            else:
+                predicates.append((column, "eq", None))
+                values.append(sql_literal(condition))
+
+        cone = constraints.get("cone")
+        if cone is not None:
+            if not _CONE_KEYS.issuperset(cone) or not {
+                "ra",
+                "dec",
+                "radius",
+            }.issubset(cone):
+                raise ValueError("'cone' needs 'ra', 'dec' and 'radius'.")
+            ra, dec = float(cone["ra"]), float(cone["dec"])
+            radius = float(cone["radius"]) / 60.0
+            if radius <= 0 or not -90 <= dec <= 90:
+                raise ValueError("Invalid cone center or radius.")
+            cone = (cone.get("ra_column", "ra"), cone.get("dec_column", "dec"))
+            # Dec box first, so the server can use an index on dec; then the
+            # exact test: the dot product of unit vectors is >= cos(radius).
+            values += [
+                sql_literal(max(dec - radius, -90.0)),
+                sql_literal(min(dec + radius, 90.0)),
+                sql_literal(math.sin(math.radians(dec))),
+                sql_literal(math.cos(math.radians(dec))),
+                sql_literal(math.radians(ra)),
+                sql_literal(math.cos(math.radians(radius))),
+            ]
+
+        shape = (
+            constraints["table"],
+            columns,
+            tuple(predicates),
+            cone,
+            top is not None,
+        )
+        return shape, values
+
+
+@lru_cache(maxsize=256)
+def _compile(shape) -> str:
+    """Compiles a constraints shape into a query template.
+
+    Literals are left as `{}` placeholders, filled in the order in which
+    `ConstraintsParser._shape_and_values` collected them.
+    """
+    table, columns, predicates, cone, has_top = shape
+
+    select = "SELECT TOP {} " if has_top else "SELECT "
+    projection = ", ".join(map(_identifier, columns)) if columns else "*"
+    query = f"{select}{projection} FROM {_identifier(table)}"
+
+    conditions = []
+    for column, kind, arity in predicates:
+        column = _identifier(column)
+        if kind == "eq":
+            conditions.append(f"{column} = {{}}")
+        elif kind == "in":
+            conditions.append(f"{column} IN ({', '.join(['{}'] * arity)})")
+        else:
+            has_low, has_high = arity
+            if has_low and has_high:
+                conditions.append(f"{column} BETWEEN {{}} AND {{}}")
+            elif has_low:
+                conditions.append(f"{column} >= {{}}")
+            else:
+                conditions.append(f"{column} <= {{}}")
+
+    if cone is not None:
+        ra, dec = map(_identifier, cone)
+        conditions.append(f"{dec} BETWEEN {{}} AND {{}}")
+        conditions.append(
+            f"SIN(RADIANS({dec})) * {{}} + COS(RADIANS({dec})) * {{}} "
+            f"* COS(RADIANS({ra}) - {{}}) >= {{}}"
+        )
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query
@@ -1,2 +1,123 @@
-""" A connector to the Gaia database."""
-raise NotImplementedError("This module is not yet implemented.")
+"""A connector to the Gaia archive TAP service.
+
+Responsibilities:
+    - Submits ADQL queries as asynchronous Gaia archive jobs, without waiting
+      for them to finish.
+    - Polls the phase of the job to report its status, and downloads the
+      results only when they are asked for.
+    - Error and exception handling with the Gaia archive: submissions and
+      downloads go through the same resilience policies as the SDSS
+      connector. See `_resilience` module for more details. Submissions
+      are never retried, as a failed one may still have created a job.
+
+Since `run_query` returns as soon as the job is accepted, a single process
+can keep many long Gaia jobs running in parallel without tying up a thread
+per job.
+
+"""
+import threading
+
+from astropy.table import Table
+from astroquery.gaia import Gaia
+
+from ._connector import Connector
+from ._resilience import (
+    CircuitBreaker,
+    ResilienceMetrics,
+    RetryPolicy,
+    TokenBucket,
+    resilient_call,
+)
+
+# UWS job phases, see https://www.ivoa.net/documents/UWS/.
+_ERROR_PHASES = {"ERROR", "ABORTED"}
+
+
+class GaiaConnector(Connector):
+    """A connector to the Gaia archive TAP service.
+
+    This is a concrete implementation of the `Connector` class specifically
+    for the Gaia dataset. See `Connector` module for more details.
+
+    The status of a query is "RUNNING" until its job finishes, then
+    "COMPLETED" or "ERROR". Like for `SDSSConnector`, the resilience
+    policies are class attributes shared by every connector in the process.
+
+    """
+
+    retry_policy = RetryPolicy()
+    # Not retried: a timed-out submission may still have created the job.
+    submit_retry_policy = RetryPolicy(max_attempts=1)
+    rate_limiter = TokenBucket(rate=2.0, capacity=20)
+    circuit_breaker = CircuitBreaker()
+    metrics = ResilienceMetrics()
+
+    def __init__(self):
+        """Initialize a Gaia connector."""
+        self.status: str = ""
+        self.job = None
+        self.results: Table | None = None
+        self._lock = threading.Lock()  # Guards the status and results.
+        self._download_lock = threading.Lock()
+
+    def _call(self, function, retry_policy=None):
+        return resilient_call(
+            function,
+            retry_policy=retry_policy or self.retry_policy,
+            rate_limiter=self.rate_limiter,
+            circuit_breaker=self.circuit_breaker,
+            metrics=self.metrics,
+        )
+
+    def run_query(self, query, *args, **kwargs):
+        """Submits the given ADQL query as a Gaia archive job.
+
+        Returns as soon as the job is accepted; the job keeps running on the
+        archive's side.
+        """
+        self.job = self._call(
+            lambda: Gaia.launch_job_async(query, background=True),
+            retry_policy=self.submit_retry_policy,
+        )
+        self.status = "RUNNING"
+        return self
+
+    def check_status(self):
+        """Checks the status of the job, by polling its phase if running."""
+        with self._lock:
+            if self.status == "RUNNING":
+                phase = self._call(lambda: self.job.get_phase(update=True))
+                phase = str(phase).strip().upper()
+                if phase == "COMPLETED":
+                    self.status = "COMPLETED"
+                elif phase in _ERROR_PHASES:
+                    self.status = "ERROR"
+            return self.status
+
+    def get_results(self):
+        """Gets the results of the job, waiting for it to finish if needed.
+
+        Raises
+        ------
+        ValueError : If the job failed or was aborted.
+
+        """
+        # Only one download at a time; `check_status` is not blocked by it.
+        with self._download_lock:
+            with self._lock:
+                if self.status == "ERROR":
+                    raise ValueError(f"Gaia job '{self.job.jobid}' failed.")
+                if self.results is not None or self.status not in (
+                    "RUNNING",
+                    "COMPLETED",
+                ):
+                    return self.results
+            # The job's `get_results` waits for it to end, then downloads.
+            results = self._call(self.job.get_results)
+            with self._lock:
+                self.status = "COMPLETED"
+                if results is None or not len(results):
+                    self.status = "SUCCESS_NO_RESULTS"
+                else:
+                    self.results = results
+                return self.results
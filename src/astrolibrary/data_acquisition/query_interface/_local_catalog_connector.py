@@ -0,0 +1,336 @@
+"""A connector to a local catalog, stored in an embedded SQLite database.
+
+Responsibilities:
+    - `LocalCatalog` mirrors tables locally: its `ingest` method bulk-loads
+      astropy tables, such as SDSS query results, into a SQLite database on
+      disk (or in memory).
+    - Indexes the columns used to look up spectra and objects: plate/mjd/
+      fiberid, objid-like identifiers, and ra/dec through a declination
+      `zone` column added at ingestion, as in SkyServer's zone tables.
+    - `LocalCatalogConnector` runs the same SQL as `SDSSConnector` against
+      the local catalog, so exploratory queries run in milliseconds and do
+      not use up the remote service's quota.
+
+Notes:
+    - SQL Server's `SELECT TOP n` is translated to SQLite's `LIMIT n`, and
+      the math functions used by `ConstraintsParser` (SIN, COS, RADIANS...)
+      are registered. SkyServer functions, such as `dbo.fGetNearbyObjEq`,
+      are not available locally.
+    - The database connection is shared by the catalog's users and
+      serialized with a lock.
+
+"""
+import math
+import re
+import sqlite3
+import threading
+
+import numpy as np
+from astropy.table import Table
+
+from ._connector import Connector
+
+# SkyServer's zone height, in degrees: zone = floor((dec + 90) / height).
+ZONE_HEIGHT = 30 / 3600
+
+_TOP = re.compile(r"\bSELECT\s+(DISTINCT\s+)?TOP\s+(\d+)\s+", re.IGNORECASE)
+_INDEXED_IDS = ("objid", "specobjid", "bestobjid")
+_FUNCTIONS = {
+    "SIN": (1, math.sin),
+    "COS": (1, math.cos),
+    "TAN": (1, math.tan),
+    "ASIN": (1, math.asin),
+    "ACOS": (1, math.acos),
+    "ATAN": (1, math.atan),
+    "ATN2": (2, math.atan2),
+    "RADIANS": (1, math.radians),
+    "DEGREES": (1, math.degrees),
+    "SQRT": (1, math.sqrt),
+    "SQUARE": (1, lambda x: x * x),
+    "POWER": (2, math.pow),
+    "EXP": (1, math.exp),
+    "LOG": (1, math.log),
+    "LOG10": (1, math.log10),
+    "FLOOR": (1, math.floor),
+    "CEILING": (1, math.ceil),
+    "PI": (0, lambda: math.pi),
+}
+
+
+def _null_safe(function):
+    """Wraps a SQL function to return NULL if any argument is NULL, as the
+    built-in functions of SQL Server and SQLite do."""
+
+    def wrapper(*args):
+        if any(arg is None for arg in args):
+            return None
+        return function(*args)
+
+    return wrapper
+
+
+def _quote(name: str) -> str:
+    """Quotes a table or column name."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sql_type(column) -> str:
+    if column.ndim > 1:
+        raise ValueError(f"Column '{column.name}' is not one-dimensional.")
+    kind = column.dtype.kind
+    if kind in "biu":
+        return "INTEGER"
+    if kind == "f":
+        return "REAL"
+    return "TEXT"
+
+
+def _python_values(column) -> list:
+    """Returns the values of `column` as Python objects, masked as None."""
+    values = np.asarray(column).tolist()
+    mask = getattr(column, "mask", None)
+    if mask is not None and np.any(mask):
+        values = [None if m else v for v, m in zip(values, mask.tolist())]
+    return values
+
+
+def translate_top(query: str) -> str:
+    """Translates `SELECT TOP n ...` clauses to `SELECT ... LIMIT n`.
+
+    Each LIMIT closes the (sub)query of its TOP, so nested queries such as
+    the pages of `QueryHandler.iter_query` are translated too.
+    """
+    while match := _TOP.search(query):
+        query = (
+            query[: match.start()]
+            + f"SELECT {match.group(1) or ''}"
+            + query[match.end() :]
+        )
+        # The scope of the SELECT ends at its unbalanced closing parenthesis.
+        depth, quote, end = 0, None, len(query)
+        for i in range(match.start(), len(query)):
+            char = query[i]
+            if quote:
+                quote = None if char == quote else quote
+            elif char in "'\"":
+                quote = char
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+                if depth < 0:
+                    end = i
+                    break
+        query = (
+            query[:end].rstrip().rstrip(";")
+            + f" LIMIT {match.group(2)}"
+            + query[end:]
+        )
+    return query
+
+
+class LocalCatalog:
+    """A local catalog of tables, stored in an embedded SQLite database."""
+
+    def __init__(self, path: str = ":memory:"):
+        """Open (or create) a local catalog.
+
+        Parameters
+        ----------
+        path : str, optional
+            The path to the database file. Defaults to ":memory:", a
+            catalog that lives as long as this object.
+
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        for name, (n_args, function) in _FUNCTIONS.items():
+            self._connection.create_function(
+                name, n_args, _null_safe(function), deterministic=True
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+    def tables(self) -> list[str]:
+        """Returns the names of the tables of the catalog."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' "
+                "ORDER BY name"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def ingest(self, table: Table, name: str, replace: bool = False) -> int:
+        """Bulk-loads the rows of an astropy table into the catalog.
+
+        The SQL table is created on first ingestion, then rows are
+        appended. Indexes are created on the plate/mjd/fiberid, objid,
+        specobjid and bestobjid columns, and, if the table has ra and dec
+        columns, on a `zone` column computed from dec.
+
+        Parameters
+        ----------
+        table : astropy.table.Table
+            The rows to load, e.g. the results of a `QueryHandler` query.
+        name : str
+            The name of the SQL table to load them into.
+        replace : bool, optional
+            Whether to drop the existing rows of the SQL table first.
+            Defaults to False.
+
+        Returns
+        -------
+        int
+            The number of rows loaded.
+
+        Raises
+        ------
+        ValueError : If a column is not one-dimensional, or is not in the
+            existing SQL table.
+
+        """
+        columns = {column.lower(): column for column in table.colnames}
+        data = {
+            column: _python_values(table[column]) for column in table.colnames
+        }
+        types = {column: _sql_type(table[column]) for column in table.colnames}
+        if "ra" in columns and "dec" in columns and "zone" not in columns:
+            dec = np.asarray(table[columns["dec"]], dtype=float)
+            zones = np.floor((dec + 90.0) / ZONE_HEIGHT)
+            data["zone"] = [
+                None if np.isnan(zone) else int(zone) for zone in zones
+            ]
+            types["zone"] = "INTEGER"
+
+        with self._lock, self._connection as connection:
+            if replace:
+                connection.execute(f"DROP TABLE IF EXISTS {_quote(name)}")
+            existing = {
+                row[1].lower()
+                for row in connection.execute(
+                    f"PRAGMA table_info({_quote(name)})"
+                )
+            }
+            if not existing:
+                definition = ", ".join(
+                    f"{_quote(column)} {types[column]}" for column in data
+                )
+                connection.execute(
+                    f"CREATE TABLE {_quote(name)} ({definition})"
+                )
+            else:
+                unknown = [c for c in data if c.lower() not in existing]
+                if unknown:
+                    raise ValueError(
+                        f"Columns {unknown} are not in table '{name}'."
+                    )
+
+            placeholders = ", ".join("?" * len(data))
+            connection.executemany(
+                f"INSERT INTO {_quote(name)} "
+                f"({', '.join(map(_quote, data))}) VALUES ({placeholders})",
+                zip(*data.values()),
+            )
+            # Indexes are built after the bulk load, which is much faster
+            # than maintaining them row by row.
+            indexed = existing | {column.lower() for column in data}
+            for index in self._indexes(indexed):
+                index_name = _quote(f"{name}_{'_'.join(index)}")
+                connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} "
+                    f"ON {_quote(name)} ({', '.join(map(_quote, index))})"
+                )
+        return len(table)
+
+    @staticmethod
+    def _indexes(columns: set[str]) -> list[tuple[str, ...]]:
+        """Returns the indexes to create on a table with `columns`."""
+        indexes = [(column,) for column in _INDEXED_IDS if column in columns]
+        if {"plate", "mjd", "fiberid"} <= columns:
+            indexes.append(("plate", "mjd", "fiberid"))
+        if {"zone", "ra"} <= columns:
+            indexes.append(("zone", "ra"))
+        if "dec" in columns:
+            indexes.append(("dec",))
+        return indexes
+
+    def query(self, query: str) -> Table:
+        """Runs a SQL query against the catalog.
+
+        Parameters
+        ----------
+        query : str
+            The query, in SQLite or SkyServer SQL (with `SELECT TOP n`).
+
+        Returns
+        -------
+        astropy.table.Table
+            The results. Zero-length if no row matches.
+
+        Raises
+        ------
+        ValueError : If the query is invalid.
+
+        """
+        try:
+            with self._lock:
+                cursor = self._connection.execute(translate_top(query))
+                rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            raise ValueError(f"Invalid local catalog query: {e}") from e
+
+        names = [description[0] for description in cursor.description or ()]
+        if not rows:
+            return Table(names=names)
+        return Table(rows=rows, names=names)
+
+
+class LocalCatalogConnector(Connector):
+    """A connector to a `LocalCatalog`.
+
+    This is a concrete implementation of the `Connector` class for local
+    catalogs. See `Connector` module for more details.
+    """
+
+    def __init__(self, catalog: LocalCatalog):
+        """Initialize a connector to the given `catalog`."""
+        self.catalog = catalog
+        self.status: str = ""
+        self.results: Table = Table()
+
+    def run_query(self, query, *args, **kwargs):
+        """Runs the given query against the local catalog."""
+        try:
+            self.results = self.catalog.query(query)
+        except ValueError:
+            self.status = "ERROR"
+            raise
+
+        if not self.results:
+            self.status = "SUCCESS_NO_RESULTS"
+            self.results = None
+            return self
+
+        self.status = "COMPLETED"
+        return self
+
+    def check_status(self):
+        """Checks the status of the given query ID."""
+        return self.status
+
+    def get_results(self):
+        """Gets the results of the given query ID."""
+        return self.results
@@ -0,0 +1,326 @@
+"""A persistent, on-disk cache for query results.
+
+Responsibilities:
+    - Maps a dataset name and a query to a stable cache key. Queries are
+      normalized first (whitespace collapsed and case folded outside of
+      quoted literals), so cosmetic differences between otherwise identical
+      queries still hit the cache.
+    - Stores result tables as binary FITS files in a local directory, so they
+      can be shared between processes and jobs running on the same machine.
+    - Honors a per-entry time-to-live (TTL) and evicts the least recently used
+      entries once the cache grows past its byte budget.
+    - Keeps hit/miss/byte counters, to measure how much load the cache takes
+      off the remote services.
+
+Notes:
+    - Case folding assumes case-insensitive keywords and regular
+      identifiers, as in SDSS SkyServer (SQL Server), Gaia (ADQL) and
+      SQLite queries. String literals and delimited identifiers are kept
+      verbatim: comparisons such as `class = 'GALAXY'` may be case-sensitive.
+    - The index is a small JSON file written atomically next to the cached
+      tables. Concurrent processes sharing a directory may lose each other's
+      recency updates, but never see a partially written table.
+
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from astropy.table import Table
+
+from ._connector import Connector
+
+_WHITESPACE = re.compile(r"\s+")
+# Single-quoted string literals and double-quoted identifiers, with their
+# quotes escaped by doubling.
+_QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+_INDEX_FILE = "index.json"
+
+
+def normalize_query(query: str) -> str:
+    """Normalizes a query so that equivalent queries share a cache key.
+
+    Parameters
+    ----------
+    query : str
+        The query to normalize.
+
+    Returns
+    -------
+    str
+        The query with runs of whitespace collapsed to a single space,
+        leading/trailing whitespace removed, and case folded. Quoted string
+        literals and identifiers are left unchanged.
+
+    Examples
+    --------
+    >>> normalize_query("SELECT  TOP 10\\n  z FROM specObj")
+    'select top 10 z from specobj'
+    >>> normalize_query("SELECT z FROM specObj WHERE class = 'GALAXY'")
+    "select z from specobj where class = 'GALAXY'"
+
+    """
+    parts = []
+    start = 0
+    for literal in _QUOTED.finditer(query):
+        parts.append(_fold(query[start : literal.start()]))
+        parts.append(literal.group())
+        start = literal.end()
+    parts.append(_fold(query[start:]))
+    return "".join(parts).strip()
+
+
+def _fold(text: str) -> str:
+    """Collapses the whitespace of unquoted query text and folds its case."""
+    return _WHITESPACE.sub(" ", text).casefold()
+
+
+class QueryCache:
+    """A size-bounded, persistent LRU cache of query results."""
+
+    def __init__(
+        self,
+        cache_dir: str | None = None,
+        max_bytes: int = 512 * 1024**2,
+        ttl: float = 24 * 60 * 60,
+    ):
+        """Initialize a query cache stored in `cache_dir`.
+
+        Parameters
+        ----------
+        cache_dir : str, optional
+            Directory where cached tables are stored. It is created if it does
+            not exist. Defaults to `~/.astrolibrary/query_cache`.
+        max_bytes : int, optional
+            The byte budget of the cache. Least recently used entries are
+            evicted once the cached tables exceed it. Defaults to 512 MiB.
+        ttl : float, optional
+            Default time-to-live of an entry, in seconds. Defaults to a day.
+
+        Raises
+        ------
+        ValueError : If `max_bytes` or `ttl` is negative.
+
+        """
+        if max_bytes < 0 or ttl < 0:
+            raise ValueError("`max_bytes` and `ttl` must be non-negative.")
+
+        self.cache_dir = cache_dir or os.path.join(
+            os.path.expanduser("~"), ".astrolibrary", "query_cache"
+        )
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._index: dict[str, dict] = self._load_index()
+
+    @staticmethod
+    def key(dataset_name: str, query: str) -> str:
+        """Returns the cache key of `query` run against `dataset_name`."""
+        payload = f"{dataset_name.casefold()}\0{normalize_query(query)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, dataset_name: str, query: str) -> Table | None:
+        """Gets the cached results of `query`, if any.
+
+        Parameters
+        ----------
+        dataset_name : str
+            The name of the dataset the query runs against.
+        query : str
+            The query whose results to look up.
+
+        Returns
+        -------
+        astropy.table.Table or None
+            The cached results, or None if the query is not cached or its
+            entry has expired.
+
+        """
+        key = self.key(dataset_name, query)
+        with self._lock:
+            entry = self._index.get(key)
+            now = time.time()
+            if entry is None or entry["expires"] <= now:
+                if entry is not None:
+                    self._remove(key)
+                    self._save_index()
+                self.misses += 1
+                return None
+
+            try:
+                results = Table.read(self._path(key), format="fits")
+            except (OSError, ValueError):
+                # The table was removed or corrupted behind our back.
+                self._remove(key)
+                self._save_index()
+                self.misses += 1
+                return None
+
+            entry["last_access"] = now
+            self._save_index()
+            self.hits += 1
+            self.bytes_read += entry["size"]
+            return results
+
+    def put(
+        self,
+        dataset_name: str,
+        query: str,
+        results: Table,
+        ttl: float | None = None,
+    ):
+        """Stores the `results` of `query` in the cache.
+
+        Parameters
+        ----------
+        dataset_name : str
+            The name of the dataset the query ran against.
+        query : str
+            The query that produced `results`.
+        results : astropy.table.Table
+            The results to cache.
+        ttl : float, optional
+            Time-to-live of this entry, in seconds. Defaults to `self.ttl`.
+
+        """
+        key = self.key(dataset_name, query)
+        ttl = self.ttl if ttl is None else ttl
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            results.write(tmp_path, format="fits", overwrite=True)
+            size = os.path.getsize(tmp_path)
+            if size > self.max_bytes:
+                return  # Would evict everything else and itself.
+            with self._lock:
+                os.replace(tmp_path, self._path(key))
+                now = time.time()
+                self._index[key] = {
+                    "size": size,
+                    "expires": now + ttl,
+                    "last_access": now,
+                }
+                self.bytes_written += size
+                self._evict()
+                self._save_index()
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+            self._save_index()
+
+    @property
+    def size(self) -> int:
+        """The number of bytes currently used by cached tables."""
+        return sum(entry["size"] for entry in self._index.values())
+
+    def stats(self) -> dict:
+        """Returns the cache counters.
+
+        Returns
+        -------
+        dict
+            A dictionary with the `hits`, `misses`, `hit_rate`, `bytes_read`,
+            `bytes_written`, `evictions`, `entries` and `size` of the cache.
+
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "size": self.size,
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.fits")
+
+    def _remove(self, key: str):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """Drops expired entries, then least recently used ones."""
+        now = time.time()
+        for key in [k for k, e in self._index.items() if e["expires"] <= now]:
+            self._remove(key)
+            self.evictions += 1
+
+        size = self.size
+        by_recency = sorted(
+            self._index, key=lambda k: self._index[k]["last_access"]
+        )
+        for key in by_recency:
+            if size <= self.max_bytes:
+                break
+            size -= self._index[key]["size"]
+            self._remove(key)
+            self.evictions += 1
+
+    def _load_index(self) -> dict[str, dict]:
+        try:
+            with open(os.path.join(self.cache_dir, _INDEX_FILE)) as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return {
+            k: e for k, e in index.items() if os.path.exists(self._path(k))
+        }
+
+    def _save_index(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(self._index, file)
+        os.replace(tmp_path, os.path.join(self.cache_dir, _INDEX_FILE))
+
+
+class CachedConnector(Connector):
+    """A connector whose results were served from a `QueryCache`.
+
+    It never reaches a remote service: it only wraps the cached results so
+    that `QueryHandler` can treat cache hits like any other job.
+
+    """
+
+    def __init__(self, results: Table):
+        """Initialize a connector holding cached `results`."""
+        self.status: str = "COMPLETED"
+        self.results: Table = results
+
+    def run_query(self, query, *args, **kwargs):
+        """Returns itself: the results are already available."""
+        return self
+
+    def check_status(self):
+        """Checks the status of the cached query. Always "COMPLETED"."""
+        return self.status
+
+    def get_results(self):
+        """Gets the cached results."""
+        return self.results
@@ -0,0 +1,341 @@
+"""Resilience policies for connectors to remote services.
+
+Responsibilities:
+    - `RetryPolicy`: retries transient failures (timeouts, connection errors,
+      5xx and 429 responses) with exponential backoff and full jitter.
+    - `TokenBucket`: a thread-safe rate limiter. A connector class shares one
+      bucket between all of its instances, so the whole process stays within
+      the rate allowed by the remote service.
+    - `CircuitBreaker`: fails fast with `CircuitOpenError` while the remote
+      service keeps failing, and lets a single trial call through once the
+      reset timeout has elapsed.
+    - `ResilienceMetrics`: counters of calls, retries, throttle waits and
+      short-circuited calls.
+
+`resilient_call` combines all of the above around a single remote call. The
+clock, sleep and random functions are injectable, so every policy can be
+tested without waiting.
+
+"""
+import random
+import threading
+import time
+
+import requests
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because the circuit is open."""
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether `error` is worth retrying.
+
+    Parameters
+    ----------
+    error : BaseException
+        The error raised by a remote call.
+
+    Returns
+    -------
+    bool
+        True for timeouts, connection errors, and HTTP 429 or 5xx responses.
+
+    """
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = getattr(error.response, "status_code", None)
+        return status is not None and (status == 429 or status >= 500)
+    return isinstance(
+        error,
+        (
+            requests.exceptions.Timeout,
+            requests.exceptions.ConnectionError,
+            TimeoutError,
+            ConnectionError,
+        ),
+    )
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        sleep=time.sleep,
+        random=random.random,
+    ):
+        """Initialize a retry policy.
+
+        Parameters
+        ----------
+        max_attempts : int, optional
+            The maximum number of attempts, including the first one.
+            Defaults to 4.
+        base_delay : float, optional
+            The backoff ceiling of the first retry, in seconds. It doubles
+            with every retry. Defaults to 0.5.
+        max_delay : float, optional
+            The largest backoff ceiling, in seconds. Defaults to 30.
+        sleep : callable, optional
+            The function used to wait. Defaults to `time.sleep`.
+        random : callable, optional
+            Returns a float in [0, 1). Defaults to `random.random`.
+
+        Raises
+        ------
+        ValueError : If `max_attempts` is less than 1 or a delay is negative.
+
+        """
+        if max_attempts < 1 or base_delay < 0 or max_delay < 0:
+            raise ValueError("Invalid retry policy parameters.")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.random = random
+
+    def delay(self, retry: int) -> float:
+        """Returns the backoff before the `retry`-th retry (0-based)."""
+        ceiling = min(self.max_delay, self.base_delay * 2**retry)
+        return self.random() * ceiling
+
+
+class TokenBucket:
+    """A thread-safe token-bucket rate limiter."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        """Initialize a full bucket.
+
+        Parameters
+        ----------
+        rate : float
+            The number of tokens added per second.
+        capacity : float
+            The maximum number of tokens, i.e. the largest burst of calls.
+        clock : callable, optional
+            Returns the current time in seconds. Defaults to
+            `time.monotonic`.
+        sleep : callable, optional
+            The function used to wait. Defaults to `time.sleep`.
+
+        Raises
+        ------
+        ValueError : If `rate` or `capacity` is not positive.
+
+        """
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("`rate` and `capacity` must be positive.")
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Takes `tokens` from the bucket, waiting for them if needed.
+
+        Returns
+        -------
+        float
+            The number of seconds spent waiting.
+
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate,
+                )
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait = (tokens - self._tokens) / self.rate
+            self.sleep(wait)
+            waited += wait
+
+
+class CircuitBreaker:
+    """Fails fast while a remote service keeps failing."""
+
+    CLOSED, OPEN, HALF_OPEN = "CLOSED", "OPEN", "HALF_OPEN"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock=time.monotonic,
+    ):
+        """Initialize a closed circuit breaker.
+
+        Parameters
+        ----------
+        failure_threshold : int, optional
+            The number of consecutive failures that opens the circuit.
+            Defaults to 5.
+        reset_timeout : float, optional
+            The number of seconds the circuit stays open before a trial call
+            is let through. Defaults to 30.
+        clock : callable, optional
+            Returns the current time in seconds. Defaults to
+            `time.monotonic`.
+
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raises `CircuitOpenError` if the call must not go through."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if (
+                self.state == self.OPEN
+                and self.clock() - self._opened_at >= self.reset_timeout
+            ):
+                self.state = self.HALF_OPEN  # Let this single call through.
+                return
+            raise CircuitOpenError(
+                "The remote service is unavailable; failing fast."
+            )
+
+    def record_success(self):
+        """Closes the circuit."""
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        """Counts a failure, opening the circuit past the threshold."""
+        with self._lock:
+            self._failures += 1
+            if (
+                self.state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+
+
+class ResilienceMetrics:
+    """Thread-safe counters of the resilience policies."""
+
+    _FIELDS = (
+        "calls",
+        "retries",
+        "failures",
+        "short_circuits",
+        "throttle_waits",
+        "throttle_wait_seconds",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def increment(self, field: str, amount: float = 1):
+        """Adds `amount` to the counter `field`."""
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def reset(self):
+        """Sets every counter back to zero."""
+        with self._lock:
+            for field in self._FIELDS:
+                setattr(self, field, 0)
+
+    def snapshot(self) -> dict:
+        """Returns a copy of the counters."""
+        with self._lock:
+            return {field: getattr(self, field) for field in self._FIELDS}
+
+
+def resilient_call(
+    function,
+    retry_policy: RetryPolicy,
+    rate_limiter: TokenBucket | None = None,
+    circuit_breaker: CircuitBreaker | None = None,
+    metrics: ResilienceMetrics | None = None,
+):
+    """Calls `function` under the given resilience policies.
+
+    Each attempt first goes through the circuit breaker, then waits for a
+    token from the rate limiter. Transient errors are retried with backoff;
+    any other error is raised right away.
+
+    Parameters
+    ----------
+    function : callable
+        The remote call, taking no arguments.
+    retry_policy : RetryPolicy
+        How to retry transient errors.
+    rate_limiter : TokenBucket, optional
+        Limits the rate of attempts.
+    circuit_breaker : CircuitBreaker, optional
+        Fails fast while the service is down.
+    metrics : ResilienceMetrics, optional
+        Collects counters about the call.
+
+    Returns
+    -------
+    object
+        Whatever `function` returns.
+
+    Raises
+    ------
+    CircuitOpenError : If the circuit breaker rejects an attempt.
+    Exception : The last error raised by `function`.
+
+    """
+    metrics = metrics or ResilienceMetrics()
+    metrics.increment("calls")
+    for attempt in range(retry_policy.max_attempts):
+        if circuit_breaker is not None:
+            try:
+                circuit_breaker.before_call()
+            except CircuitOpenError:
+                metrics.increment("short_circuits")
+                raise
+        if rate_limiter is not None:
+            waited = rate_limiter.acquire()
+            if waited:
+                metrics.increment("throttle_waits")
+                metrics.increment("throttle_wait_seconds", waited)
+
+        try:
+            result = function()
+        except Exception as error:
+            if not is_transient(error):
+                # The service answered; the call itself is at fault.
+                if circuit_breaker is not None:
+                    circuit_breaker.record_success()
+                raise
+            metrics.increment("failures")
+            if circuit_breaker is not None:
+                circuit_breaker.record_failure()
+            if attempt + 1 == retry_policy.max_attempts:
+                raise
+            metrics.increment("retries")
+            retry_policy.sleep(retry_policy.delay(attempt))
+        else:
+            if circuit_breaker is not None:
+                circuit_breaker.record_success()
+            return result
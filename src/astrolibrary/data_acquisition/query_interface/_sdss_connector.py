@@ -2,8 +2,10 @@
 
 Responsibilities:
     - Manages the connection and communication with the SDSS API.
-    - Error and exeption handling with the SDSS API. Can be extended to
-        handle retries, etc.
+    - Error and exeption handling with the SDSS API: transient errors are
+        retried with exponential backoff and jitter, calls are rate limited
+        process-wide, and a circuit breaker fails fast while SkyServer is
+        down. See `_resilience` module for more details.
 
 """
 
@@ -11,6 +13,13 @@ from astropy.table import Table
 from astroquery.sdss import SDSS
 
 from ._connector import Connector
+from ._resilience import (
+    CircuitBreaker,
+    ResilienceMetrics,
+    RetryPolicy,
+    TokenBucket,
+    resilient_call,
+)
 
 
 class SDSSConnector(Connector):
@@ -19,8 +28,19 @@ class SDSSConnector(Connector):
     This is a concrete implementation of the `Connector` class specifically
     for the SDSS dataset. See `Connector` module for more details.
 
+    The resilience policies are class attributes, shared by every connector
+    in the process. They can be replaced to tune them, e.g. in tests:
+
+    >>> SDSSConnector.retry_policy = RetryPolicy(max_attempts=2)
+
     """
 
+    # SkyServer allows 60 queries per minute per client.
+    retry_policy = RetryPolicy()
+    rate_limiter = TokenBucket(rate=1.0, capacity=60)
+    circuit_breaker = CircuitBreaker()
+    metrics = ResilienceMetrics()
+
     def __init__(self):
         """Initialize an SDSS connector."""
         self.status: str = ""
@@ -28,10 +48,13 @@ class SDSSConnector(Connector):
 
     def run_query(self, query, *args, **kwargs):
         """Runs the given query against the SDSS database."""
-        try:
-            self.results = SDSS.query_sql(query)
-        except Exception as e:
-            raise e
+        self.results = resilient_call(
+            lambda: SDSS.query_sql(query),
+            retry_policy=self.retry_policy,
+            rate_limiter=self.rate_limiter,
+            circuit_breaker=self.circuit_breaker,
+            metrics=self.metrics,
+        )
 
         if not self.results:
             self.status = "SUCCESS_NO_RESULTS"
@@ -1,15 +1,34 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
+from astropy.table import Table, unique, vstack
 from astroquery.gaia import Gaia
 from astroquery.sdss import SDSS
+from scipy.spatial import cKDTree
+
+# Neighbours fetched per source by `local_cross_match` before falling back to
+# an exhaustive radius search.
+_NEIGHBOURS_K = 8
 
 """ Cross Matching Module
 Allows end user to cross-reference astronomical objects
 from the SDSS and Gaia catalogs, prioritizing match purity. 
 Percise criteria is based on the angular distance.
+Large lists of identifiers can be split into batches that are submitted
+to the Gaia archive concurrently. When both catalogs are available
+locally, `local_cross_match` matches them by position without any
+network access.
 """
 
 
-def cross_match(spec_objid_list, angular_distance_max=2.0, *args):
+def cross_match(
+    spec_objid_list,
+    angular_distance_max=2.0,
+    *args,
+    batch_size=None,
+    max_workers=4,
+):
     """
             Parameters
             ----------
@@ -20,6 +39,17 @@ def cross_match(spec_objid_list, angular_distance_max=2.0, *args):
                 - Describes the maximim angular distance between a Gaia source and the external catalouge SDSS.
                 - Measures the degree of separation bewtween celestial objects measured in arcseconds.
                 - Default maximum is 2.00 arcseconds.
+
+            batch_size: optional int
+                - Maximum number of identifiers per Gaia query.
+                - When the list is longer, it is split into batches that are
+                  queried concurrently, and the results are merged and
+                  deduplicated into one table.
+                - Default is None: all identifiers go into a single query.
+
+            max_workers: optional int
+                - Maximum number of batches in flight at the same time.
+                - Default is 4.
             Returns
             -------
             Astropy Table
@@ -38,7 +68,14 @@ def cross_match(spec_objid_list, angular_distance_max=2.0, *args):
         Output wil be a table with the following columns:
         source_id, clean_sdssdr13_oid, original_ext_source_id,
         angular_distance, number_of_neighbours, number_of_mates xm_flag arcsec
- 
+
+    Batch report:
+        `table.meta["batch_report"]` holds one dictionary per batch, a single
+        one when the list is not split, with its index (`batch`), number of
+        identifiers (`size`), number of matches (`rows`) and the time spent
+        on the Gaia job in seconds (`seconds`), to tune `batch_size` and
+        `max_workers` against the archive limits.
+
     """
 
     # Check for empty input
@@ -59,6 +96,10 @@ def cross_match(spec_objid_list, angular_distance_max=2.0, *args):
     if args:
         raise ValueError("Too many positional arguments. Expected at most 2.")
 
+    # Check the batching parameters, whichever path runs the query
+    if (batch_size is not None and batch_size < 1) or max_workers < 1:
+        raise ValueError("batch_size and max_workers must be positive")
+
     # Check for negative values in spec_objid_list
     if (
         spec_objid_list
@@ -70,11 +111,197 @@ def cross_match(spec_objid_list, angular_distance_max=2.0, *args):
         if sort_spec_objid_list[0] < 0:
             raise ValueError("specObjID values cannot be negative")
 
-    str_objid = ",".join(map(str, spec_objid_list))
-    query = f"SELECT * FROM gaiadr3.sdssdr13_best_neighbour WHERE angular_distance < {angular_distance_max} AND original_ext_source_id IN ({str_objid})"
+    if batch_size is not None and len(spec_objid_list) > batch_size:
+        return _batched_cross_match(
+            spec_objid_list, angular_distance_max, batch_size, max_workers
+        )
+
+    start = time.perf_counter()
+    query = _best_neighbour_query(spec_objid_list, angular_distance_max)
     run_query = Gaia.launch_job_async(query)
     if run_query:
-        return run_query.get_results()
+        table = run_query.get_results()
+        table.meta["batch_report"] = [
+            {
+                "batch": 0,
+                "size": len(spec_objid_list),
+                "rows": len(table),
+                "seconds": time.perf_counter() - start,
+            }
+        ]
+        return table
     print("No matches were found")
     return None
 
+
+def _best_neighbour_query(spec_objid_list, angular_distance_max):
+    """Builds the ADQL query matching the identifiers against Gaia."""
+    str_objid = ",".join(map(str, spec_objid_list))
+    return (
+        "SELECT * FROM gaiadr3.sdssdr13_best_neighbour "
+        f"WHERE angular_distance < {angular_distance_max} "
+        f"AND original_ext_source_id IN ({str_objid})"
+    )
+
+
+def _batched_cross_match(
+    spec_objid_list, angular_distance_max, batch_size, max_workers
+):
+    """Cross-matches the identifiers in concurrent batches of `batch_size`."""
+    unique_ids = list(dict.fromkeys(spec_objid_list))
+    batches = [
+        unique_ids[start : start + batch_size]
+        for start in range(0, len(unique_ids), batch_size)
+    ]
+
+    def run_batch(batch):
+        start = time.perf_counter()
+        query = _best_neighbour_query(batch, angular_distance_max)
+        results = Gaia.launch_job_async(query).get_results()
+        return results, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        outcomes = list(executor.map(run_batch, batches))
+
+    report = [
+        {"batch": i, "size": len(batch), "rows": len(results), "seconds": t}
+        for i, (batch, (results, t)) in enumerate(zip(batches, outcomes))
+    ]
+    table = vstack([results for results, _ in outcomes])
+    if len(table):
+        table = unique(
+            table, keys=["source_id", "original_ext_source_id"], keep="first"
+        )
+    else:
+        print("No matches were found")
+    table.meta["batch_report"] = report
+    return table
+
+
+def local_cross_match(
+    sdss_table,
+    gaia_table,
+    angular_distance_max=2.0,
+    *,
+    sdss_id_column="objid",
+    gaia_id_column="source_id",
+    ra_column="ra",
+    dec_column="dec",
+):
+    """
+            Cross-matches two local catalogs by position.
+
+            Each SDSS source is paired with its nearest Gaia source, if one
+            lies within `angular_distance_max`. Positions are converted to
+            unit vectors and indexed with a KD-tree, so the search runs in
+            O(n log n) without any round trip to the Gaia archive.
+
+            Parameters
+            ----------
+            sdss_table: Astropy Table or pd.DataFrame
+                - SDSS sources, e.g. the results of a `QueryHandler` query.
+                - Must contain the `sdss_id_column`, `ra_column` and
+                  `dec_column` columns, with coordinates in degrees.
+
+            gaia_table: Astropy Table or pd.DataFrame
+                - Gaia sources, e.g. a local extract of gaiadr3.gaia_source.
+                - Must contain the `gaia_id_column`, `ra_column` and
+                  `dec_column` columns, with coordinates in degrees.
+
+            angular_distance_max: optional float
+                - Maximum angular distance of a match, in arcseconds.
+                - Default maximum is 2.00 arcseconds.
+
+            sdss_id_column, gaia_id_column, ra_column, dec_column: optional str
+                - Names of the identifier and coordinate columns.
+                - Defaults are "objid", "source_id", "ra" and "dec".
+            Returns
+            -------
+            Astropy Table
+                Table of best-neighbour pairs, with the same columns as
+                `cross_match`: source_id, clean_sdssdr13_oid,
+                original_ext_source_id, angular_distance (arcsec),
+                number_of_neighbours, number_of_mates and xm_flag.
+
+                number_of_neighbours counts the Gaia sources within
+                `angular_distance_max` of the SDSS source; number_of_mates
+                counts the other SDSS sources sharing the same best
+                neighbour. xm_flag is always 0: the archive's match quality
+                flags are not reproduced locally.
+
+            Example Usage
+            -------------
+                >>>> from astrolibrary import local_cross_match
+                >>>> table = local_cross_match(sdss_results, gaia_extract, 1.0)
+    """
+    if angular_distance_max <= 0:
+        raise ValueError("angular_distance_max must be positive")
+    for table, columns in (
+        (sdss_table, (sdss_id_column, ra_column, dec_column)),
+        (gaia_table, (gaia_id_column, ra_column, dec_column)),
+    ):
+        names = getattr(table, "colnames", None) or list(table.columns)
+        missing = [column for column in columns if column not in names]
+        if missing:
+            raise ValueError(f"Missing required columns: {missing}")
+
+    sdss_ids = np.asarray(sdss_table[sdss_id_column])
+    gaia_ids = np.asarray(gaia_table[gaia_id_column])
+    sdss_xyz = _unit_vectors(sdss_table[ra_column], sdss_table[dec_column])
+    gaia_xyz = _unit_vectors(gaia_table[ra_column], gaia_table[dec_column])
+
+    # On the unit sphere, an angle theta spans a chord of 2 sin(theta / 2).
+    radius = np.radians(angular_distance_max / 3600.0)
+    chord = 2.0 * np.sin(radius / 2.0)
+
+    if len(sdss_xyz) and len(gaia_xyz):
+        tree = cKDTree(gaia_xyz, balanced_tree=False, compact_nodes=False)
+        # One k-nearest query gives both the best neighbour and, for all but
+        # the most crowded sources, the number of neighbours in the radius.
+        distance, index = tree.query(
+            sdss_xyz, k=_NEIGHBOURS_K, distance_upper_bound=chord
+        )
+        matched = np.flatnonzero(np.isfinite(distance[:, 0]))
+        separation = _chord_to_arcsec(distance[matched, 0])
+        # Same strict inequality as the archive query.
+        keep = separation < angular_distance_max
+        matched, separation = matched[keep], separation[keep]
+        best = index[matched, 0]
+
+        neighbours = np.isfinite(distance[matched]).sum(axis=1)
+        crowded = np.flatnonzero(neighbours == _NEIGHBOURS_K)
+        if len(crowded):
+            neighbours[crowded] = tree.query_ball_point(
+                sdss_xyz[matched[crowded]], chord, return_length=True
+            )
+        mates = np.bincount(best, minlength=len(gaia_xyz))[best] - 1
+    else:
+        matched = best = neighbours = mates = np.zeros(0, dtype=np.int64)
+        separation = np.zeros(0)
+
+    return Table(
+        {
+            "source_id": gaia_ids[best],
+            "clean_sdssdr13_oid": sdss_ids[matched],
+            "original_ext_source_id": sdss_ids[matched],
+            "angular_distance": separation,
+            "number_of_neighbours": np.asarray(neighbours, dtype=np.int32),
+            "number_of_mates": np.asarray(mates, dtype=np.int32),
+            "xm_flag": np.zeros(len(matched), dtype=np.int16),
+        }
+    )
+
+
+def _unit_vectors(ra, dec):
+    """Converts RA/Dec in degrees into an (n, 3) array of unit vectors."""
+    ra = np.radians(np.asarray(ra, dtype=np.float64))
+    dec = np.radians(np.asarray(dec, dtype=np.float64))
+    cos_dec = np.cos(dec)
+    return np.column_stack(
+        (cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec))
+    )
+
+
+def _chord_to_arcsec(chord):
+    """Converts chord lengths on the unit sphere into angles in arcsec."""
+    return np.degrees(2.0 * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))) * 3600.0
@@ -2,9 +2,15 @@
 
 Allows end-users to:
     - Instantiate a query handler for a given dataset: SDSS, for example.
-    - Run a query.
+    - Run a query, written in SQL or as structured constraints (ranges,
+      IN-lists, cone regions, projections and TOP limits) that are compiled
+      to SQL and filtered on the server.
     - Check the status of a query, useful for long-running queries.
     - Get the results of a query.
+    - Stream the results of a large query in bounded-size chunks with
+      `iter_query`.
+    - Optionally, cache the results of repeated queries on local disk through
+      a `QueryCache`.
 
 Advantages/Design Considerations:
     - Make the library more user-friendly, as the users only interact with the
@@ -17,19 +23,48 @@ Advantages/Design Considerations:
       the existing codebase.
     - Can be easily extended to support users' own provided datasets in
       addition to core ones like SDSS.
+    - Queries are asynchronous: `run_query` submits the query to a bounded
+      pool of worker threads and returns its `query_id` right away. Each job
+      gets its own connector, so many queries can be in flight at once
+      without overwriting each other's status or results.
+    - Identical queries (up to whitespace and case) running at the same time,
+      from any handler of the process, share a single call to the dataset's
+      service and get the same results or error.
 
 Limitations and Future Work:
-    - Currently, supports SDSS dataset through the `SDSSConnector` class, but
-      can be extended to support other datasets as explained above.
-    - Currently, the `QueryHandler` supports synchronous queries only, but the
-      design can be extended to support asynchronous queries as well.
-      This means `run_query` will wait for the query to finish and sets
-      the appropriate attributes.
+    - Currently, supports SDSS and Gaia datasets through the `SDSSConnector`
+      and `GaiaConnector` classes, and local mirrors of their tables through
+      the `LocalCatalogConnector` class, but can be extended to support
+      other datasets as explained above.
+    - Gaia queries run as jobs on the archive: their worker only submits the
+      job, so the handler's pool is never tied up by long Gaia queries.
+      Their results are downloaded, and cached, by `get_results`.
+    - Jobs are kept in memory for the lifetime of the handler; there is no
+      way to resume a job from another process.
 
 """
+import os
+import re
+import time
+import uuid
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+
 from astropy.table import Table
+from ._gaia_connector import GaiaConnector
+from ._local_catalog_connector import LocalCatalogConnector
 from ._sdss_connector import SDSSConnector
 from ._connector import Connector
+from ._constraints_parser import ConstraintsParser, sql_literal
+from ._query_cache import CachedConnector, QueryCache, normalize_query
+from .._single_flight import SingleFlight
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_POLL_INTERVAL = 1.0
+
+# Shared by every handler of the process, so identical queries running at the
+# same time reach the dataset's service only once.
+_QUERY_FLIGHTS = SingleFlight()
 
 
 class QueryHandler:
@@ -38,14 +73,31 @@ class QueryHandler:
     def __init__(
         self,
         dataset_name: str,
+        cache: QueryCache | None = None,
+        max_workers: int = 8,
+        **connector_kwargs,
     ):
         """Initialize a query handler for a given `dataset_name`.
 
         Parameters
         ----------
         dataset_name : str
-            The name of the dataset to query. Currently, only "SDSS" is
-            supported.
+            The name of the dataset to query: "SDSS" (SQL), "Gaia" (ADQL)
+            or "Local" (SQL, against a `LocalCatalog` given as `catalog`).
+        cache : QueryCache, optional
+            An on-disk cache of query results. When given, queries whose
+            results are cached are served locally instead of reaching the
+            dataset's service, and new results are added to the cache when
+            they are first fetched by `get_results`. The results of a
+            "Local" dataset are cached per catalog file; queries against
+            in-memory catalogs are not cached.
+        max_workers : int, optional
+            The maximum number of queries running at the same time. Further
+            queries wait in line for a free worker. Defaults to 8.
+        **connector_kwargs : dict
+            Keyword arguments of the dataset's connector, e.g. `catalog` for
+            the "Local" dataset.
+
         Returns
         -------
         QueryHandler
@@ -54,18 +106,64 @@ class QueryHandler:
 
         Raises
         ------
-        ValueError : If the given `dataset_name` is not supported/valid.
+        ValueError : If the given `dataset_name` is not supported/valid, if
+            the "Local" dataset is not given a `catalog`, or if `max_workers`
+            is not positive.
 
         """
         match dataset_name:
             case "SDSS":
-                self.connector = SDSSConnector()
+                self.connector_class = SDSSConnector
+            case "Gaia":
+                self.connector_class = GaiaConnector
+            case "Local":
+                if "catalog" not in connector_kwargs:
+                    raise ValueError("The 'Local' dataset needs a `catalog`.")
+                self.connector_class = LocalCatalogConnector
             # With software extensibility in mind, we can add more datasets
             # support here.
             case _:
                 raise ValueError(f"Dataset '{dataset_name}' is not supported.")
 
-        self.jobs: dict[str, Connector] = {}
+        if max_workers < 1:
+            raise ValueError("`max_workers` must be a positive integer.")
+
+        # Cached results are keyed by dataset, and local ones by catalog.
+        self._cache_name = dataset_name
+        if dataset_name == "Local":
+            path = str(connector_kwargs["catalog"].path)
+            if path == ":memory:":
+                cache = None  # Does not outlive the process.
+            else:
+                self._cache_name = f"Local:{os.path.abspath(path)}"
+
+        self.dataset_name = dataset_name
+        self.connector_kwargs = connector_kwargs
+        self.cache = cache
+        self.jobs: dict[str, Future] = {}
+        self._uncached: dict[str, str] = {}  # query_id -> query.
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f"astrolibrary-{dataset_name}",
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def shutdown(self, wait: bool = True):
+        """Stops accepting queries and releases the worker threads.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Whether to wait for the running queries to finish. Defaults to
+            True.
+
+        """
+        self._executor.shutdown(wait=wait)
 
     def run_query(self, query: str, *args, **kwargs) -> str:
         """Runs the given query against `self.dataset_name`.
@@ -75,6 +173,11 @@ class QueryHandler:
         modules to inherit from a base class `Connector` that has a `run_query`
         method.
 
+        The query is submitted to the handler's worker pool, and a new
+        connector is created for it, so this method returns before the query
+        finishes. Errors raised while running the query are reported by
+        `check_status` and re-raised by `get_results`.
+
         Parameters
         ----------
         query : str
@@ -92,7 +195,7 @@ class QueryHandler:
 
         Raises
         ------
-        ValueError : If the given `query` is invalid.
+        ValueError : If the given `query` is empty.
 
         Examples
         --------
@@ -100,22 +203,103 @@ class QueryHandler:
         use the function.
 
         >>> from astrolibrary.query_interface.query_handler import QueryHandler
-        >>> qh = QueryHandler(dataset_name="sdss")
-        >>> qh.run_query("SELECT * FROM table LIMIT 10")
-        '12345'
+        >>> qh = QueryHandler(dataset_name="SDSS")
+        >>> qh.run_query("SELECT TOP 10 * FROM SpecObj")
+        '8c1c3b6e2a5f4f0d9b7e6a1d2c3b4a59'
+
+        """
+        if not query or not query.strip():
+            raise ValueError("The query must be a non-empty string.")
+
+        query_id = uuid.uuid4().hex
+        if self.cache is not None:
+            self._uncached[query_id] = query
+        self.jobs[query_id] = self._executor.submit(
+            self._execute, query, *args, **kwargs
+        )
+        return query_id
+
+    def run_constraints(self, constraints: dict, *args, **kwargs) -> str:
+        """Compiles `constraints` into a query, and runs it.
+
+        All of the filtering and projection is pushed down to the dataset's
+        service, so only the matching rows and requested columns are
+        transferred.
+
+        Parameters
+        ----------
+        constraints : dict
+            The constraints, as accepted by `ConstraintsParser.parse`.
+        *args : iterable
+            Other arguments, passed on to `run_query`.
+        **kwargs : dict
+            Other keyword arguments, passed on to `run_query`.
+
+        Returns
+        -------
+        query_id : str
+            A unique identifier for the query, as returned by `run_query`.
+
+        Raises
+        ------
+        ValueError : If the constraints are invalid.
+
+        Examples
+        --------
+        >>> qh = QueryHandler(dataset_name="SDSS")
+        >>> qh.run_constraints(
+        ...     {
+        ...         "table": "SpecObj",
+        ...         "columns": ["specobjid", "z"],
+        ...         "where": {"class": "GALAXY", "z": (0.1, 0.3)},
+        ...         "top": 100,
+        ...     }
+        ... )
+        '8c1c3b6e2a5f4f0d9b7e6a1d2c3b4a59'
 
-        Notes
-        -----
-        The main reason for `query_id` is to allow future extensibility to
-        support asynchronous queries, while also keeping backward compatibility
-        with synchronous queries.
+        """
+        query = ConstraintsParser().parse(constraints)
+        return self.run_query(query, *args, **kwargs)
+
+    def _execute(self, query: str, *args, **kwargs) -> Connector:
+        """Runs `query` on a new connector. Runs in a worker thread.
+
+        Concurrent identical queries are coalesced into a single call, and
+        share its connector.
+        """
+        if args or kwargs:
+            return self._execute_once(query, *args, **kwargs)
+        # Handlers of the same dataset with different connector arguments,
+        # e.g. different local catalogs, must not share queries.
+        arguments = tuple(
+            (name, id(value))
+            for name, value in sorted(self.connector_kwargs.items())
+        )
+        return _QUERY_FLIGHTS.do(
+            (self.dataset_name, arguments, normalize_query(query)),
+            lambda: self._execute_once(query),
+        )
+
+    def _execute_once(self, query: str, *args, **kwargs) -> Connector:
+        """Runs `query` on a new connector, unless its results are cached.
 
+        New results are cached by `get_results`, once they are fetched.
         """
-        self.connector.run_query(
+        if self.cache is not None:
+            results = self.cache.get(self._cache_name, query)
+            if results is not None:
+                return CachedConnector(results)
+
+        connector = self.connector_class(**self.connector_kwargs)
+        connector.run_query(
             query, *args, **kwargs
         )  # Should raise appropriate exceptions, if any.
-        self.jobs[query_id := str(hash(query))] = self.connector
-        return query_id
+        return connector
+
+    def _get_job(self, query_id: str) -> Future:
+        if query_id not in self.jobs:
+            raise ValueError(f"Query ID '{query_id}' not found.")
+        return self.jobs[query_id]
 
     def check_status(self, query_id: str) -> str:
         """Check the status of a query given its `query_id`.
@@ -136,20 +320,33 @@ class QueryHandler:
         Raises:
         -------
         ValueError:
-            If the given `query_id` is not found in `self.statuses`.
+            If the given `query_id` is not found in `self.jobs`.
 
         """
-        if query_id not in self.jobs:
-            raise ValueError(f"Query ID '{query_id}' not found")
-        return self.jobs[query_id].check_status()
+        job = self._get_job(query_id)
+        if not job.done():
+            return "RUNNING"
+        if job.exception() is not None:
+            return "ERROR"
+        return job.result().check_status()
 
-    def get_results(self, query_id: str) -> Table:
+    def get_results(
+        self,
+        query_id: str,
+        wait: bool = True,
+        timeout: float | None = None,
+    ) -> Table:
         """Get the results of a query.
 
         Parameters:
         -----------
         query_id : str
             The unique identifier of the query to get its results.
+        wait : bool, optional
+            Whether to wait for a running query to finish. Defaults to True.
+        timeout : float, optional
+            The maximum number of seconds to wait for the query to finish.
+            Defaults to waiting as long as it takes.
 
         Returns:
         --------
@@ -159,9 +356,114 @@ class QueryHandler:
         Raises:
         -------
         ValueError:
-            If the given `query_id` is not found in `self.results`.
+            If the given `query_id` is not found in `self.jobs`.
+        TimeoutError:
+            If the query is still running after `timeout` seconds, or right
+            away if it is still running and `wait` is False.
+        Exception:
+            Any exception raised while running the query.
 
         """
-        if query_id not in self.jobs:
-            raise ValueError(f"Query ID '{query_id}' not found.")
-        return self.jobs[query_id].get_results()
+        job = self._get_job(query_id)
+        if not wait and not job.done():
+            raise TimeoutError(f"Query ID '{query_id}' is still running.")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        connector = job.result(timeout=timeout)
+
+        # Remote jobs (e.g. Gaia) keep running after their worker returns.
+        if not wait or deadline is not None:
+            while connector.check_status() == "RUNNING":
+                if not wait or time.monotonic() >= deadline:
+                    raise TimeoutError(
+                        f"Query ID '{query_id}' is still running."
+                    )
+                time.sleep(
+                    min(_POLL_INTERVAL, max(deadline - time.monotonic(), 0))
+                )
+        results = connector.get_results()
+
+        query = self._uncached.pop(query_id, None)
+        if (
+            query is not None
+            and results is not None
+            and not isinstance(connector, CachedConnector)
+        ):
+            self.cache.put(self._cache_name, query, results)
+        return results
+
+    def iter_query(
+        self,
+        query: str,
+        key_column: str,
+        chunk_rows: int = 10_000,
+    ) -> Iterator[Table]:
+        """Runs `query` and yields its results in chunks of `chunk_rows`.
+
+        The query is paged with keyset pagination: each page selects the
+        next `chunk_rows` rows whose `key_column` is greater than the last
+        key of the previous page. A page is requested as soon as the
+        previous one arrives, so it is fetched in the background while the
+        caller processes the current chunk. This streams results that do
+        not fit in memory, or that exceed the row limit of the service.
+
+        Parameters
+        ----------
+        query : str
+            The query to run. It is wrapped in a derived table, so it must
+            not contain an ORDER BY clause, and its columns must have
+            unique names.
+        key_column : str
+            The name of a column of the results with unique values, such as
+            "objid" or "specobjid". Pages are ordered by this column.
+        chunk_rows : int, optional
+            The maximum number of rows per chunk. Defaults to 10,000.
+
+        Yields
+        ------
+        chunk : astropy.table.Table
+            The next chunk of results, ordered by `key_column`.
+
+        Raises
+        ------
+        ValueError : If `key_column` is not a plain column name, if
+            `chunk_rows` is not positive, or if the results have no
+            `key_column` column.
+
+        Examples
+        --------
+        >>> qh = QueryHandler(dataset_name="SDSS")
+        >>> for chunk in qh.iter_query(
+        ...     "SELECT specobjid, z FROM SpecObj", "specobjid", 50_000
+        ... ):
+        ...     process(chunk)
+
+        """
+        if not _IDENTIFIER.match(key_column):
+            raise ValueError(f"Invalid key column '{key_column}'.")
+        if chunk_rows < 1:
+            raise ValueError("`chunk_rows` must be a positive integer.")
+
+        def page(last_key=None) -> str:
+            where = (
+                ""
+                if last_key is None
+                else f"WHERE page.{key_column} > {sql_literal(last_key)} "
+            )
+            return (
+                f"SELECT TOP {chunk_rows} * FROM ({query}) AS page "
+                f"{where}ORDER BY page.{key_column}"
+            )
+
+        query_id = self.run_query(page())
+        while query_id is not None:
+            chunk = self.get_results(query_id)
+            del self.jobs[query_id]
+            if not chunk:
+                return
+            if key_column not in chunk.colnames:
+                raise ValueError(f"Results have no column '{key_column}'.")
+
+            query_id = None
+            if len(chunk) == chunk_rows:
+                query_id = self.run_query(page(chunk[key_column][-1]))
+            yield chunk
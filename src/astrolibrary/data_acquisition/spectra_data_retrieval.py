@@ -5,28 +5,45 @@ Allows end-users to:
     - Specify optional parameters such as data reduction version (RUN2D), output format ('fits' or 'csv'), 
         SDSS survey type (SURVEY), spectrograph type (SPEC), and data release number (dr_number).
     - Save the downloaded data locally with customizable output directory.
+    - Download many spectra at once with `get_spectra_data_bulk`, through one
+        pooled HTTP session and a bounded number of concurrent workers.
 
 Advantages/Design Considerations:
     - Simplifies the retrieval process through function, `get_spectra_data`, abstracting the details of SDSS data access.
     - Flexible optional parameters that is adaptable to different SDSS configurations.
     - Supports both FITS and CSV output formats, depending on user preference.
     - Handles error conditions, raising specific exceptions.
+    - Streams downloads to disk and publishes them atomically, resuming
+        interrupted downloads.
+    - Concurrent requests for the same spectrum and file share a single
+        download.
 
 Limitations and Future Work:
     - Currently supports SDSS dataset only.
     - Assumes default values for optional parameters if not specified.
-    - Limited to synchronous data retrieval; does not support asynchronous queries.
-    - May not be optimized for large-scale data retrieval scenarios.
+    - `get_spectra_data` is synchronous; use `get_spectra_data_bulk` for
+        large-scale retrieval.
     - The module design may need extension for compatibility with future SDSS releases or other datasets.
 
 """
 
 import csv
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 
+from ._single_flight import SingleFlight
+
+CHUNK_SIZE = 1024 * 1024
+FITS_BLOCK_SIZE = 2880
+
+# Concurrent requests for the same spectrum share one download.
+_DOWNLOAD_FLIGHTS = SingleFlight()
+
 
 def get_spectra_data(
     survey=None,
@@ -78,6 +95,14 @@ def get_spectra_data(
     Timeout:
         - By default, timeout at 30
 
+    Notes:
+    ------
+    The file is streamed to `<file_path>.part` and renamed to `file_path` only
+    once the download is complete, so an interrupted download never leaves a
+    truncated file behind. Calling the function again resumes it.
+    Concurrent calls for the same spectrum and output file share a single
+    download, and all get its file path or its error.
+
     Examples:
     ---------
     CSV data
@@ -112,6 +137,151 @@ def get_spectra_data(
         hdul=fits.open(file_path)
         print(hdul)
     """
+    _validate_spectra_args(
+        survey, run2d, spec, plateid, mjd, fiberid, dr_number, output_format
+    )
+    link, file_name = _spectra_link(
+        survey, run2d, spec, plateid, mjd, fiberid, dr_number, output_format
+    )
+    file_path = os.path.join(output_dir, file_name)
+    _shared_download(
+        requests.get,
+        link,
+        file_path,
+        (plateid, mjd, fiberid, output_format, dr_number),
+    )
+    return file_path
+
+
+def get_spectra_data_bulk(
+    identifiers,
+    survey=None,
+    run2d=None,
+    spec="lite",
+    dr_number=None,
+    output_format="fits",
+    output_dir=".",
+    max_workers=8,
+    skip_existing=True,
+):
+    """
+    Retrieve many spectra from SDSS concurrently.
+
+    All downloads share one `requests.Session`, whose connection pool is
+    sized to `max_workers`, so connections are kept alive and reused instead
+    of being opened once per spectrum. A failing download does not stop the
+    others: its error is recorded in the returned manifest.
+
+    Parameters:
+    -----------
+    identifiers: iterable of (plateid, mjd, fiberid)
+        Identifiers of the spectra to download, e.g. the rows of a
+        `QueryHandler` result with plate, mjd and fiberid columns.
+    survey, run2d, spec, dr_number, output_format, output_dir:
+        Same as in `get_spectra_data`, shared by every download.
+    max_workers: int, optional
+        Number of concurrent downloads (default: 8)
+    skip_existing: bool, optional
+        Skip spectra whose file already exists in `output_dir` and is
+        complete (default: True)
+
+    Returns:
+    --------
+    manifest: list of dict
+        One entry per identifier, in input order, with keys:
+        - 'plateid', 'mjd', 'fiberid': the identifiers of the spectrum.
+        - 'path': path to the downloaded file (None on error).
+        - 'bytes': size of the file in bytes (0 on error).
+        - 'seconds': time spent on the download.
+        - 'status': one of 'downloaded', 'skipped' or 'error'.
+        - 'error': the error message, if any.
+
+    Raises:
+    -------
+    ValueError:
+        - If `max_workers` is less than 1.
+
+    Examples:
+    ---------
+    >>> manifest = get_spectra_data_bulk(
+            [(7644, 57327, 528), (7644, 57327, 529)],
+            survey='eboss',
+            run2d='v5_13_2',
+            dr_number=17,
+            max_workers=16,
+        )
+    >>> [entry['path'] for entry in manifest if entry['status'] != 'error']
+    Output: ['./spec-7644-57327-0528.fits', './spec-7644-57327-0529.fits']
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be a positive integer")
+
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max_workers)
+    with requests.Session() as session:
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        def download(identifier):
+            entry = {
+                "plateid": None,
+                "mjd": None,
+                "fiberid": None,
+                "path": None,
+                "bytes": 0,
+                "seconds": 0.0,
+                "status": "error",
+                "error": None,
+            }
+            start = time.perf_counter()
+            try:
+                plateid, mjd, fiberid = (int(value) for value in identifier)
+                entry.update(plateid=plateid, mjd=mjd, fiberid=fiberid)
+                _validate_spectra_args(
+                    survey,
+                    run2d,
+                    spec,
+                    plateid,
+                    mjd,
+                    fiberid,
+                    dr_number,
+                    output_format,
+                )
+                link, file_name = _spectra_link(
+                    survey,
+                    run2d,
+                    spec,
+                    plateid,
+                    mjd,
+                    fiberid,
+                    dr_number,
+                    output_format,
+                )
+                file_path = os.path.join(output_dir, file_name)
+                if skip_existing and _is_complete(file_path):
+                    entry["status"] = "skipped"
+                else:
+                    _shared_download(
+                        session.get,
+                        link,
+                        file_path,
+                        (plateid, mjd, fiberid, output_format, dr_number),
+                    )
+                    entry["status"] = "downloaded"
+                entry["path"] = file_path
+                entry["bytes"] = os.path.getsize(file_path)
+            except (TypeError, ValueError, RuntimeError, OSError) as e:
+                entry["error"] = str(e)
+            entry["seconds"] = time.perf_counter() - start
+            return entry
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(download, identifiers))
+
+
+def _validate_spectra_args(
+    survey, run2d, spec, plateid, mjd, fiberid, dr_number, output_format
+):
+    """Raise ValueError if the arguments of `get_spectra_data` are invalid."""
     if not plateid or not mjd or not fiberid:
         raise ValueError("PLATEID, MJD, and FIBERID must be provided")
     if not survey or not run2d or not dr_number:
@@ -130,11 +300,15 @@ def get_spectra_data(
             "Unsupported output format. Supported formats: 'fits', 'csv'"
         )
 
-
     # Valid run2d values according to SDSS Website
     if spec not in ["lite", "full"]:
         raise ValueError("Invalid spec value")
 
+
+def _spectra_link(
+    survey, run2d, spec, plateid, mjd, fiberid, dr_number, output_format
+):
+    """Return the download link and the file name of a spectrum."""
     plateid = str(plateid).zfill(4)
     mjd = str(mjd)
     fiberid = str(fiberid).zfill(4)
@@ -148,18 +322,155 @@ def get_spectra_data(
         f"spec={spec}?plateid={plateid}&mjd={mjd}&fiberid={fiberid}"
     )
     link = dr17_link if dr_number == 17 else dr18_link
+    file_name = f"spec-{plateid}-{mjd}-{fiberid}.{output_format}"
+    return link, file_name
 
-    try:
-        response = requests.get(link, timeout=30)
-        response.raise_for_status()
 
-        file_name = f"spec-{plateid}-{mjd}-{fiberid}.{output_format}"
-        file_path = os.path.join(output_dir, file_name)
+def _shared_download(get, link, file_path, identifiers):
+    """Call `_download`, unless the same download is already in flight.
+
+    Downloads are keyed by the spectrum's (plateid, mjd, fiberid,
+    output_format, dr_number) and the absolute path of the file, so two
+    calls never write the same partial file at the same time.
+    """
+    key = (*identifiers, os.path.abspath(file_path))
+    _DOWNLOAD_FLIGHTS.do(key, lambda: _download(get, link, file_path))
 
-        with open(file_path, "wb") as file:
-            file.write(response.content)
 
-        return file_path
+def _download(get, link, file_path, _retry=True):
+    """Download `link` to `file_path` using the `get` function of requests.
+
+    The body is streamed in chunks into `<file_path>.part`, so memory use
+    does not depend on the size of the spectrum. The partial file is renamed
+    to `file_path` only once its size (and, for FITS files, its structure)
+    has been checked, so `file_path` never holds a truncated download. If a
+    previous download was interrupted, it is resumed with an HTTP Range
+    request; servers that ignore the range restart it from scratch.
+    """
+    part_path = f"{file_path}.part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    try:
+        response = get(link, headers=headers, stream=True, timeout=30)
+        try:
+            if response.status_code == 416 and offset and _retry:
+                # The partial file does not match the remote one anymore.
+                os.remove(part_path)
+                return _download(get, link, file_path, _retry=False)
+            response.raise_for_status()
+
+            if response.status_code != 206:
+                offset = 0  # The server sent the whole body.
+            expected_size = _expected_size(response, offset)
+            with open(part_path, "ab" if offset else "wb") as file:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    file.write(chunk)
+        finally:
+            response.close()
 
     except RequestException as e:
         raise RuntimeError(f"Data downloading error:{str(e)}") from e
+
+    size = os.path.getsize(part_path)
+    if expected_size is not None and size != expected_size:
+        if size > expected_size:
+            os.remove(part_path)
+        raise RuntimeError(
+            f"Data downloading error: expected {expected_size} bytes, "
+            f"received {size} bytes"
+        )
+    if file_path.endswith(".fits") and not _fits_is_complete(part_path):
+        os.remove(part_path)
+        raise RuntimeError("Data downloading error: incomplete FITS file")
+
+    os.replace(part_path, file_path)
+
+
+def _expected_size(response, offset):
+    """Return the full size of a download, or None if it is unknown."""
+    headers = response.headers
+    if headers.get("Content-Encoding", "identity") != "identity":
+        return None  # Content-Length counts the encoded bytes.
+
+    content_range = headers.get("Content-Range", "")
+    total = content_range.rpartition("/")[2]
+    if total.isdigit():
+        return int(total)
+
+    content_length = headers.get("Content-Length", "")
+    if content_length.isdigit():
+        return offset + int(content_length)
+    return None
+
+
+def _is_complete(file_path):
+    """Check that a previously downloaded file exists and is not truncated.
+
+    FITS files are checked against the data sizes declared in their headers.
+    Other formats carry no such information, so they only need to be
+    non-empty.
+    """
+    if not os.path.isfile(file_path) or os.path.getsize(file_path) == 0:
+        return False
+    if file_path.endswith(".fits"):
+        return _fits_is_complete(file_path)
+    return True
+
+
+def _fits_is_complete(file_path):
+    """Check that every HDU declared in a FITS file is fully present."""
+    size = os.path.getsize(file_path)
+    offset = 0
+    with open(file_path, "rb") as file:
+        while True:
+            header = {}
+            while "END" not in header:
+                block = file.read(FITS_BLOCK_SIZE)
+                if len(block) < FITS_BLOCK_SIZE:
+                    return False
+                offset += FITS_BLOCK_SIZE
+                for start in range(0, FITS_BLOCK_SIZE, 80):
+                    card = block[start : start + 80]
+                    key = card[:8].decode("ascii", "replace").strip()
+                    if key == "END":
+                        header["END"] = None
+                        break
+                    if card[8:10] == b"= ":
+                        value = card[10:].split(b"/")[0].strip()
+                        header[key] = value.decode("ascii", "replace")
+
+            try:
+                data_size = _fits_data_size(header)
+            except (KeyError, ValueError):  # A missing or invalid keyword.
+                return False
+            if offset + data_size > size:
+                return False
+
+            # HDUs are padded to a whole number of blocks. Anything after the
+            # last HDU that is not another extension is padding.
+            offset += -(-data_size // FITS_BLOCK_SIZE) * FITS_BLOCK_SIZE
+            file.seek(offset)
+            if file.read(8) != b"XTENSION":
+                return True
+            file.seek(offset)
+
+
+def _fits_data_size(header):
+    """Return the size in bytes of the data following a FITS header.
+
+    Raises KeyError if BITPIX or an NAXISn keyword is missing, and
+    ValueError if a keyword is not an integer.
+    """
+    naxis = int(header.get("NAXIS", 0))
+    if naxis == 0:
+        return 0
+    axes = [int(header[f"NAXIS{i}"]) for i in range(1, naxis + 1)]
+    if header.get("GROUPS") == "T" and axes[0] == 0:
+        axes = axes[1:]  # Random groups: NAXIS1 = 0 is not a dimension.
+    n_elements = 1
+    for axis in axes:
+        n_elements *= axis
+    pcount = int(header.get("PCOUNT", 0))
+    gcount = int(header.get("GCOUNT", 1))
+    return abs(int(header["BITPIX"])) // 8 * gcount * (pcount + n_elements)
@@ -42,6 +42,19 @@ class MachineLearning:
         else:
             raise NotFittedError("Must train model by calling fit() first.")
 
+    @staticmethod
+    def features(batch, column="Flux_normalized", fill_value=1.0):
+        """
+        Get the feature matrix of a `SpectrumBatch`: one row per spectrum,
+        one feature per pixel of a column, such as the continuum-normalized
+        flux added by `SpectrumBatch.normalize_continuum`.
+
+        Masked and non-finite pixels are set to `fill_value`, by default
+        the continuum level of a normalized flux.
+        """
+        values = batch.columns[column]
+        return np.where(batch.mask & np.isfinite(values), values, fill_value)
+
     def report_confusion_matrix(self, true_labels, predicted_labels):
         # Generate and return the confusion matrix
         return sk_confusion_matrix(true_labels, predicted_labels)
@@ -0,0 +1,172 @@
+"""Read CSV spectra, with typed, projected parsing and a binary sidecar.
+
+On request (`cache=True`), the first parse of a CSV file writes its
+columns, with the dtypes they were parsed with, into a hidden `.<name>.npz`
+sidecar next to it. The sidecar records the modification time and size of
+the CSV file; while they match, later reads load the columns from the
+sidecar without parsing any text. Columns read later are added to the
+sidecar.
+
+Sidecars are only a cache: they are skipped, without error, if the CSV file
+cannot be stat'ed, if a column is not numeric, or if the directory is not
+writable.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+SIDECAR_VERSION = 1
+# pandas' own parser. pyarrow is faster on large files, but is opt-in: it
+# is an optional dependency, and its type inference differs from C's.
+DEFAULT_ENGINE = "c"
+
+
+def sidecar_path(file_path):
+    """The path of the sidecar of a CSV file."""
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, f".{name}.npz")
+
+
+def _signature(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _load_sidecar(file_path, signature):
+    """The header and cached columns of a valid sidecar, else None."""
+    try:
+        with np.load(sidecar_path(file_path), allow_pickle=False) as sidecar:
+            meta = json.loads(str(sidecar["meta"]))
+            if (
+                meta.get("version") != SIDECAR_VERSION
+                or meta.get("source") != signature
+            ):
+                return None
+            return meta["header"], {
+                name: sidecar[f"column{index}"]
+                for index, name in enumerate(meta["columns"])
+            }
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_sidecar(file_path, signature, header, columns):
+    """Write the sidecar atomically. Non-numeric columns are not cached."""
+    if any(values.dtype.kind not in "biuf" for values in columns.values()):
+        return
+    meta = {
+        "version": SIDECAR_VERSION,
+        "source": signature,
+        "header": header,
+        "columns": list(columns),
+    }
+    arrays = {
+        f"column{index}": values
+        for index, values in enumerate(columns.values())
+    }
+    path = sidecar_path(file_path)
+    temporary = None
+    try:
+        descriptor, temporary = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", suffix=".npz"
+        )
+        with os.fdopen(descriptor, "wb") as file:
+            np.savez(file, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(temporary, path)
+    except OSError:
+        if temporary is not None and os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def _cast(values, name, dtype):
+    if isinstance(dtype, dict):
+        dtype = dtype.get(name)
+    return values if dtype is None else values.astype(dtype, copy=False)
+
+
+def read_csv(file_path, columns=None, dtype=None, engine=None, cache=False):
+    """
+    Read the columns of a CSV file into a DataFrame.
+
+    Parameters:
+    - file_path (str): The CSV file.
+    - columns (list of str, optional): The columns to read. Defaults to all
+      of them. Other columns are skipped by the parser.
+    - dtype (type or dict, optional): The dtype of the columns, or of some
+      of them. Defaults to the ones inferred by pandas. With the sidecar,
+      columns are parsed and cached with the inferred dtypes, then cast,
+      so that the sidecar serves any later dtype.
+    - engine (str, optional): The `pd.read_csv` engine, e.g. "pyarrow"
+      if it is installed. Defaults to `DEFAULT_ENGINE`, "c".
+    - cache (bool): Whether to use and update the sidecar of the file,
+      which is written next to it. Defaults to False.
+
+    Returns:
+    - tuple: The DataFrame, and the number of bytes read: of the CSV file
+      when parsed (None if it cannot be stat'ed), or of the columns loaded
+      from the sidecar.
+
+    Raises:
+    - ValueError: If the file does not exist, cannot be parsed, or lacks a
+      column.
+    """
+    signature = _signature(file_path)
+    cache = cache and signature is not None
+    cached = _load_sidecar(file_path, signature) if cache else None
+    if cached is not None:
+        header, cached_columns = cached
+        missing = [name for name in columns or () if name not in header]
+        if missing:
+            raise ValueError(
+                f"Columns {missing} do not exist in '{file_path}'."
+            )
+        # In the order of the file, as parsed with `usecols`.
+        names = [name for name in header if columns is None or name in columns]
+        if all(name in cached_columns for name in names):
+            df = pd.DataFrame(
+                {
+                    name: _cast(cached_columns[name], name, dtype)
+                    for name in names
+                },
+                copy=False,
+            )
+            return df, sum(cached_columns[name].nbytes for name in names)
+
+    try:
+        df = pd.read_csv(
+            file_path,
+            usecols=columns,
+            dtype=None if cache else dtype,
+            engine=engine or DEFAULT_ENGINE,
+        )
+    except FileNotFoundError as e:
+        raise ValueError(
+            f"The CSV file '{file_path}' does not exist; relative paths are "
+            f"relative to the working directory '{os.getcwd()}'."
+        ) from e
+    except Exception as e:
+        raise ValueError(f"Cannot read the CSV file '{file_path}': {e}") from e
+
+    if not cache:
+        return df, None if signature is None else signature["size"]
+    parsed = {name: df[name].to_numpy() for name in df.columns}
+    if cached is not None:
+        header, cached_columns = cached
+        parsed = {**cached_columns, **parsed}
+    elif columns is None:
+        header = list(df.columns)
+    else:
+        header = list(pd.read_csv(file_path, nrows=0).columns)
+    _write_sidecar(file_path, signature, header, parsed)
+    if dtype is not None:
+        df = pd.DataFrame(
+            {name: _cast(df[name].to_numpy(), name, dtype) for name in df},
+            copy=False,
+        )
+    return df, signature["size"]
@@ -0,0 +1,465 @@
+"""Continuum Module.
+
+Allows end-users to:
+    - Estimate the continuum of one spectrum, or of a 2-D batch of spectra,
+      and normalize the flux by it:
+
+      >>> continuum, normalized = fit_continuum(flux, method="median")
+      >>> continuum, normalized = fit_continuum(
+      ...     fluxes, wavelength, method="spline", n_knots=40, ivar=ivars
+      ... )
+
+    - Use the estimators on their own: `running_median`, `clipped_smooth`
+      (a running median or boxcar, iteratively sigma-clipped) and
+      `spline_continuum` (a sigma-clipped least-squares cubic spline).
+    - Add continuum-normalized columns with
+      `DataPreprocessing.normalize_continuum` and
+      `SpectrumBatch.normalize_continuum`, ready for
+      `MachineLearning.features`.
+
+Advantages/Design Considerations:
+    - The running median is SciPy's 1-D `median_filter`, which keeps the
+      window sorted: O(n log w) for n pixels and a window of w pixels.
+      Unlike a boxcar, it is not pulled by emission and absorption lines
+      narrower than half of the window.
+    - Sigma clipping masks the pixels further than `sigma_lower` or
+      `sigma_upper` times the RMS of the residuals from the continuum, fills
+      them by interpolation from their neighbours, and fits again.
+    - The spline's B-spline basis, its pairwise products, and the inverse of
+      its (penalized) normal matrix are computed once per grid and cached.
+      Unmasked, unweighted spectra are then projected with two small matrix
+      products; weighted ones are solved per spectrum, in batches. A
+      second-difference penalty on the coefficients (a P-spline) keeps the
+      spline smooth across masked gaps.
+    - Computations are in float64; continua keep the floating-point dtype of
+      the flux, e.g. float32.
+
+Limitations:
+    - Windows are in pixels. SDSS spectra have pixels of constant width in
+      log-wavelength, so a window is a constant velocity width.
+    - Spline knots are uniform in the given wavelengths, or in pixels if no
+      wavelengths are given. The spline is not extrapolated: it is held
+      constant beyond the first and last valid pixels.
+    - The normalized flux is NaN where the continuum is zero.
+
+"""
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+from scipy.interpolate import BSpline
+from scipy.ndimage import median_filter, uniform_filter1d
+
+from .resampling import _check_grid, _grid_key, fill_invalid
+
+METHODS = ("median", "boxcar", "spline")
+DEFAULT_WINDOW = 101
+DEFAULT_N_KNOTS = 40
+BASIS_CACHE_SIZE = 16
+
+# Rows of a batch solved at once by the weighted spline fit, which holds
+# n_coefficients^2 floats per row.
+_SPLINE_CHUNK_ROWS = 1024
+# The weight of the spline's second-difference penalty, relative to the
+# mean diagonal of the normal matrix.
+_SMOOTHNESS = 1e-2
+
+_basis_cache = OrderedDict()
+_basis_cache_lock = threading.Lock()
+
+
+def _as_spectra(flux, mask):
+    """Flux as a float64 2-D array, and its valid pixels."""
+    flux = np.atleast_2d(np.asarray(flux, dtype=np.float64))
+    if flux.ndim != 2:
+        raise ValueError("The flux must be one spectrum, or a 2-D batch.")
+    valid = np.isfinite(flux)
+    if mask is not None:
+        mask = np.atleast_2d(np.asarray(mask, dtype=bool))
+        if mask.shape != flux.shape:
+            raise ValueError("The mask must have the shape of the flux.")
+        valid &= mask
+    return flux, valid
+
+
+def _output_dtype(flux):
+    dtype = np.asarray(flux).dtype
+    return dtype if dtype.kind == "f" else np.dtype(np.float64)
+
+
+def _check_window(window):
+    if int(window) != window or window < 1:
+        raise ValueError("The window must be a positive number of pixels.")
+    return int(window)
+
+
+def running_median(flux, window=DEFAULT_WINDOW, mask=None):
+    """
+    Compute the running median of spectra.
+
+    Parameters:
+    - flux (array-like): One spectrum, or spectra of shape
+      (n_spectra, n_pixels).
+    - window (int): The width of the window, in pixels.
+    - mask (array-like of bool, optional): The valid pixels (True). Invalid
+      and non-finite pixels are filled by interpolation from their valid
+      neighbours first.
+
+    Returns:
+    - numpy.ndarray: The running median, of the shape of `flux`.
+
+    Raises:
+    - ValueError: If the window is not a positive integer, or the mask
+      does not match the flux.
+    """
+    window = _check_window(window)
+    one_spectrum = np.ndim(flux) == 1
+    dtype = _output_dtype(flux)
+    spectra, valid = _as_spectra(flux, mask)
+    median = _running_median(
+        fill_invalid(np.arange(spectra.shape[1]), spectra, valid), window
+    )
+    median = median.astype(dtype, copy=False)
+    return median[0] if one_spectrum else median
+
+
+def _running_median(filled, window):
+    # Row by row: SciPy's O(n log w) algorithm is only used in 1-D.
+    median = np.empty_like(filled)
+    for row, values in enumerate(filled):
+        if np.isnan(values[0]):  # No valid pixel at all.
+            median[row] = np.nan
+        else:
+            median[row] = median_filter(values, size=window)
+    return median
+
+
+def _smooth(filled, window, method):
+    if method == "median":
+        return _running_median(filled, window)
+    return uniform_filter1d(filled, size=window, axis=1)
+
+
+def _clip(residual, keep, valid, sigma_lower, sigma_upper):
+    """The valid pixels within the clipping bounds of their spectrum."""
+    # Spectra without any pixel kept have a NaN RMS, and keep none.
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        rms = np.sqrt(
+            np.mean(
+                np.square(residual),
+                axis=1,
+                where=keep,
+                keepdims=True,
+            )
+        )
+        return (
+            valid
+            & (residual >= -sigma_lower * rms)
+            & (residual <= sigma_upper * rms)
+        )
+
+
+def clipped_smooth(
+    flux,
+    window=DEFAULT_WINDOW,
+    method="median",
+    mask=None,
+    sigma_lower=3.0,
+    sigma_upper=3.0,
+    iterations=3,
+):
+    """
+    Estimate the continuum of spectra by iteratively sigma-clipped
+    smoothing.
+
+    Parameters:
+    - flux (array-like): One spectrum, or spectra of shape
+      (n_spectra, n_pixels).
+    - window (int): The width of the smoothing window, in pixels.
+    - method (str): "median" (a running median) or "boxcar" (a running
+      mean).
+    - mask (array-like of bool, optional): The valid pixels (True).
+    - sigma_lower, sigma_upper (float): Pixels below or above the continuum
+      by more than these numbers of RMS residuals are clipped.
+    - iterations (int): The maximum number of clipping iterations. 0 only
+      smooths.
+
+    Returns:
+    - tuple: The continuum, of the shape of `flux`, and the pixels used
+      for it (not clipped, nor invalid), as a 2-D array.
+
+    Raises:
+    - ValueError: If the method is unknown, or the window or mask invalid.
+    """
+    if method not in ("median", "boxcar"):
+        raise ValueError(
+            f"Unknown method '{method}', expected median or boxcar."
+        )
+    window = _check_window(window)
+    one_spectrum = np.ndim(flux) == 1
+    dtype = _output_dtype(flux)
+    spectra, valid = _as_spectra(flux, mask)
+    pixels = np.arange(spectra.shape[1])
+
+    keep = valid
+    for iteration in range(iterations + 1):
+        continuum = _smooth(
+            fill_invalid(pixels, spectra, keep), window, method
+        )
+        if iteration == iterations:
+            break
+        clipped = _clip(
+            spectra - continuum, keep, valid, sigma_lower, sigma_upper
+        )
+        if np.array_equal(clipped, keep):
+            break
+        keep = clipped
+
+    continuum = continuum.astype(dtype, copy=False)
+    return (continuum[0] if one_spectrum else continuum), keep
+
+
+class _SplineBasis:
+    """A cubic B-spline basis on a grid, and its cached products."""
+
+    def __init__(self, grid, n_knots, degree):
+        knots = np.linspace(grid[0], grid[-1], n_knots + 2)
+        knots = np.concatenate(
+            [np.repeat(grid[0], degree), knots, np.repeat(grid[-1], degree)]
+        )
+        basis = BSpline.design_matrix(grid, knots, degree).tocsr()
+        n_pixels, n_coefficients = basis.shape
+        self.basis = basis
+        self.n_coefficients = n_coefficients
+
+        # Every row of the basis has degree + 1 entries: their pairwise
+        # products give the normal matrix of any pixel weights, as
+        # `weights @ pairs`, flattened.
+        width = degree + 1
+        data = basis.data.reshape(n_pixels, width)
+        columns = basis.indices.reshape(n_pixels, width)
+        self.pairs = sparse.csr_matrix(
+            (
+                (data[:, :, None] * data[:, None, :]).ravel(),
+                (
+                    np.repeat(np.arange(n_pixels), width * width),
+                    (
+                        columns[:, :, None] * n_coefficients
+                        + columns[:, None, :]
+                    ).ravel(),
+                ),
+            ),
+            shape=(n_pixels, n_coefficients * n_coefficients),
+        )
+        differences = np.diff(np.eye(n_coefficients), n=2, axis=0)
+        self.penalty = differences.T @ differences
+
+        gram = (basis.T @ basis).toarray()
+        self.unweighted_inverse = np.linalg.inv(self._penalized(gram[None]))[0]
+
+    def _penalized(self, grams):
+        scale = np.trace(grams, axis1=1, axis2=2) / self.n_coefficients
+        scale = np.where(scale > 0, scale, 1.0)
+        return grams + _SMOOTHNESS * scale[:, None, None] * self.penalty
+
+    def fit(self, flux, weights=None):
+        """The least-squares spline of every row of `flux`."""
+        if weights is None:
+            coefficients = (self.basis.T @ flux.T).T @ self.unweighted_inverse
+        else:
+            grams = (self.pairs.T @ weights.T).T.reshape(
+                -1, self.n_coefficients, self.n_coefficients
+            )
+            right_hand_side = (self.basis.T @ (weights * flux).T).T
+            coefficients = np.linalg.solve(
+                self._penalized(grams), right_hand_side[..., None]
+            )[..., 0]
+        return (self.basis @ coefficients.T).T
+
+
+def _spline_basis(grid, n_knots, degree):
+    """Get the cached `_SplineBasis` of a grid, computing it once."""
+    key = (_grid_key(grid), n_knots, degree)
+    with _basis_cache_lock:
+        if key in _basis_cache:
+            _basis_cache.move_to_end(key)
+            return _basis_cache[key]
+    basis = _SplineBasis(grid, n_knots, degree)
+    with _basis_cache_lock:
+        _basis_cache[key] = basis
+        while len(_basis_cache) > BASIS_CACHE_SIZE:
+            _basis_cache.popitem(last=False)
+    return basis
+
+
+def spline_continuum(
+    flux,
+    wavelength=None,
+    n_knots=DEFAULT_N_KNOTS,
+    degree=3,
+    mask=None,
+    ivar=None,
+    sigma_lower=3.0,
+    sigma_upper=3.0,
+    iterations=3,
+):
+    """
+    Estimate the continuum of spectra by an iteratively sigma-clipped
+    least-squares spline.
+
+    Parameters:
+    - flux (array-like): One spectrum, or spectra of shape
+      (n_spectra, n_pixels).
+    - wavelength (array-like, optional): The strictly increasing
+      wavelengths of the pixels, shared by all spectra. Defaults to the
+      pixel indices.
+    - n_knots (int): The number of interior knots, evenly spaced.
+    - degree (int): The degree of the spline.
+    - mask (array-like of bool, optional): The valid pixels (True).
+    - ivar (array-like, optional): The inverse variances of the pixels,
+      used as weights. Pixels with a zero inverse variance are invalid.
+    - sigma_lower, sigma_upper, iterations: As in `clipped_smooth`.
+
+    Returns:
+    - tuple: The continuum, of the shape of `flux`, and the pixels used
+      for it, as a 2-D array.
+
+    Raises:
+    - ValueError: If the wavelengths, mask or inverse variances do not
+      match the flux.
+    """
+    one_spectrum = np.ndim(flux) == 1
+    dtype = _output_dtype(flux)
+    spectra, valid = _as_spectra(flux, mask)
+    n_pixels = spectra.shape[1]
+    grid = _check_grid(
+        np.arange(n_pixels) if wavelength is None else wavelength, "wavelength"
+    )
+    if len(grid) != n_pixels:
+        raise ValueError("The wavelengths do not match the flux.")
+    basis = _spline_basis(grid, int(n_knots), int(degree))
+
+    weights = None
+    if ivar is not None:
+        ivar = np.atleast_2d(np.asarray(ivar, dtype=np.float64))
+        if ivar.shape != spectra.shape:
+            raise ValueError("The inverse variances must match the flux.")
+        valid &= np.isfinite(ivar) & (ivar > 0)
+        weights = np.where(valid, ivar, 0.0)
+    spectra = np.where(valid, spectra, 0.0)
+
+    keep = valid
+    continuum = np.empty_like(spectra)
+    for iteration in range(iterations + 1):
+        if weights is None and keep.all():
+            continuum = basis.fit(spectra)
+        else:
+            pixel_weights = keep if weights is None else weights * keep
+            pixel_weights = pixel_weights.astype(np.float64)
+            for start in range(0, len(spectra), _SPLINE_CHUNK_ROWS):
+                rows = slice(start, start + _SPLINE_CHUNK_ROWS)
+                continuum[rows] = basis.fit(spectra[rows], pixel_weights[rows])
+        if iteration == iterations:
+            break
+        clipped = _clip(
+            spectra - continuum, keep, valid, sigma_lower, sigma_upper
+        )
+        if np.array_equal(clipped, keep):
+            break
+        keep = clipped
+
+    continuum = _hold_edges(continuum, valid).astype(dtype, copy=False)
+    return (continuum[0] if one_spectrum else continuum), keep
+
+
+def _hold_edges(continuum, valid):
+    """
+    Hold the continuum of every spectrum constant before its first and
+    after its last valid pixel, as the filled smoothed continua are,
+    instead of extrapolating the spline. Spectra without any valid pixel
+    are all NaN.
+    """
+    n_pixels = continuum.shape[1]
+    first = np.argmax(valid, axis=1)[:, None]
+    last = n_pixels - 1 - np.argmax(valid[:, ::-1], axis=1)[:, None]
+    pixels = np.clip(np.arange(n_pixels), first, last)
+    held = np.take_along_axis(continuum, pixels, axis=1)
+    held[~valid.any(axis=1)] = np.nan
+    return held
+
+
+def fit_continuum(
+    flux,
+    wavelength=None,
+    method="median",
+    window=DEFAULT_WINDOW,
+    mask=None,
+    ivar=None,
+    iterations=None,
+    **options,
+):
+    """
+    Estimate the continuum of spectra, and normalize them by it.
+
+    Parameters:
+    - flux (array-like): One spectrum, or spectra of shape
+      (n_spectra, n_pixels).
+    - wavelength (array-like, optional): The wavelengths of the pixels,
+      shared by all spectra. Only used by the spline.
+    - method (str): "median" or "boxcar", see `clipped_smooth`, or
+      "spline", see `spline_continuum`.
+    - window (int): The smoothing window, in pixels. Not used by the spline.
+    - mask (array-like of bool, optional): The valid pixels (True).
+    - ivar (array-like, optional): The inverse variances of the pixels.
+      Pixels with a zero inverse variance are invalid; the spline also
+      weighs the others by it.
+    - iterations (int, optional): The maximum number of clipping
+      iterations. Defaults to 0 for the median, already robust to lines,
+      and to 3 otherwise.
+    - options: The other arguments of the estimator, e.g. `sigma_upper`
+      or `n_knots`.
+
+    Returns:
+    - tuple: The continuum and the continuum-normalized flux, of the shape
+      and floating-point dtype of `flux`.
+
+    Raises:
+    - ValueError: If the method is unknown, or the arguments invalid.
+    """
+    if method not in METHODS:
+        raise ValueError(
+            f"Unknown method '{method}', expected one of {METHODS}."
+        )
+    if iterations is None:
+        iterations = 0 if method == "median" else 3
+
+    if method == "spline":
+        continuum, _ = spline_continuum(
+            flux,
+            wavelength,
+            mask=mask,
+            ivar=ivar,
+            iterations=iterations,
+            **options,
+        )
+    else:
+        if ivar is not None:
+            valid = np.asarray(ivar) > 0
+            mask = valid if mask is None else valid & np.asarray(mask)
+        continuum, _ = clipped_smooth(
+            flux,
+            window,
+            method,
+            mask=mask,
+            iterations=iterations,
+            **options,
+        )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalized = np.where(
+            continuum != 0, np.asarray(flux) / continuum, np.nan
+        ).astype(continuum.dtype, copy=False)
+    return continuum, normalized
@@ -1,12 +1,17 @@
 import os
-import sys
+import time
+import tracemalloc
 
 import numpy as np
 import pandas as pd
-from astropy import units as u
 from astropy.cosmology import WMAP9
 from astropy.io import fits
 
+from ._csv_reader import read_csv
+from .continuum import DEFAULT_WINDOW, fit_continuum
+from .redshift import luminosity_distance, to_rest_frame
+from .resampling import resample
+
 
 class DataPreprocessing:
     def __init__(
@@ -15,15 +20,46 @@ class DataPreprocessing:
         min_target_wavelength: float,
         max_target_wavelength: float,
         redshift=0.0,
+        columns=None,
+        dtype=None,
     ):
+        """
+        Read a spectrum.
+
+        Parameters:
+        - file_path (str): Path to the FITS or CSV file.
+        - min_target_wavelength, max_target_wavelength (float): The range
+          kept by `wave_align`.
+        - redshift (float): The redshift of the spectrum.
+        - columns (list of str, optional): The columns to read.
+        - dtype (str or numpy.dtype, optional): The dtype policy, e.g.
+          "float32": the floating-point columns are read, and computed by
+          the preprocessing steps, with this dtype. Reductions, such as the
+          mean and standard deviation, are accumulated in float64. Defaults
+          to None, keeping the dtypes of the file.
+
+        Raises:
+        - ValueError: If the file cannot be read, or `dtype` is not a
+          floating-point dtype.
+        """
         self.MIN_TARGET_WAVELENGTH = min_target_wavelength
         self.MAX_TARGET_WAVELENGTH = max_target_wavelength
         self.df = None
         self.redshift = redshift
+        self.load_stats = None
+        self.dtype = _float_dtype(dtype)
 
-        self.read_data(file_path)
+        self.read_data(file_path, columns=columns)
 
-    def read_data(self, file_path):
+    def read_data(
+        self,
+        file_path,
+        columns=None,
+        track_memory=False,
+        csv_dtype=None,
+        engine=None,
+        cache=False,
+    ):
         """Ensure the reading of FITS and CSV files.
 
         Especially, FITS files are not read by default by Pandas
@@ -31,48 +67,128 @@ class DataPreprocessing:
         depending on compiler of the user. the following error is
         common:
         `ValueError: Big-endian buffer not supported on little-endian compiler`
+
+        FITS files are memory-mapped, and only the `columns` asked for are
+        read. FITS data is big-endian: each column is byte-swapped in
+        place, in the private copy-on-write pages of the mapping, and
+        viewed as native instead of being copied, and the DataFrame is
+        built without another copy.
+
+        Only the `columns` asked for are parsed out of CSV files. With
+        `cache`, CSV files are parsed once: the first parse writes the
+        columns into a hidden `.<name>.npz` sidecar, next to the file, from
+        which later reads load them while the file keeps its modification
+        time and size.
+
+        Parameters:
+        - file_path (str): Path to the FITS or CSV file.
+        - columns (list of str, optional): The columns to read. Defaults to
+          all of them.
+        - track_memory (bool, optional): Whether to measure the peak memory
+          allocated while reading, with `tracemalloc`. Defaults to False.
+        - csv_dtype (type or dict, optional): CSV only: the dtype the
+          columns, or some of them, are parsed with. Defaults to the
+          inferred ones. The dtype policy `self.dtype`, if any, is then
+          applied to every floating-point column.
+        - engine (str, optional): CSV only: the `pd.read_csv` engine.
+          Defaults to C; "pyarrow", if installed, is faster on large files.
+        - cache (bool, optional): CSV only: whether to load the columns
+          from the binary sidecar of the file, written by the first parse,
+          while the file is unchanged. Defaults to False, as the sidecar
+          is written into the directory of the file.
+
+        `self.load_stats` reports the columns read, the bytes of data read
+        out of the bytes in the table, the time spent and, if tracked, the
+        peak memory in bytes. The pages of the memory map are not allocated
+        by Python, so they are not counted in the peak memory; the columns
+        of the DataFrame keep the file mapped while they are alive.
         """
-        if file_path.endswith(".fits"):
-            with fits.open(file_path) as hdul:
-                data = hdul[1].data
-
-                # Create an empty dictionary for converted data
-                converted_data = {}
-
-                # Determine the native byte order
-                native_byte_order = (">", "<")[sys.byteorder == "little"]
-
-                # Iterate through columns and convert data if necessary
-                for (
-                    colname
-                ) in data.names:  # Use `data.names` to get column names
-                    coldata = data[colname]
-                    # Check if data byte order matches the system's native byte order
-                    if coldata.dtype.byteorder not in (
-                        native_byte_order,
-                        "=",
-                        "|",
-                    ):
-                        coldata = coldata.byteswap().newbyteorder()
-                    converted_data[colname] = coldata
-
-                # Create DataFrame from converted data
-                self.df = pd.DataFrame(converted_data)
-        elif file_path.endswith(".csv"):
-            try:
-                self.df = pd.read_csv(file_path)
-            except Exception as e:
+        tracing = track_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            if file_path.endswith(".fits"):
+                bytes_read, bytes_total = self._read_fits(file_path, columns)
+            elif file_path.endswith(".csv"):
+                self.df, bytes_read = read_csv(
+                    file_path,
+                    columns,
+                    dtype=csv_dtype,
+                    engine=engine,
+                    cache=cache,
+                )
+                bytes_total = (
+                    os.path.getsize(file_path)
+                    if os.path.exists(file_path)
+                    else None
+                )
+            else:
                 raise ValueError(
-                    f"the relative path is not correct, we are running on path: {os.getcwd()}"
+                    f"""
+                Unsupported file format for the file: '{file_path}'.
+                Please provide a FITS or CSV file."""
                 )
-        else:
-            raise ValueError(
-                f"""
-            Unsupported file format for the file: '{file_path}'.
-            Please provide a FITS or CSV file."""
+            peak_memory = (
+                tracemalloc.get_traced_memory()[1] if track_memory else None
             )
+        finally:
+            if tracing:
+                tracemalloc.stop()
 
-    def normalize_column(self, column_name):
+        if self.dtype is not None:
+            self.df = _apply_dtype(self.df, self.dtype)
+
+        self.load_stats = {
+            "columns": list(self.df.columns),
+            "bytes_read": bytes_read,
+            "bytes_total": bytes_total,
+            "seconds": time.perf_counter() - start,
+            "peak_memory": peak_memory,
+        }
+
+    def _read_fits(self, file_path, columns):
+        """Read the `columns` of the table in HDU 1 into `self.df`.
+
+        Returns the bytes of data read, and the bytes of data in the table.
+        """
+        with fits.open(file_path, memmap=True) as hdul:
+            hdu = hdul[1]
+            names = list(hdu.columns.names)
+            if columns is None:
+                columns = names
+            missing = [name for name in columns if name not in names]
+            if missing:
+                raise ValueError(
+                    f"Columns {missing} do not exist in '{file_path}'."
+                )
+
+            data = hdu.data
+            converted_data = {}
+            bytes_read = 0
+            for colname in columns:
+                coldata = _native_byte_order(data[colname])
+                itemsize = data.dtype.fields[colname][0].itemsize
+                bytes_read += itemsize * len(data)
+                if coldata.ndim > 1:
+                    coldata = list(coldata)  # One array per row.
+                converted_data[colname] = coldata
+            bytes_total = data.nbytes if len(names) else 0
+
+            # Create DataFrame from converted data
+            self.df = pd.DataFrame(converted_data, copy=False)
+        return bytes_read, bytes_total
+
+    def normalize_column(self, column_name, statistics=None):
+        """
+        Standardize a column to zero mean and unit variance.
+
+        Parameters:
+        - column_name (str): The column.
+        - statistics (StreamingStatistics, optional): Statistics fitted on
+          many spectra, whose mean and standard deviation are used instead
+          of those of this spectrum.
+        """
         if column_name not in self.df.columns:
             raise ValueError(
                 f"Column '{column_name}' does not exist in the DataFrame."
@@ -80,14 +196,35 @@ class DataPreprocessing:
 
         column_values = self.df[column_name]
 
-        std_value = np.std(column_values)
+        if statistics is not None:
+            mean_value, std_value = statistics.normalizer(column_name)
+        elif self.dtype is not None:
+            # Accumulated in float64, applied in the dtype of the policy.
+            # Missing pixels are skipped, as pandas does without a policy.
+            values = column_values.to_numpy()
+            mean_value = float(np.nanmean(values, dtype=np.float64))
+            std_value = float(np.nanstd(values, dtype=np.float64))
+        else:
+            mean_value = np.mean(column_values)
+            std_value = np.std(column_values)
 
-        normalized_values = (
-            column_values - np.mean(column_values)
-        ) / std_value
-        self.df[column_name] = normalized_values
+        normalized_values = (column_values - mean_value) / std_value
+        self.df[column_name] = self._apply_dtype(normalized_values)
 
-    def remove_outliers_column(self, column_name):
+    def remove_outliers_column(self, column_name, statistics=None):
+        """
+        Remove the rows whose value of a column is an outlier, by the IQR
+        rule.
+
+        Parameters:
+        - column_name (str): The column.
+        - statistics (StreamingStatistics, optional): Statistics fitted on
+          many spectra, whose quartiles are used instead of those of this
+          spectrum.
+
+        Returns:
+        - tuple: The lower and upper bounds.
+        """
         if column_name not in self.df.columns:
             raise ValueError(
                 f"Column '{column_name}' does not exist in the DataFrame."
@@ -95,14 +232,17 @@ class DataPreprocessing:
 
         column_values = self.df[column_name]
 
-        # Calculate Q1, Q3, and IQR using NumPy
-        q1 = np.percentile(column_values, 25)
-        q3 = np.percentile(column_values, 75)
-        iqr = q3 - q1
+        if statistics is not None:
+            lower_bound, upper_bound = statistics.outlier_bounds(column_name)
+        else:
+            # Calculate Q1, Q3, and IQR using NumPy
+            q1 = np.percentile(column_values, 25)
+            q3 = np.percentile(column_values, 75)
+            iqr = q3 - q1
 
-        # Calculate lower and upper bounds for outliers
-        lower_bound = q1 - 1.5 * iqr
-        upper_bound = q3 + 1.5 * iqr
+            # Calculate lower and upper bounds for outliers
+            lower_bound = q1 - 1.5 * iqr
+            upper_bound = q3 + 1.5 * iqr
 
         # Filter out outliers based on the IQR rule
         self.df = self.df[
@@ -113,6 +253,10 @@ class DataPreprocessing:
     def correct_redshift(
         self, wavelength_column="Wavelength", flux_column="Flux"
     ):
+        """
+        Add a `<flux_column>_corrected` column: the flux divided by the
+        redshifted wavelengths. See `to_rest_frame` for rest-frame spectra.
+        """
         if (
             wavelength_column not in self.df.columns
             or flux_column not in self.df.columns
@@ -121,39 +265,91 @@ class DataPreprocessing:
                 f"Specified columns '{wavelength_column}' and '{flux_column}' must exist in the DataFrame."
             )
 
-        # Create a new column for corrected flux
         corrected_redshift_column = f"{flux_column}_corrected"
-        self.df[corrected_redshift_column] = None
 
-        if (
-            wavelength_column not in self.df.columns
-            and wavelength_column != "Wavelength"
-        ):
+        # Use the redshifted wavelengths to correct the flux. A Python float
+        # keeps float32 columns float32.
+        redshifted_wavelengths = self.df[wavelength_column].values * (
+            1 + float(self.redshift)
+        )
+        corrected_flux = self.df[flux_column].values / redshifted_wavelengths
+
+        # Update the DataFrame with corrected flux values
+        self.df[corrected_redshift_column] = self._apply_dtype(corrected_flux)
+
+    def to_rest_frame(
+        self,
+        wavelength_column="Wavelength",
+        flux_column="Flux",
+        ivar_column=None,
+    ):
+        """
+        Add the rest-frame wavelengths, flux densities and, if given, inverse
+        variances, as `<column>_rest` columns. See `redshift.to_rest_frame`.
+        """
+        names = [wavelength_column, flux_column] + (
+            [ivar_column] if ivar_column else []
+        )
+        missing = [name for name in names if name not in self.df.columns]
+        if missing:
             raise ValueError(
-                f"Specified column '{wavelength_column}' must exist in the DataFrame."
+                f"Columns {missing} do not exist in the DataFrame."
             )
 
-        # Convert wavelengths to observed frame
-        observed_wavelengths = self.df[wavelength_column].values * (
-            1 + self.redshift
+        rest = to_rest_frame(
+            *(self.df[name].to_numpy() for name in names[:2]),
+            self.redshift,
+            ivar=self.df[ivar_column].to_numpy() if ivar_column else None,
         )
+        for name, values in zip(names, rest):
+            self.df[f"{name}_rest"] = self._apply_dtype(values)
 
-        # Create an instance of WMAP9
-        cosmo = WMAP9
+    def normalize_continuum(
+        self,
+        flux_column="Flux",
+        wavelength_column="Wavelength",
+        method="median",
+        window=DEFAULT_WINDOW,
+        ivar_column=None,
+        **options,
+    ):
+        """
+        Add the continuum of the flux, and the flux normalized by it, as
+        `<flux_column>_continuum` and `<flux_column>_normalized` columns.
 
-        # Calculate redshifted wavelengths using luminosity distance
-        luminosity_distance = cosmo.luminosity_distance(self.redshift).to(
-            u.Mpc
-        )
-        redshifted_wavelengths = self.df[wavelength_column].values * (
-            1 + self.redshift
-        )
+        Parameters:
+        - flux_column (str): The flux.
+        - wavelength_column (str): The wavelengths, used by the spline if
+          present.
+        - method (str): "median", "boxcar" or "spline". See
+          `continuum.fit_continuum`.
+        - window (int): The smoothing window, in pixels.
+        - ivar_column (str, optional): The inverse variance of the pixels.
+        - options: The other arguments of `continuum.fit_continuum`.
 
-        # Use the redshifted wavelengths to correct the flux
-        corrected_flux = self.df[flux_column].values / redshifted_wavelengths
+        Raises:
+        - ValueError: If a column does not exist.
+        """
+        names = [flux_column] + ([ivar_column] if ivar_column else [])
+        missing = [name for name in names if name not in self.df.columns]
+        if missing:
+            raise ValueError(
+                f"Columns {missing} do not exist in the DataFrame."
+            )
 
-        # Update the DataFrame with corrected flux values
-        self.df[corrected_redshift_column] = corrected_flux
+        wavelength = None
+        if method == "spline" and wavelength_column in self.df.columns:
+            wavelength = self.df[wavelength_column].to_numpy()
+        continuum, normalized = fit_continuum(
+            self.df[flux_column].to_numpy(),
+            wavelength,
+            method=method,
+            window=window,
+            ivar=self.df[ivar_column].to_numpy() if ivar_column else None,
+            **options,
+        )
+        self.df[f"{flux_column}_continuum"] = self._apply_dtype(continuum)
+        self.df[f"{flux_column}_normalized"] = self._apply_dtype(normalized)
 
     def wave_align(
         self, wavelength_column="Wavelength", loglam_column="LOGLAM"
@@ -161,7 +357,11 @@ class DataPreprocessing:
         """
         Align spectra wavelengths within a predefined range.
         """
-        if loglam_column in self.df.columns:
+        if loglam_column in self.df.columns and self.dtype is not None:
+            # In float64: 10 ** x amplifies the rounding error of x.
+            loglam = self.df[loglam_column].to_numpy(dtype=np.float64)
+            self.df[wavelength_column] = self._apply_dtype(10**loglam)
+        elif loglam_column in self.df.columns:
             # If LogLam column is present, use it to calculate 'Wavelength'
             self.df[wavelength_column] = 10 ** self.df[loglam_column]
 
@@ -170,3 +370,642 @@ class DataPreprocessing:
             (self.df[wavelength_column] >= self.MIN_TARGET_WAVELENGTH)
             & (self.df[wavelength_column] <= self.MAX_TARGET_WAVELENGTH)
         ]
+
+    def interpolate(
+        self,
+        grid,
+        wavelength_column="Wavelength",
+        columns=None,
+        method="linear",
+        ivar_column=None,
+        loglam_column="LOGLAM",
+    ):
+        """
+        Resample the spectrum onto a wavelength grid.
+
+        Pixels with a zero inverse variance, or a non-finite value, are
+        filled by interpolation from their neighbours first. The resampled
+        columns replace the DataFrame; the other ones, such as the inverse
+        variance, are dropped, and `loglam_column` is recomputed if present.
+
+        Parameters:
+        - grid (array-like): The strictly increasing wavelengths to
+          resample onto.
+        - wavelength_column (str): The wavelengths of the spectrum, computed
+          from `loglam_column` if missing.
+        - columns (list of str, optional): The columns to resample. Defaults
+          to all the numeric ones, except the wavelengths and inverse
+          variance.
+        - method (str): "linear" (interpolation) or "flux_conserving"
+          (rebinning). See the `resampling` module.
+        - ivar_column (str, optional): The inverse variance of the pixels.
+
+        Raises:
+        - ValueError: If a column does not exist, or the method or grids
+          are invalid.
+        """
+        wavelengths, columns = _resampled_columns(
+            self.df, wavelength_column, columns, ivar_column, loglam_column
+        )
+        valid = None
+        if ivar_column is not None:
+            valid = np.broadcast_to(
+                self.df[ivar_column].to_numpy() > 0,
+                (len(columns), len(self.df)),
+            )
+        values = np.array(
+            [self.df[name].to_numpy(dtype=np.float64) for name in columns]
+        ).reshape(len(columns), len(self.df))
+        grid = np.asarray(grid, dtype=np.float64)
+        resampled = resample(
+            wavelengths, values, grid, method=method, mask=valid
+        )
+
+        df = pd.DataFrame({wavelength_column: grid})
+        if loglam_column in self.df.columns:
+            df[loglam_column] = np.log10(grid)
+        for name, values in zip(columns, resampled):
+            df[name] = values
+        self.df = df if self.dtype is None else _apply_dtype(df, self.dtype)
+
+    def _apply_dtype(self, values):
+        """Cast computed values to the dtype policy, if any."""
+        if self.dtype is None:
+            return values
+        return np.asarray(values).astype(self.dtype, copy=False)
+
+
+def _float_dtype(dtype):
+    """Check a dtype policy: None, or a floating-point dtype."""
+    if dtype is None:
+        return None
+    dtype = np.dtype(dtype)
+    if dtype.kind != "f":
+        raise ValueError(
+            f"The dtype must be a floating-point one, not {dtype}."
+        )
+    return dtype
+
+
+def _apply_dtype(df, dtype):
+    """Cast the floating-point columns of a DataFrame to `dtype`."""
+    casts = {
+        name: dtype
+        for name, column_dtype in df.dtypes.items()
+        if column_dtype.kind == "f" and column_dtype != dtype
+    }
+    return df.astype(casts) if casts else df
+
+
+def _native_byte_order(array):
+    """Returns `array` in the native byte order, without a copy if possible.
+
+    Writable arrays, such as the copy-on-write memory maps of FITS files,
+    are byte-swapped in place and viewed with the native dtype. Read-only
+    ones are converted in a single copy.
+    """
+    if array.dtype.isnative:
+        return array
+    native_dtype = array.dtype.newbyteorder("=")
+    if array.flags.writeable:
+        return array.byteswap(inplace=True).view(native_dtype)
+    return array.astype(native_dtype)
+
+
+class SpectrumBatch:
+    """Many spectra, stored as 2-D arrays and processed all at once.
+
+    Every column (e.g. "Wavelength", "Flux") is an array of shape
+    (n_spectra, n_pixels). Spectra shorter than `n_pixels` are padded, and
+    `mask` tells the valid pixels (True) from the padding and from pixels
+    removed by `remove_outliers_column` or `wave_align` (False). The
+    operations of `DataPreprocessing` are vectorized along the spectrum
+    axis, so a batch costs a few NumPy calls instead of one DataFrame per
+    spectrum.
+    """
+
+    def __init__(
+        self,
+        columns,
+        min_target_wavelength: float,
+        max_target_wavelength: float,
+        mask=None,
+        redshift=0.0,
+        dtype=np.float64,
+    ):
+        """
+        Initialize a batch from 2-D columns.
+
+        Parameters:
+        - columns (dict): Maps column names to arrays of shape
+          (n_spectra, n_pixels).
+        - min_target_wavelength, max_target_wavelength (float): The range
+          kept by `wave_align`.
+        - mask (array of bool, optional): Valid pixels, of the same shape.
+          Defaults to all pixels being valid.
+        - redshift (float or array): The redshift of every spectrum, or one
+          per spectrum.
+        - dtype (str or numpy.dtype): The dtype of the columns, e.g.
+          "float32" to halve the memory of a batch. Reductions are
+          accumulated in float64. Defaults to float64.
+
+        Raises:
+        - ValueError: If the columns, mask and redshifts do not have
+          matching shapes, or `dtype` is not a floating-point dtype.
+        """
+        self.dtype = _float_dtype(dtype)
+        self.columns = {
+            name: np.asarray(values, dtype=self.dtype)
+            for name, values in columns.items()
+        }
+        shapes = {values.shape for values in self.columns.values()}
+        if len(shapes) != 1 or len(next(iter(shapes))) != 2:
+            raise ValueError("Columns must be 2-D arrays of the same shape.")
+        shape = shapes.pop()
+
+        self.mask = (
+            np.ones(shape, dtype=bool)
+            if mask is None
+            else np.asarray(mask, dtype=bool)
+        )
+        if self.mask.shape != shape:
+            raise ValueError("The mask must have the shape of the columns.")
+
+        self.redshift = np.broadcast_to(
+            np.asarray(redshift, dtype=np.float64), shape[:1]
+        ).copy()
+        self.MIN_TARGET_WAVELENGTH = min_target_wavelength
+        self.MAX_TARGET_WAVELENGTH = max_target_wavelength
+
+    @classmethod
+    def from_spectra(
+        cls,
+        spectra,
+        min_target_wavelength: float,
+        max_target_wavelength: float,
+        redshift=0.0,
+        dtype=np.float64,
+    ):
+        """
+        Build a batch from spectra of possibly different lengths.
+
+        Parameters:
+        - spectra (iterable): Spectra as DataFrames, or as dicts mapping
+          column names to 1-D arrays. Only the columns common to all of
+          them are kept.
+        - min_target_wavelength, max_target_wavelength, redshift, dtype: As
+          in `SpectrumBatch`.
+
+        Returns:
+        - SpectrumBatch: The padded and masked spectra.
+
+        Raises:
+        - ValueError: If there is no spectrum, or no column common to all.
+        """
+        spectra = list(spectra)
+        if not spectra:
+            raise ValueError("At least one spectrum is needed.")
+        names = [
+            name
+            for name in spectra[0].keys()
+            if all(name in spectrum for spectrum in spectra[1:])
+        ]
+        if not names:
+            raise ValueError("The spectra have no column in common.")
+        lengths = np.array([len(spectrum[names[0]]) for spectrum in spectra])
+        shape = (len(spectra), int(lengths.max()))
+
+        columns = {}
+        for name in names:
+            values = np.full(shape, np.nan, dtype=dtype)
+            for row, spectrum in enumerate(spectra):
+                values[row, : lengths[row]] = spectrum[name]
+            columns[name] = values
+        mask = np.arange(shape[1]) < lengths[:, None]
+        return cls(
+            columns,
+            min_target_wavelength,
+            max_target_wavelength,
+            mask=mask,
+            redshift=redshift,
+            dtype=dtype,
+        )
+
+    @classmethod
+    def from_files(
+        cls,
+        file_paths,
+        min_target_wavelength: float,
+        max_target_wavelength: float,
+        redshift=0.0,
+        columns=None,
+        dtype=np.float64,
+    ):
+        """
+        Read FITS or CSV spectra files into a batch.
+
+        Only the given `columns` are read from the files, as in
+        `DataPreprocessing.read_data`, with the dtype policy `dtype`.
+        """
+        return cls.from_spectra(
+            (
+                DataPreprocessing(
+                    file_path,
+                    min_target_wavelength,
+                    max_target_wavelength,
+                    columns=columns,
+                    dtype=dtype,
+                ).df
+                for file_path in file_paths
+            ),
+            min_target_wavelength,
+            max_target_wavelength,
+            redshift=redshift,
+            dtype=dtype,
+        )
+
+    @property
+    def n_spectra(self):
+        return self.mask.shape[0]
+
+    @property
+    def n_pixels(self):
+        return self.mask.shape[1]
+
+    @property
+    def lengths(self):
+        """The number of valid pixels of every spectrum."""
+        return self.mask.sum(axis=1)
+
+    def _column(self, column_name):
+        if column_name not in self.columns:
+            raise ValueError(
+                f"Column '{column_name}' does not exist in the batch."
+            )
+        return self.columns[column_name]
+
+    def normalize_column(self, column_name):
+        """
+        Standardize a column of every spectrum to zero mean and unit
+        variance, over its valid pixels, skipping missing values.
+        """
+        values = self._column(column_name)
+        mean, std = (
+            reduction(
+                values,
+                axis=1,
+                where=self.mask,
+                keepdims=True,
+                dtype=np.float64,
+            ).astype(self.dtype)
+            for reduction in (np.nanmean, np.nanstd)
+        )
+        self.columns[column_name] = (values - mean) / std
+
+    def remove_outliers_column(self, column_name):
+        """
+        Mask the outliers of a column of every spectrum, by the IQR rule.
+
+        Returns:
+        - tuple: The lower and upper bounds of every spectrum.
+        """
+        values = self._column(column_name)
+        q1, q3 = _masked_percentiles(values, self.mask, [25, 75])
+        iqr = q3 - q1
+        lower_bound = q1 - 1.5 * iqr
+        upper_bound = q3 + 1.5 * iqr
+
+        self.mask &= (values >= lower_bound[:, None]) & (
+            values <= upper_bound[:, None]
+        )
+        return lower_bound, upper_bound
+
+    def correct_redshift(
+        self, wavelength_column="Wavelength", flux_column="Flux"
+    ):
+        """
+        Add a `<flux_column>_corrected` column: the flux divided by the
+        redshifted wavelengths, with the redshift of every spectrum.
+        """
+        if (
+            wavelength_column not in self.columns
+            or flux_column not in self.columns
+        ):
+            raise ValueError(
+                f"Specified columns '{wavelength_column}' and "
+                f"'{flux_column}' must exist in the batch."
+            )
+        redshifted_wavelengths = self.columns[wavelength_column] * (
+            1 + self.redshift[:, None]
+        ).astype(self.dtype)
+        self.columns[f"{flux_column}_corrected"] = (
+            self.columns[flux_column] / redshifted_wavelengths
+        )
+
+    def to_rest_frame(
+        self,
+        wavelength_column="Wavelength",
+        flux_column="Flux",
+        ivar_column=None,
+    ):
+        """
+        Add the rest-frame columns of every spectrum, with its own redshift,
+        in one vectorized call. See `DataPreprocessing.to_rest_frame`.
+        """
+        names = [wavelength_column, flux_column] + (
+            [ivar_column] if ivar_column else []
+        )
+        rest = to_rest_frame(
+            *(self._column(name) for name in names[:2]),
+            self.redshift,
+            ivar=self._column(ivar_column) if ivar_column else None,
+        )
+        for name, values in zip(names, rest):
+            self.columns[f"{name}_rest"] = values.astype(
+                self.dtype, copy=False
+            )
+
+    def luminosity_distance(self, cosmology=WMAP9):
+        """
+        Get the luminosity distance of every spectrum, in Mpc, from the
+        cached distance table of the cosmology.
+        """
+        return luminosity_distance(self.redshift, cosmology)
+
+    def normalize_continuum(
+        self,
+        flux_column="Flux",
+        wavelength_column="Wavelength",
+        method="median",
+        window=DEFAULT_WINDOW,
+        ivar_column=None,
+        **options,
+    ):
+        """
+        Add the continuum of the flux of every spectrum, and the flux
+        normalized by it, as in `DataPreprocessing.normalize_continuum`.
+
+        Masked pixels are filled by interpolation, or given no weight. The
+        spline is fitted on the wavelengths if all the spectra share them,
+        as after `resample`, else on the pixel indices.
+        """
+        flux = self._column(flux_column)
+        wavelength = None
+        if method == "spline" and wavelength_column in self.columns:
+            wavelengths = self.columns[wavelength_column]
+            if (wavelengths == wavelengths[:1]).all():
+                wavelength = wavelengths[0]
+        continuum, normalized = fit_continuum(
+            flux,
+            wavelength,
+            method=method,
+            window=window,
+            mask=self.mask,
+            ivar=self._column(ivar_column) if ivar_column else None,
+            **options,
+        )
+        self.columns[f"{flux_column}_continuum"] = continuum
+        self.columns[f"{flux_column}_normalized"] = normalized
+
+    def wave_align(
+        self, wavelength_column="Wavelength", loglam_column="LOGLAM"
+    ):
+        """
+        Mask the pixels of every spectrum outside of the target range.
+        """
+        if loglam_column in self.columns:
+            # In float64: 10 ** x amplifies the rounding error of x.
+            loglam = self.columns[loglam_column].astype(np.float64, copy=False)
+            self.columns[wavelength_column] = (10**loglam).astype(
+                self.dtype, copy=False
+            )
+
+        wavelengths = self._column(wavelength_column)
+        self.mask &= (wavelengths >= self.MIN_TARGET_WAVELENGTH) & (
+            wavelengths <= self.MAX_TARGET_WAVELENGTH
+        )
+
+    def resample(
+        self,
+        grid,
+        wavelength_column="Wavelength",
+        columns=None,
+        method="linear",
+        ivar_column=None,
+        loglam_column="LOGLAM",
+    ):
+        """
+        Resample every spectrum onto a common wavelength grid.
+
+        As `DataPreprocessing.interpolate`, where masked pixels are filled
+        by interpolation too. Spectra on one wavelength lattice, such as
+        SDSS's log-lambda grid, are resampled with a single sparse matrix
+        product, even when they start and end at different pixels. Spectra
+        on unrelated grids are resampled with one product per distinct
+        grid.
+
+        Afterwards, the batch has `len(grid)` pixels, and the pixels outside
+        of the range of the valid input pixels of a spectrum are masked.
+        """
+        if (
+            wavelength_column not in self.columns
+            and loglam_column in self.columns
+        ):
+            self.columns[wavelength_column] = 10 ** self.columns[loglam_column]
+        wavelengths, columns = _resampled_columns(
+            self.columns,
+            wavelength_column,
+            columns,
+            ivar_column,
+            loglam_column,
+        )
+        grid = np.asarray(grid, dtype=np.float64)
+
+        finite = np.isfinite(wavelengths)
+        valid = self.mask & finite
+        if ivar_column is not None:
+            valid &= self.columns[ivar_column] > 0
+        values = np.stack([self.columns[name] for name in columns], axis=1)
+
+        resampled = np.full((self.n_spectra, len(columns), len(grid)), np.nan)
+        for input_grid, rows in _input_grids(wavelengths, finite):
+            # Scatter the pixels of the rows onto their shared input grid.
+            n_rows = len(rows)
+            scattered = np.full(
+                (n_rows, len(columns), len(input_grid)), np.nan
+            )
+            scattered_valid = np.zeros((n_rows, len(input_grid)), dtype=bool)
+            row, pixel = np.nonzero(finite[rows])
+            position = np.searchsorted(
+                input_grid, wavelengths[rows][row, pixel]
+            )
+            scattered[row, :, position] = values[rows][row, :, pixel]
+            scattered_valid[row, position] = valid[rows][row, pixel]
+
+            resampled[rows] = resample(
+                input_grid,
+                scattered.reshape(-1, len(input_grid)),
+                grid,
+                method=method,
+                mask=np.repeat(scattered_valid, len(columns), axis=0),
+            ).reshape(n_rows, len(columns), len(grid))
+
+        low = np.where(valid, wavelengths, np.inf).min(axis=1, initial=np.inf)
+        high = np.where(valid, wavelengths, -np.inf).max(
+            axis=1, initial=-np.inf
+        )
+        self.mask = (
+            (grid >= low[:, None])
+            & (grid <= high[:, None])
+            & np.isfinite(resampled).all(axis=1)
+        )
+        had_loglam = loglam_column in self.columns
+        self.columns = {
+            wavelength_column: np.broadcast_to(
+                grid, (self.n_spectra, len(grid))
+            ).copy()
+        }
+        if had_loglam:
+            self.columns[loglam_column] = np.log10(
+                self.columns[wavelength_column]
+            )
+        for index, name in enumerate(columns):
+            self.columns[name] = resampled[:, index]
+        self.columns = {
+            name: values.astype(self.dtype, copy=False)
+            for name, values in self.columns.items()
+        }
+
+    def compact(self):
+        """
+        Move the valid pixels of every spectrum to the front, keeping their
+        order, and drop the pixels that are invalid in every spectrum.
+        """
+        order = np.argsort(~self.mask, axis=1, kind="stable")
+        width = int(self.lengths.max(initial=0))
+        order = order[:, :width]
+        self.columns = {
+            name: np.take_along_axis(values, order, axis=1)
+            for name, values in self.columns.items()
+        }
+        self.mask = np.take_along_axis(self.mask, order, axis=1)
+
+    def spectrum(self, index):
+        """
+        Get the valid pixels of one spectrum as a DataFrame.
+        """
+        valid = self.mask[index]
+        return pd.DataFrame(
+            {
+                name: values[index, valid]
+                for name, values in self.columns.items()
+            }
+        )
+
+
+def _resampled_columns(
+    table, wavelength_column, columns, ivar_column, loglam_column
+):
+    """The wavelengths of a DataFrame or batch, and the columns to resample.
+
+    Wavelengths are computed from `loglam_column` if missing.
+    """
+    if wavelength_column in table:
+        wavelengths = np.asarray(table[wavelength_column], dtype=np.float64)
+    elif loglam_column in table:
+        wavelengths = 10 ** np.asarray(table[loglam_column], dtype=np.float64)
+    else:
+        raise ValueError(
+            f"Column '{wavelength_column}' does not exist, "
+            f"nor '{loglam_column}'."
+        )
+    names = list(table.keys())
+    if columns is None:
+        columns = [
+            name
+            for name in names
+            if name not in (wavelength_column, loglam_column, ivar_column)
+            and np.asarray(table[name]).dtype.kind in "biuf"
+        ]
+    missing = [
+        name
+        for name in [*columns, *([ivar_column] if ivar_column else [])]
+        if name not in names
+    ]
+    if missing:
+        raise ValueError(f"Columns {missing} do not exist.")
+    return wavelengths, list(columns)
+
+
+def _input_grids(wavelengths, finite):
+    """Group the rows of a batch by the wavelength grid they lie on.
+
+    Yields (grid, rows) pairs. If the rows share one lattice, that is, every
+    row is a run of consecutive points of one grid that is uniform in
+    wavelength or in log-wavelength, they form a single group on the union
+    of their wavelengths; otherwise, rows are grouped by their exact grid.
+    Rows of less than 2 wavelengths are left out.
+    """
+    usable = finite.sum(axis=1) >= 2
+    lattice = np.unique(wavelengths[finite & usable[:, None]])
+    if _is_shared_lattice(lattice, wavelengths[usable], finite[usable]):
+        yield lattice, np.flatnonzero(usable)
+        return
+
+    groups = {}
+    for row in np.flatnonzero(usable):
+        grid = wavelengths[row, finite[row]]
+        groups.setdefault(grid.tobytes(), (grid, []))[1].append(row)
+    for grid, rows in groups.values():
+        yield grid, np.array(rows)
+
+
+def _is_shared_lattice(lattice, wavelengths, finite, rtol=1e-6):
+    """Whether the union `lattice` of the rows is uniform, in wavelength or
+    in log-wavelength, and every row steps through it without gaps.
+
+    Near-duplicate wavelengths of different rows, or rows on a coarser or
+    shifted grid, make the union non-uniform or leave gaps in a row, so
+    that the rows are not merged.
+    """
+    if len(lattice) < 2:
+        return False
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for transform in (np.asarray, np.log10):
+            steps = np.diff(transform(lattice))
+            step = steps.mean()
+            if not np.allclose(steps, step, rtol=rtol, atol=0):
+                continue
+            coordinates = transform(np.where(finite, wavelengths, np.nan))
+            row_steps = np.diff(coordinates, axis=1)
+            adjacent = finite[:, 1:] & finite[:, :-1]
+            if not np.allclose(row_steps[adjacent], step, rtol=rtol, atol=0):
+                continue
+            # Without interior gaps, a row spans one step fewer than its
+            # number of wavelengths.
+            span = np.nanmax(coordinates, axis=1) - np.nanmin(
+                coordinates, axis=1
+            )
+            return np.allclose(
+                span / step, finite.sum(axis=1) - 1, rtol=0, atol=1e-3
+            )
+    return False
+
+
+def _masked_percentiles(values, mask, percentiles):
+    """Percentiles of the valid values of every row, with linear
+    interpolation as `np.percentile`, without a Python loop over rows."""
+    # Invalid values are sorted to the end of their row.
+    ordered = np.sort(np.where(mask, values, np.inf), axis=1)
+    counts = mask.sum(axis=1)
+    results = []
+    for percentile in percentiles:
+        position = (counts - 1).clip(min=0) * (percentile / 100)
+        below = np.floor(position).astype(np.intp)
+        above = np.minimum(below + 1, (counts - 1).clip(min=0))
+        low = np.take_along_axis(ordered, below[:, None], axis=1)[:, 0]
+        high = np.take_along_axis(ordered, above[:, None], axis=1)[:, 0]
+        with np.errstate(invalid="ignore"):  # Rows without valid values.
+            result = low + (high - low) * (position - below)
+        results.append(np.where(counts > 0, result, np.nan))
+    return results
@@ -1,21 +1,146 @@
+import threading
+from collections import defaultdict
+
 import pandas as pd
 from astropy.io import fits
+from astropy.table import Table
 
 from astrolibrary import QueryHandler
 
+# Columns resolved from SkyServer for every spectrum.
+_METADATA_SELECT = """
+    SELECT p.objid,p.ra,p.dec,p.u,p.g,p.r,p.i,p.z,
+    p.run, p.rerun, p.camcol, p.field,
+    s.specobjid, s.class, s.z as redshift,
+    s.plate, s.mjd, s.fiberid
+    FROM PhotoObj AS p
+    JOIN SpecObj AS s ON s.bestobjid = p.objid
+"""
+_PHOTOMETRY_BANDS = ["u", "g", "r", "i", "z"]
+
+# The BatchMetaDataExtractor shared by the MetaDataExtractors given none,
+# so that they share one QueryHandler and its resolved spectra.
+_shared_batch = None
+_shared_batch_lock = threading.Lock()
+
+
+# Offline metadata fields, and the primary header cards and SpecObj (HDU 2)
+# columns of SDSS spectra files they are read from.
+_HEADER_CARDS = {
+    "plate": "PLATEID",
+    "mjd": "MJD",
+    "fiberid": "FIBERID",
+    "ra": "PLUG_RA",
+    "dec": "PLUG_DEC",
+}
+_SPECOBJ_COLUMNS = {
+    "plate": "PLATE",
+    "mjd": "MJD",
+    "fiberid": "FIBERID",
+    "ra": "PLUG_RA",
+    "dec": "PLUG_DEC",
+    "class": "CLASS",
+    "subclass": "SUBCLASS",
+    "redshift": "Z",
+    "redshift_err": "Z_ERR",
+}
+
+
+def _default_batch():
+    """Get the shared BatchMetaDataExtractor, creating it once."""
+    global _shared_batch
+    with _shared_batch_lock:
+        if _shared_batch is None:
+            _shared_batch = BatchMetaDataExtractor()
+        return _shared_batch
+
 
 class MetaDataExtractor:
-    def __init__(self, file_path):
+    def __init__(self, file_path, batch=None):
         """
         Initialize the MetaDataExtractor.
 
+        The file is memory-mapped and its HDUs are only read when needed:
+        offline metadata only reads the primary header and the SpecObj row
+        of HDU 2, and `df` is only built on first access.
+
         Parameters:
         - file_path (str): Path to the data file (FITS or CSV).
+        - batch (BatchMetaDataExtractor, optional): Resolves the metadata
+          missing from the file, with its query handler and memoized
+          spectra (default: one shared by every extractor given none).
         """
-        hdul = fits.open(file_path)
-        data = hdul[1].data
-        self.df = pd.DataFrame(data)
+        self.file_path = file_path
+        self.batch = batch
+        self._hdul = fits.open(file_path, memmap=True)
+        self._df = None
+        self._offline_metadata = None
         self.metadata = None
+        self._metadata_fetched = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Close the file.
+        """
+        self._hdul.close()
+
+    @property
+    def df(self):
+        """
+        Dataframe of the table in HDU 1, built on first access.
+        """
+        if self._df is None:
+            self._df = pd.DataFrame(self._hdul[1].data)
+        return self._df
+
+    def _hdu1_has(self, *column_names):
+        columns = getattr(self._hdul[1], "columns", None)
+        return columns is not None and set(column_names) <= set(columns.names)
+
+    def get_offline_metadata(self):
+        """
+        Get the metadata stored in the file itself, without any query.
+
+        Reads the primary header cards (PLATEID, MJD, FIBERID, PLUG_RA,
+        PLUG_DEC) and the SpecObj row in HDU 2 of SDSS spectra files.
+
+        Returns:
+        - dict: The fields found among plate, mjd, fiberid, ra, dec, class,
+          subclass, redshift and redshift_err.
+        """
+        if self._offline_metadata is not None:
+            return self._offline_metadata
+
+        metadata = {}
+        header = self._hdul[0].header
+        for field, card in _HEADER_CARDS.items():
+            if card in header:
+                metadata[field] = header[card]
+
+        if len(self._hdul) > 2 and isinstance(
+            self._hdul[2], (fits.BinTableHDU, fits.TableHDU)
+        ):
+            specobj = self._hdul[2]
+            names = set(specobj.columns.names)
+            for field, column in _SPECOBJ_COLUMNS.items():
+                if field not in metadata and column in names:
+                    value = specobj.data.field(column)[0]
+                    if hasattr(value, "item"):
+                        value = value.item()  # NumPy scalar to Python.
+                    if isinstance(value, bytes):
+                        value = value.decode()
+                    if isinstance(value, str):
+                        value = value.strip()
+                    metadata[field] = value
+
+        self._offline_metadata = metadata
+        return metadata
 
     def get_coordinates(self):
         """
@@ -25,7 +150,13 @@ class MetaDataExtractor:
         - tuple: Tuple containing the coordinates.
                  Also can be accessed by calling
                  get_metadata(df[["RACEN", "DECCEN"]]) as dataframe.
+                 For spectra files, the plug position of the fiber.
         """
+        offline = self.get_offline_metadata()
+        if not self._hdu1_has("RACEN", "DECCEN") and {"ra", "dec"} <= set(
+            offline
+        ):
+            return (offline["ra"], offline["dec"])
         return (self.df["RACEN"], self.df["DECCEN"])
 
     def get_identifiers(self):
@@ -41,45 +172,80 @@ class MetaDataExtractor:
         """
         Get the class of the object.
 
+        Read from the file if it has it, else queried from SDSS.
+
         Returns:
         - str: a string containing the class of the object.
-        """
 
-        data = self._extract_more_metadata()
-        return data["class"]
+        Raises:
+        - ValueError: If the file has no class and SDSS has no row for it.
+        """
+        offline = self.get_offline_metadata()
+        if "class" in offline:
+            return offline["class"]
+        return self._queried("class")
 
     def get_redshift(self):
         """
         Get the redshift of the data.
 
+        Read from the file if it has it, else queried from SDSS.
+
         Returns:
+        - float: The redshift.
+
+        Raises:
+        - ValueError: If the file has no redshift and SDSS has no row for
+          it.
         """
+        offline = self.get_offline_metadata()
+        if "redshift" in offline:
+            return offline["redshift"]
+        return self._queried("redshift")
+
+    def _queried(self, field):
+        """Get a field of the first row of metadata queried from SDSS."""
         data = self._extract_more_metadata()
-        return self._extract_more_metadata()["redshift"]
+        if data is None or len(data) == 0:
+            raise ValueError(f"SDSS has no metadata for '{self.file_path}'.")
+        value = data[field][0]
+        return value.item() if hasattr(value, "item") else value
 
     def _extract_more_metadata(self):
         """
         Extract more metadata from the data.
-        """
 
-        plate = int(self.df["PLATE"])
-        ra, de = int(self.df["RACEN"]), int(self.df["DECCEN"])
+        Spectra files are looked up by their (plate, mjd, fiberid), through
+        the batch extractor, which memoizes them across files; other files
+        by the plate and center of their HDU 1 table, with the query
+        handler of the batch extractor. The lookup runs once per extractor:
+        its results are kept in `self.metadata`, so later calls do not
+        reach SDSS again.
+        """
+        if self._metadata_fetched:
+            return self.metadata
 
-        qh = QueryHandler(dataset_name="SDSS")
-        qid = qh.run_query(
-            f"""
-            SELECT p.objid,p.ra,p.dec,p.u,p.g,p.r,p.i,p.z,
-            p.run, p.rerun, p.camcol, p.field,
-            s.specobjid, s.class, s.z as redshift,
-            s.plate, s.mjd, s.fiberid
-            FROM PhotoObj AS p
-            JOIN SpecObj AS s ON s.bestobjid = p.objid
+        batch = self.batch or _default_batch()
+        offline = self.get_offline_metadata()
+        if {"plate", "mjd", "fiberid"} <= set(offline):
+            record = batch.get(
+                (offline["plate"], offline["mjd"], offline["fiberid"])
+            )
+            self.metadata = None if record is None else Table(rows=[record])
+        else:
+            plate = int(self.df["PLATE"].iloc[0])
+            ra = int(self.df["RACEN"].iloc[0])
+            de = int(self.df["DECCEN"].iloc[0])
+            query = f"""
+            {_METADATA_SELECT}
             WHERE s.plate = {plate}
             AND p.ra = {ra}
             AND p.dec = {de}
             """
-        )
-        return qh.get_results(qid)
+            qh = batch.query_handler
+            self.metadata = qh.get_results(qh.run_query(query))
+        self._metadata_fetched = True
+        return self.metadata
 
     def get_metadata(self, list_of_columns):
         """
@@ -98,3 +264,212 @@ class MetaDataExtractor:
             ) from err
 
         return res
+
+
+class BatchMetaDataExtractor:
+    """Resolves the metadata of many spectra in a few queries.
+
+    Spectra are identified by their (plate, mjd, fiberid) keys, given
+    directly or read from spectra files. Their class, redshift and
+    photometry are resolved together, in chunked SkyServer JOIN queries that
+    run concurrently, instead of one query per spectrum. Results are
+    memoized per key, so the accessors only reach SDSS for keys that have
+    never been resolved.
+
+    Example:
+    >>> extractor = BatchMetaDataExtractor(
+    ...     keys=[(7644, 57327, 528), (7644, 57327, 529)]
+    ... )
+    >>> extractor.get_redshift((7644, 57327, 528))
+    """
+
+    def __init__(
+        self,
+        keys=(),
+        file_paths=(),
+        chunk_size=500,
+        query_handler=None,
+    ):
+        """
+        Initialize the BatchMetaDataExtractor.
+
+        Parameters:
+        - keys (iterable of (int, int, int)): (plate, mjd, fiberid) keys of
+          the spectra.
+        - file_paths (iterable of str): Paths to SDSS spectra FITS files,
+          whose keys are read from their headers.
+        - chunk_size (int): Maximum number of spectra per query
+          (default: 500).
+        - query_handler (QueryHandler): Handler used to run the queries
+          (default: a new SDSS handler).
+
+        Raises:
+        - ValueError: If chunk_size is not positive, or if a file has no
+          plate, mjd and fiberid.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer.")
+        self.chunk_size = chunk_size
+        self.query_handler = query_handler or QueryHandler(dataset_name="SDSS")
+        self.n_queries = 0
+        self._records = {}  # key -> dict of metadata, or None if not found.
+        self._pending = []
+        self.add(keys=keys, file_paths=file_paths)
+
+    def add(self, keys=(), file_paths=()):
+        """
+        Add spectra to resolve, by key or by file.
+
+        Parameters:
+        - keys (iterable of (int, int, int)): (plate, mjd, fiberid) keys.
+        - file_paths (iterable of str): Paths to SDSS spectra FITS files.
+
+        Returns:
+        - list: The keys of the added spectra, in order.
+        """
+        added = [self._normalize_key(key) for key in keys]
+        added += [self.key_from_file(file_path) for file_path in file_paths]
+        self._pending += [key for key in added if key not in self._records]
+        return added
+
+    @staticmethod
+    def _normalize_key(key):
+        plate, mjd, fiberid = key
+        return int(plate), int(mjd), int(fiberid)
+
+    @staticmethod
+    def key_from_file(file_path):
+        """
+        Read the (plate, mjd, fiberid) key of a spectrum file.
+
+        The key is read from the primary header (PLATEID, MJD, FIBERID),
+        or else from the SpecObj row in HDU 2.
+
+        Returns:
+        - tuple: (plate, mjd, fiberid)
+        """
+        with MetaDataExtractor(file_path) as extractor:
+            metadata = extractor.get_offline_metadata()
+        if {"plate", "mjd", "fiberid"} <= set(metadata):
+            return (
+                int(metadata["plate"]),
+                int(metadata["mjd"]),
+                int(metadata["fiberid"]),
+            )
+        raise ValueError(f"No plate, mjd and fiberid found in '{file_path}'.")
+
+    def resolve(self):
+        """
+        Resolve the metadata of every spectrum not resolved yet.
+
+        Pending keys are sorted, so spectra of the same plate share chunks,
+        and split into chunks of at most chunk_size spectra. Each chunk is
+        one JOIN query; all the queries are submitted at once and run
+        concurrently.
+
+        The results of every chunk are collected even if some chunks fail;
+        the keys of the failed chunks stay pending, to be retried on the
+        next resolve, and the first error is raised.
+
+        Returns:
+        - dataframe: The metadata of every resolved spectrum.
+        """
+        pending = sorted(set(self._pending) - set(self._records))
+        self._pending = []
+        chunks = [
+            pending[start : start + self.chunk_size]
+            for start in range(0, len(pending), self.chunk_size)
+        ]
+        query_ids = [
+            self.query_handler.run_query(self._chunk_query(chunk))
+            for chunk in chunks
+        ]
+        self.n_queries += len(query_ids)
+
+        error = None
+        for chunk, query_id in zip(chunks, query_ids):
+            try:
+                results = self.query_handler.get_results(query_id)
+            except Exception as e:
+                self._pending += chunk  # Retried on the next resolve.
+                error = error or e
+                continue
+            for key in chunk:
+                self._records.setdefault(key, None)
+            for row in results if results is not None else ():
+                record = {name: row[name] for name in results.colnames}
+                key = self._normalize_key(
+                    (record["plate"], record["mjd"], record["fiberid"])
+                )
+                # Keep the first row of a spectrum, as for a single query.
+                if self._records.get(key) is None:
+                    self._records[key] = record
+        if error is not None:
+            raise error
+        return self.to_dataframe()
+
+    @staticmethod
+    def _chunk_query(chunk):
+        """Build the JOIN query resolving the spectra of `chunk`."""
+        fibers = defaultdict(list)
+        for plate, mjd, fiberid in chunk:
+            fibers[plate, mjd].append(fiberid)
+        conditions = " OR ".join(
+            f"(s.plate = {plate} AND s.mjd = {mjd} "
+            f"AND s.fiberid IN ({', '.join(map(str, fiberids))}))"
+            for (plate, mjd), fiberids in fibers.items()
+        )
+        return f"{_METADATA_SELECT} WHERE {conditions}"
+
+    def get(self, key):
+        """
+        Get the metadata of one spectrum, resolving pending keys if needed.
+
+        Parameters:
+        - key (tuple): (plate, mjd, fiberid) of the spectrum.
+
+        Returns:
+        - dict: The metadata of the spectrum, or None if SDSS has none.
+        """
+        key = self._normalize_key(key)
+        if key not in self._records:
+            if key not in self._pending:
+                self._pending.append(key)
+            self.resolve()
+        return self._records[key]
+
+    def get_class_of_object(self, key):
+        """
+        Get the class of a spectrum: "STAR", "GALAXY" or "QSO".
+        """
+        record = self.get(key)
+        return None if record is None else record["class"]
+
+    def get_redshift(self, key):
+        """
+        Get the redshift of a spectrum.
+        """
+        record = self.get(key)
+        return None if record is None else record["redshift"]
+
+    def get_photometry(self, key):
+        """
+        Get the u, g, r, i and z magnitudes of a spectrum.
+
+        Returns:
+        - dict: Magnitudes by band name, or None if SDSS has none.
+        """
+        record = self.get(key)
+        if record is None:
+            return None
+        return {band: record[band] for band in _PHOTOMETRY_BANDS}
+
+    def to_dataframe(self):
+        """
+        Get the metadata of every resolved spectrum as a dataframe.
+
+        Returns:
+        - dataframe: One row per spectrum found in SDSS.
+        """
+        records = [record for record in self._records.values() if record]
+        return pd.DataFrame.from_records(records)
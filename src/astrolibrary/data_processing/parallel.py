@@ -0,0 +1,269 @@
+"""Parallel Preprocessing Module.
+
+Allows end-users to:
+    - Preprocess a directory, a list, or a download manifest of FITS/CSV
+      spectra files on all the cores of a machine, with the steps of a
+      `PreprocessingPipeline`:
+
+      >>> pipeline = (
+      ...     PreprocessingPipeline(4000, 9000)
+      ...     .wave_align()
+      ...     .interpolate(np.linspace(4000, 9000, 3000), columns=["FLUX"])
+      ... )
+      >>> batch, manifest = preprocess_files("spectra/", pipeline, "out/")
+
+    - Follow the progress of the run with a callback, and find the files
+      that failed, with their error, in the returned manifest.
+
+Advantages/Design Considerations:
+    - Files are spread across a `ProcessPoolExecutor`, by chunks of files
+      per task, so the overhead of a task is paid once per chunk. Chunks
+      are submitted as workers free up, so a huge directory does not queue
+      millions of tasks at once.
+    - Workers write their spectra straight into memory-mapped `.npy` files
+      of shape (n_files, n_pixels), one per column: only small status
+      records are pickled back to the parent. The returned `SpectrumBatch`
+      wraps the same memory maps, without loading them.
+    - A failing file does not stop the others.
+
+Limitations:
+    - Spectra longer than `n_pixels` are errors. Spectra resampled onto a
+      common grid by the pipeline's last `interpolate` step all fit.
+    - The outputs are float64, the dtype of `SpectrumBatch` columns.
+
+"""
+import glob
+import itertools
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from .data_preprocessing import DataPreprocessing, SpectrumBatch
+
+
+def _file_paths(source, patterns):
+    """The files of a directory, list of paths, or download manifest."""
+    if isinstance(source, (str, os.PathLike)):
+        if not os.path.isdir(source):
+            raise ValueError(f"'{source}' is not a directory.")
+        return sorted(
+            path
+            for pattern in patterns
+            for path in glob.glob(os.path.join(str(source), pattern))
+        )
+    return [
+        entry["path"] if isinstance(entry, dict) else str(entry)
+        for entry in source
+        if not isinstance(entry, dict) or entry.get("path")
+    ]
+
+
+def _output_path(output_dir, column):
+    return os.path.join(output_dir, f"{column}.npy")
+
+
+def _process_chunk(tasks, pipeline, output_dir, columns, n_pixels):
+    """Preprocess the files of a chunk, in a worker process.
+
+    Every spectrum is written into its row of the output memory maps,
+    padded with NaN. Returns one status record per file.
+    """
+    outputs = {
+        column: np.load(_output_path(output_dir, column), mmap_mode="r+")
+        for column in columns
+    }
+    records = []
+    for row, file_path in tasks:
+        start = time.perf_counter()
+        length, error = 0, None
+        try:
+            if pipeline is None:
+                df = DataPreprocessing(file_path, -np.inf, np.inf).df
+            else:
+                df = pipeline.run(file_path)
+            missing = [column for column in columns if column not in df]
+            if missing:
+                raise ValueError(f"Columns {missing} are missing.")
+            if len(df) > n_pixels:
+                raise ValueError(
+                    f"The spectrum has {len(df)} pixels, more than {n_pixels}."
+                )
+            length = len(df)
+            for column in columns:
+                outputs[column][row, :length] = df[column].to_numpy()
+        except Exception as e:
+            length, error = 0, f"{type(e).__name__}: {e}"
+        for column in columns:
+            outputs[column][row, length:] = np.nan
+        records.append((row, length, time.perf_counter() - start, error))
+
+    for output in outputs.values():
+        output.flush()
+    return records
+
+
+def preprocess_files(
+    source,
+    pipeline,
+    output_dir,
+    columns,
+    n_pixels=None,
+    max_workers=None,
+    chunk_size=None,
+    progress=None,
+    patterns=("*.fits", "*.csv"),
+):
+    """
+    Preprocess many spectra files in parallel, into memory-mapped arrays.
+
+    Parameters:
+    - source: A directory, an iterable of file paths, or the manifest of
+      `get_spectra_data_bulk` (entries without a path are skipped).
+    - pipeline (PreprocessingPipeline or None): The steps to run on every
+      file. None only reads the files.
+    - output_dir (str): The directory of the output `<column>.npy` and
+      `lengths.npy` files. Created if needed.
+    - columns (list of str): The columns of the preprocessed spectra to
+      keep.
+    - n_pixels (int, optional): The maximum number of pixels of a spectrum.
+      Defaults to the length of the grid of the pipeline's last
+      `interpolate` step.
+    - max_workers (int, optional): The number of worker processes. Defaults
+      to the number of CPUs.
+    - chunk_size (int, optional): The number of files per task. Defaults to
+      about 4 tasks per worker, and 64 files at most.
+    - progress (callable, optional): Called as `progress(done, total)` with
+      the numbers of files processed and to process, after every task.
+    - patterns (tuple of str): The glob patterns of the files of a
+      directory.
+
+    Returns:
+    - tuple: A `SpectrumBatch` whose columns are the output memory maps, in
+      the order of the files, and the manifest: one dict per file with keys
+      'path', 'row', 'pixels', 'seconds', 'status' ('done' or 'error') and
+      'error'. Rows of failed files are all masked.
+
+    Raises:
+    - ValueError: If `n_pixels` is not given nor known, if `source` is not
+      a directory, or if `max_workers` is less than 1.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+    if n_pixels is None:
+        interpolations = [
+            arguments
+            for name, arguments in getattr(pipeline, "steps", [])
+            if name == "interpolate"
+        ]
+        if not interpolations:
+            raise ValueError(
+                "n_pixels must be given, unless the pipeline interpolates."
+            )
+        n_pixels = len(interpolations[-1]["grid"])
+
+    file_paths = _file_paths(source, patterns)
+    n_files = len(file_paths)
+    if chunk_size is None:
+        chunk_size = min(64, max(1, n_files // (4 * max_workers)))
+
+    os.makedirs(output_dir, exist_ok=True)
+    for column in columns:
+        np.lib.format.open_memmap(
+            _output_path(output_dir, column),
+            mode="w+",
+            dtype=np.float64,
+            shape=(n_files, n_pixels),
+        ).flush()
+
+    manifest = [
+        {
+            "path": file_path,
+            "row": row,
+            "pixels": 0,
+            "seconds": 0.0,
+            "status": "error",
+            "error": None,
+        }
+        for row, file_path in enumerate(file_paths)
+    ]
+    rows = enumerate(file_paths)
+    chunks = iter(lambda: list(itertools.islice(rows, chunk_size)), [])
+
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        def finish(chunk, records):
+            nonlocal done
+            for row, length, seconds, error in records:
+                manifest[row].update(
+                    pixels=length,
+                    seconds=seconds,
+                    status="error" if error else "done",
+                    error=error,
+                )
+            done += len(chunk)
+            if progress is not None:
+                progress(done, n_files)
+
+        def fail(chunk, e):
+            finish(
+                chunk,
+                [
+                    (row, 0, 0.0, f"{type(e).__name__}: {e}")
+                    for row, _ in chunk
+                ],
+            )
+
+        def submit():
+            # Keep about two tasks per worker queued.
+            while len(pending) < 2 * max_workers:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                try:
+                    future = executor.submit(
+                        _process_chunk,
+                        chunk,
+                        pipeline,
+                        output_dir,
+                        columns,
+                        n_pixels,
+                    )
+                except BrokenProcessPool as e:
+                    # No task can run any more: the remaining files fail.
+                    for chunk in itertools.chain([chunk], chunks):
+                        fail(chunk, e)
+                    return
+                pending[future] = chunk
+
+        submit()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                chunk = pending.pop(future)
+                try:
+                    records = future.result()
+                except Exception as e:  # E.g. a worker was killed.
+                    fail(chunk, e)
+                else:
+                    finish(chunk, records)
+            submit()
+
+    lengths = np.array([entry["pixels"] for entry in manifest], dtype=np.intp)
+    np.save(os.path.join(output_dir, "lengths.npy"), lengths)
+    batch = SpectrumBatch(
+        {
+            column: np.load(_output_path(output_dir, column), mmap_mode="r+")
+            for column in columns
+        },
+        getattr(pipeline, "MIN_TARGET_WAVELENGTH", -np.inf),
+        getattr(pipeline, "MAX_TARGET_WAVELENGTH", np.inf),
+        mask=np.arange(n_pixels) < lengths[:, None],
+    )
+    return batch, manifest
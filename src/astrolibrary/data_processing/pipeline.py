@@ -0,0 +1,524 @@
+"""Preprocessing Pipeline Module.
+
+Allows end-users to:
+    - Declare a chain of `DataPreprocessing` steps once, and run it on any
+      number of spectra:
+
+      >>> pipeline = (
+      ...     PreprocessingPipeline(4000, 9000)
+      ...     .remove_outliers_column("FLUX")
+      ...     .correct_redshift("Wavelength", "FLUX")
+      ...     .wave_align()
+      ... )
+      >>> df = pipeline.run("spec-7644-57327-0528.fits")
+
+    - See the compiled plan with `explain`: the order the steps run in, and
+      the copies of the spectrum made, compared to running them eagerly.
+
+Advantages/Design Considerations:
+    - Steps are only recorded, and `run` executes them in one pass over the
+      column arrays. Filters (`remove_outliers_column`, `wave_align`)
+      narrow a boolean mask instead of copying the DataFrame, and the rows
+      kept are gathered once, when a row-wise transform or the end of the
+      pipeline needs them.
+    - The wavelength window of `wave_align` is pushed ahead of the row-wise
+      transforms (`correct_redshift`, the wavelengths computed from LOGLAM)
+      that do not write the columns it reads, so they only run on the rows
+      inside of the window.
+    - Columns gathered by the pipeline are owned by it, and normalized in
+      place.
+    - The results are those of running the same steps eagerly, with
+      `DataPreprocessing`.
+
+Limitations:
+    - Filters are never moved ahead of `normalize_column` or
+      `remove_outliers_column`, whose statistics depend on the rows kept,
+      unless they use `StreamingStatistics` fitted beforehand.
+    - `remove_outliers_column` bounds are kept in `bounds`, since `run`
+      returns the DataFrame.
+
+"""
+import numpy as np
+import pandas as pd
+
+from .data_preprocessing import DataPreprocessing, _resampled_columns
+from .resampling import resample
+
+# Kinds of steps. Filters only narrow the rows kept, from the values of a
+# row; transforms compute new values from the values of a row; statistics
+# depend on all the rows kept; barriers replace all the rows.
+_FILTER = "filter"
+_TRANSFORM = "transform"
+_STATISTIC = "statistic"
+_BARRIER = "barrier"
+_COMPACT = "compact"
+
+
+class _Step:
+    """A step of a compiled plan."""
+
+    def __init__(self, label, kind, function, reads=(), writes=()):
+        self.label = label
+        self.kind = kind
+        self.function = function
+        self.reads = set(reads)
+        self.writes = set(writes)
+        self.narrows = kind == _FILTER
+        self.hoisted_over = []
+
+
+class _State:
+    """The columns of a spectrum, while a plan runs.
+
+    `keep` masks the rows kept by the filters run so far (None for all of
+    them). `owned` are the columns allocated by the pipeline, which can be
+    modified in place.
+    """
+
+    def __init__(self, df):
+        self.columns = {name: df[name].to_numpy() for name in df.columns}
+        self.index = df.index
+        self.keep = None
+        self.owned = set()
+
+    def narrow(self, keep):
+        self.keep = keep if self.keep is None else self.keep & keep
+
+
+class PreprocessingPipeline:
+    """A lazy chain of `DataPreprocessing` steps, run in one fused pass."""
+
+    def __init__(
+        self,
+        min_target_wavelength: float,
+        max_target_wavelength: float,
+        redshift=0.0,
+    ):
+        """
+        Initialize an empty pipeline.
+
+        Parameters:
+        - min_target_wavelength, max_target_wavelength (float): The range
+          kept by `wave_align`.
+        - redshift (float): The redshift used by `correct_redshift`.
+        """
+        self.MIN_TARGET_WAVELENGTH = min_target_wavelength
+        self.MAX_TARGET_WAVELENGTH = max_target_wavelength
+        self.redshift = redshift
+        self.steps = []
+        self.bounds = {}
+        self._plan = None
+
+    def normalize_column(self, column_name, statistics=None):
+        """Record `DataPreprocessing.normalize_column`.
+
+        With fitted `statistics`, normalization is a row-wise transform.
+        """
+        return self._record(
+            "normalize_column", column_name=column_name, statistics=statistics
+        )
+
+    def remove_outliers_column(self, column_name, statistics=None):
+        """Record `DataPreprocessing.remove_outliers_column`.
+
+        The bounds of the last run are in `self.bounds[column_name]`. With
+        fitted `statistics`, the bounds are fixed, and the step is a filter
+        that can be pushed ahead of row-wise transforms.
+        """
+        return self._record(
+            "remove_outliers_column",
+            column_name=column_name,
+            statistics=statistics,
+        )
+
+    def correct_redshift(
+        self, wavelength_column="Wavelength", flux_column="Flux"
+    ):
+        """Record `DataPreprocessing.correct_redshift`."""
+        return self._record(
+            "correct_redshift",
+            wavelength_column=wavelength_column,
+            flux_column=flux_column,
+        )
+
+    def wave_align(
+        self, wavelength_column="Wavelength", loglam_column="LOGLAM"
+    ):
+        """Record `DataPreprocessing.wave_align`."""
+        return self._record(
+            "wave_align",
+            wavelength_column=wavelength_column,
+            loglam_column=loglam_column,
+        )
+
+    def interpolate(
+        self,
+        grid,
+        wavelength_column="Wavelength",
+        columns=None,
+        method="linear",
+        ivar_column=None,
+        loglam_column="LOGLAM",
+    ):
+        """Record `DataPreprocessing.interpolate`."""
+        return self._record(
+            "interpolate",
+            grid=np.asarray(grid, dtype=np.float64),
+            wavelength_column=wavelength_column,
+            columns=columns,
+            method=method,
+            ivar_column=ivar_column,
+            loglam_column=loglam_column,
+        )
+
+    def __getstate__(self):
+        # Compiled plans hold closures: they are compiled again after
+        # unpickling, e.g. in the worker processes of `preprocess_files`.
+        return {**self.__dict__, "_plan": None}
+
+    def _record(self, name, **arguments):
+        self.steps.append((name, arguments))
+        self._plan = None
+        return self
+
+    def compile(self, dtypes):
+        """
+        Compile the steps into a plan, for a spectrum with the given columns.
+
+        Parameters:
+        - dtypes (dict): Maps the columns of the spectrum to their dtypes,
+          e.g. `df.dtypes`.
+
+        Returns:
+        - list: The steps of the plan, in the order they run in.
+
+        Raises:
+        - ValueError: If a step uses a column that does not exist.
+        """
+        dtypes = dict(dtypes)
+        plan = []
+        for name, arguments in self.steps:
+            plan.extend(getattr(self, f"_compile_{name}")(dtypes, **arguments))
+
+        # Push filters ahead of the row-wise transforms whose output they
+        # do not read.
+        for i in range(len(plan)):
+            j = i
+            while (
+                plan[j].kind == _FILTER
+                and j > 0
+                and plan[j - 1].kind == _TRANSFORM
+                and not plan[j - 1].writes & plan[j].reads
+            ):
+                plan[j].hoisted_over.append(plan[j - 1].label)
+                plan[j - 1], plan[j] = plan[j], plan[j - 1]
+                j -= 1
+
+        # Gather the rows kept before transforms and barriers, so that they
+        # run on them only, and at the end.
+        compiled, pending = [], False
+        for step in plan:
+            if pending and step.kind in (_TRANSFORM, _BARRIER):
+                compiled.append(_compact_step())
+                pending = False
+            compiled.append(step)
+            pending = pending or step.narrows
+        if pending:
+            compiled.append(_compact_step())
+        return compiled
+
+    def explain(self, source=None):
+        """
+        Describe the compiled plan, and the copies of the spectrum it saves.
+
+        Parameters:
+        - source (optional): A spectrum, as in `run`, to compile the plan
+          for. Defaults to the spectrum of the last run.
+
+        Returns:
+        - str: One line per step of the plan, and a summary of the copies.
+
+        Raises:
+        - ValueError: If there is no source, and the pipeline never ran.
+        """
+        if source is not None:
+            plan = self.compile(self._dataframe(source).dtypes)
+        elif self._plan is not None:
+            plan = self._plan
+        else:
+            raise ValueError(
+                "Nothing to explain: give a source, or run first."
+            )
+
+        lines = []
+        for number, step in enumerate(plan, start=1):
+            line = f"{number}. {step.label} [{step.kind}]"
+            if step.hoisted_over:
+                line += f" (pushed ahead of {', '.join(step.hoisted_over)})"
+            lines.append(line)
+
+        eager = sum(
+            name in ("remove_outliers_column", "wave_align")
+            for name, _ in self.steps
+        )
+        fused = sum(step.kind == _COMPACT for step in plan)
+        lines.append(
+            f"DataFrame copies: {eager} eager, {fused} fused "
+            f"({max(eager - fused, 0)} eliminated)."
+        )
+        return "\n".join(lines)
+
+    def run(self, source):
+        """
+        Run the pipeline on a spectrum.
+
+        Parameters:
+        - source: The spectrum, as a DataFrame, a path to a FITS or CSV file,
+          or a `DataPreprocessing`, whose `df` is replaced by the result.
+
+        Returns:
+        - pandas.DataFrame: The preprocessed spectrum.
+
+        Raises:
+        - ValueError: If a step uses a column that does not exist.
+        """
+        df = self._dataframe(source)
+        plan = self.compile(df.dtypes)
+        state = _State(df)
+        self.bounds = {}
+        for step in plan:
+            step.function(state)
+        self._plan = plan
+
+        result = pd.DataFrame(state.columns, index=state.index, copy=False)
+        if isinstance(source, DataPreprocessing):
+            source.df = result
+        return result
+
+    def _dataframe(self, source):
+        if isinstance(source, DataPreprocessing):
+            return source.df
+        if isinstance(source, str):
+            return DataPreprocessing(
+                source,
+                self.MIN_TARGET_WAVELENGTH,
+                self.MAX_TARGET_WAVELENGTH,
+                redshift=self.redshift,
+            ).df
+        return source
+
+    @staticmethod
+    def _check(dtypes, *columns):
+        for column in columns:
+            if column not in dtypes:
+                raise ValueError(
+                    f"Column '{column}' does not exist in the DataFrame."
+                )
+
+    def _compile_normalize_column(self, dtypes, column_name, statistics):
+        self._check(dtypes, column_name)
+
+        def normalize(state):
+            values = state.columns[column_name]
+            if statistics is not None:
+                mean, std = statistics.normalizer(column_name)
+            else:
+                where = True if state.keep is None else state.keep
+                mean = np.nanmean(values, where=where)
+                std = np.nanstd(values, where=where)
+            dtype = np.result_type(values, mean)
+            if column_name in state.owned and values.dtype == dtype:
+                values -= mean
+                values /= std
+            else:
+                state.columns[column_name] = (values - mean) / std
+                state.owned.add(column_name)
+
+        dtypes[column_name] = np.float64
+        return [
+            _Step(
+                f"normalize_column({column_name})",
+                _STATISTIC if statistics is None else _TRANSFORM,
+                normalize,
+                reads=[column_name],
+                writes=[column_name],
+            )
+        ]
+
+    def _compile_remove_outliers_column(self, dtypes, column_name, statistics):
+        self._check(dtypes, column_name)
+
+        def remove_outliers(state):
+            values = state.columns[column_name]
+            if statistics is not None:
+                lower_bound, upper_bound = statistics.outlier_bounds(
+                    column_name
+                )
+            else:
+                kept = values if state.keep is None else values[state.keep]
+                q1 = np.percentile(kept, 25)
+                q3 = np.percentile(kept, 75)
+                iqr = q3 - q1
+                lower_bound = q1 - 1.5 * iqr
+                upper_bound = q3 + 1.5 * iqr
+            state.narrow((values >= lower_bound) & (values <= upper_bound))
+            self.bounds[column_name] = (lower_bound, upper_bound)
+
+        step = _Step(
+            f"remove_outliers_column({column_name})",
+            _STATISTIC if statistics is None else _FILTER,
+            remove_outliers,
+            reads=[column_name],
+        )
+        step.narrows = True
+        return [step]
+
+    def _compile_correct_redshift(
+        self, dtypes, wavelength_column, flux_column
+    ):
+        if wavelength_column not in dtypes or flux_column not in dtypes:
+            raise ValueError(
+                f"Specified columns '{wavelength_column}' and "
+                f"'{flux_column}' must exist in the DataFrame."
+            )
+        corrected_column = f"{flux_column}_corrected"
+        redshift = self.redshift
+
+        def correct_redshift(state):
+            redshifted_wavelengths = state.columns[wavelength_column] * (
+                1 + redshift
+            )
+            state.columns[corrected_column] = (
+                state.columns[flux_column] / redshifted_wavelengths
+            )
+            state.owned.add(corrected_column)
+
+        dtypes[corrected_column] = np.float64
+        return [
+            _Step(
+                f"correct_redshift({wavelength_column}, {flux_column})",
+                _TRANSFORM,
+                correct_redshift,
+                reads=[wavelength_column, flux_column],
+                writes=[corrected_column],
+            )
+        ]
+
+    def _compile_wave_align(self, dtypes, wavelength_column, loglam_column):
+        low, high = self.MIN_TARGET_WAVELENGTH, self.MAX_TARGET_WAVELENGTH
+        steps = []
+        if loglam_column in dtypes:
+            # The window is computed from LOGLAM as the wavelengths would
+            # be, so that it does not wait for them.
+            source = loglam_column
+
+            def wavelengths(state):
+                state.columns[wavelength_column] = (
+                    10 ** state.columns[loglam_column]
+                )
+                state.owned.add(wavelength_column)
+
+            steps.append(
+                _Step(
+                    f"wavelengths({loglam_column})",
+                    _TRANSFORM,
+                    wavelengths,
+                    reads=[loglam_column],
+                    writes=[wavelength_column],
+                )
+            )
+            dtypes[wavelength_column] = dtypes[loglam_column]
+        else:
+            self._check(dtypes, wavelength_column)
+            source = wavelength_column
+
+        def window(state):
+            values = state.columns[source]
+            if source == loglam_column:
+                values = 10**values
+            state.narrow((values >= low) & (values <= high))
+
+        steps.append(
+            _Step(
+                f"wave_align({wavelength_column}, [{low}, {high}])",
+                _FILTER,
+                window,
+                reads=[source],
+            )
+        )
+        return steps
+
+    def _compile_interpolate(
+        self,
+        dtypes,
+        grid,
+        wavelength_column,
+        columns,
+        method,
+        ivar_column,
+        loglam_column,
+    ):
+        # Check the columns against an empty table of the same schema.
+        schema = {name: np.empty(0, dtype) for name, dtype in dtypes.items()}
+        _, columns = _resampled_columns(
+            schema, wavelength_column, columns, ivar_column, loglam_column
+        )
+
+        def interpolate(state):
+            wavelengths, _ = _resampled_columns(
+                state.columns,
+                wavelength_column,
+                columns,
+                ivar_column,
+                loglam_column,
+            )
+            valid = None
+            if ivar_column is not None:
+                valid = np.broadcast_to(
+                    state.columns[ivar_column] > 0,
+                    (len(columns), len(wavelengths)),
+                )
+            values = np.array(
+                [state.columns[name] for name in columns], dtype=np.float64
+            ).reshape(len(columns), len(wavelengths))
+            resampled = resample(
+                wavelengths, values, grid, method=method, mask=valid
+            )
+
+            had_loglam = loglam_column in state.columns
+            state.columns = {wavelength_column: grid.copy()}
+            if had_loglam:
+                state.columns[loglam_column] = np.log10(grid)
+            state.columns.update(zip(columns, resampled))
+            state.index = pd.RangeIndex(len(grid))
+            state.owned = set(state.columns)
+
+        had_loglam = loglam_column in dtypes
+        dtypes.clear()
+        dtypes[wavelength_column] = np.float64
+        if had_loglam:
+            dtypes[loglam_column] = np.float64
+        dtypes.update(dict.fromkeys(columns, np.float64))
+        return [
+            _Step(
+                f"interpolate({method}, {len(grid)} pixels)",
+                _BARRIER,
+                interpolate,
+                reads=[wavelength_column, *columns],
+            )
+        ]
+
+
+def _compact_step():
+    return _Step("gather the rows kept", _COMPACT, _compact)
+
+
+def _compact(state):
+    """Gather the rows kept, once for all the columns."""
+    positions = np.flatnonzero(state.keep)
+    state.columns = {
+        name: values[positions] for name, values in state.columns.items()
+    }
+    state.index = state.index[positions]
+    state.keep = None
+    state.owned = set(state.columns)
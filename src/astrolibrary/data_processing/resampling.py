@@ -0,0 +1,275 @@
+"""Resampling Module.
+
+Allows end-users to:
+    - Resample spectra onto a common wavelength grid, by linear
+      interpolation or by flux-conserving rebinning.
+    - Resample many spectra at once: spectra sharing an input grid, such as
+      SDSS's log-lambda grid, are resampled with a single sparse matrix
+      product.
+    - Fill masked pixels, and pixels with a zero inverse variance, by linear
+      interpolation from their valid neighbours before resampling.
+
+Advantages/Design Considerations:
+    - Resampling is linear, so it is precomputed as a sparse operator of
+      shape (n_output, n_input). Operators are cached per (method, input
+      grid, output grid), so they are built once per pair of grids.
+    - Filling invalid pixels is vectorized over all the spectra, without a
+      Python loop.
+
+Limitations and Future Work:
+    - Grids must be strictly increasing.
+    - Output pixels not covered by the input grid are NaN: for the linear
+      method, pixels outside of it; for the flux-conserving one, pixels
+      whose bin is not entirely inside of it.
+    - Pixel edges are the midpoints between pixel centers, so the
+      flux-conserving method assumes slowly varying pixel widths.
+
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+METHODS = ("linear", "flux_conserving")
+OPERATOR_CACHE_SIZE = 64
+
+_operator_cache = OrderedDict()
+_operator_cache_lock = threading.Lock()
+_operator_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _check_grid(grid, name):
+    grid = np.asarray(grid, dtype=np.float64)
+    if grid.ndim != 1 or len(grid) < 2:
+        raise ValueError(f"The {name} grid must be 1-D, of 2 pixels or more.")
+    if not np.all(np.diff(grid) > 0):
+        raise ValueError(f"The {name} grid must be strictly increasing.")
+    return grid
+
+
+def _grid_key(grid):
+    return (
+        len(grid),
+        hashlib.blake2b(grid.tobytes(), digest_size=16).digest(),
+    )
+
+
+def _pixel_edges(grid):
+    """Edges of the pixels centered on `grid`."""
+    middles = (grid[:-1] + grid[1:]) / 2
+    return np.concatenate(
+        [
+            [grid[0] - (middles[0] - grid[0])],
+            middles,
+            [grid[-1] + (grid[-1] - middles[-1])],
+        ]
+    )
+
+
+def _linear_operator(input_grid, output_grid):
+    inside = (output_grid >= input_grid[0]) & (output_grid <= input_grid[-1])
+    rows = np.flatnonzero(inside)
+    x = output_grid[inside]
+    left = np.clip(
+        np.searchsorted(input_grid, x, side="right") - 1,
+        0,
+        len(input_grid) - 2,
+    )
+    t = (x - input_grid[left]) / (input_grid[left + 1] - input_grid[left])
+    return sparse.csr_matrix(
+        (
+            np.concatenate([1 - t, t]),
+            (np.concatenate([rows, rows]), np.concatenate([left, left + 1])),
+        ),
+        shape=(len(output_grid), len(input_grid)),
+    )
+
+
+def _flux_conserving_operator(input_grid, output_grid):
+    input_edges = _pixel_edges(input_grid)
+    output_edges = _pixel_edges(output_grid)
+
+    # Every segment between consecutive edges of both grids lies in one
+    # input pixel and one output pixel: it adds its share of the output
+    # pixel's width to their weight.
+    low = max(input_edges[0], output_edges[0])
+    high = min(input_edges[-1], output_edges[-1])
+    edges = np.union1d(input_edges, output_edges)
+    edges = edges[(edges >= low) & (edges <= high)]
+    middles = (edges[:-1] + edges[1:]) / 2
+    columns = np.searchsorted(input_edges, middles) - 1
+    rows = np.searchsorted(output_edges, middles) - 1
+    widths = np.diff(output_edges)
+    operator = sparse.csr_matrix(
+        (np.diff(edges) / widths[rows], (rows, columns)),
+        shape=(len(output_grid), len(input_grid)),
+    )
+
+    # Drop output pixels only partly covered by the input grid.
+    covered = np.asarray(operator.sum(axis=1)).ravel() > 1 - 1e-9
+    return sparse.diags(covered.astype(np.float64)) @ operator
+
+
+def get_operator(input_grid, output_grid, method="linear"):
+    """Get the sparse resampling operator from one grid to another.
+
+    Operators are cached per (method, input grid, output grid).
+
+    Parameters:
+    - input_grid, output_grid (array-like): The strictly increasing
+      wavelengths of the input and output pixels.
+    - method (str, optional): "linear" (interpolation) or
+      "flux_conserving" (rebinning). Defaults to "linear".
+
+    Returns:
+    - scipy.sparse.csr_matrix: The operator, of shape
+      (len(output_grid), len(input_grid)). Rows of output pixels that
+      cannot be resampled are empty.
+
+    Raises:
+    - ValueError: If the method is unknown, or a grid is invalid.
+    """
+    if method not in METHODS:
+        raise ValueError(
+            f"Unknown method '{method}', expected one of {METHODS}."
+        )
+    input_grid = _check_grid(input_grid, "input")
+    output_grid = _check_grid(output_grid, "output")
+
+    key = (method, _grid_key(input_grid), _grid_key(output_grid))
+    with _operator_cache_lock:
+        operator = _operator_cache.get(key)
+        if operator is not None:
+            _operator_cache.move_to_end(key)
+            _operator_cache_stats["hits"] += 1
+            return operator
+        _operator_cache_stats["misses"] += 1
+
+    if method == "linear":
+        operator = _linear_operator(input_grid, output_grid)
+    else:
+        operator = _flux_conserving_operator(input_grid, output_grid)
+    operator.sort_indices()
+
+    with _operator_cache_lock:
+        _operator_cache[key] = operator
+        while len(_operator_cache) > OPERATOR_CACHE_SIZE:
+            _operator_cache.popitem(last=False)
+    return operator
+
+
+def operator_cache_info():
+    """Get the hits, misses and size of the operator cache."""
+    with _operator_cache_lock:
+        return {**_operator_cache_stats, "size": len(_operator_cache)}
+
+
+def clear_operator_cache():
+    """Empty the operator cache, and reset its statistics."""
+    with _operator_cache_lock:
+        _operator_cache.clear()
+        _operator_cache_stats.update(hits=0, misses=0)
+
+
+def fill_invalid(wavelength, flux, valid):
+    """Fill invalid pixels by linear interpolation from valid neighbours.
+
+    Pixels before the first or after the last valid one take its value, as
+    with `np.interp`. Spectra without any valid pixel are all NaN.
+
+    Parameters:
+    - wavelength (array-like): The wavelengths of the pixels, shared by
+      all spectra.
+    - flux (array-like): Spectra of shape (n_spectra, n_pixels), or one
+      spectrum.
+    - valid (array-like of bool): The valid pixels, of the shape of `flux`.
+
+    Returns:
+    - numpy.ndarray: `flux` as a 2-D array, with its invalid pixels filled
+      in a copy if there are any.
+    """
+    wavelength = np.asarray(wavelength, dtype=np.float64)
+    flux = np.atleast_2d(np.asarray(flux, dtype=np.float64))
+    valid = np.atleast_2d(np.asarray(valid, dtype=bool)) & np.isfinite(flux)
+    n_pixels = flux.shape[1]
+    if valid.all():
+        return flux
+
+    index = np.arange(n_pixels)
+    previous = np.maximum.accumulate(np.where(valid, index, -1), axis=1)
+    following = np.minimum.accumulate(
+        np.where(valid, index, n_pixels)[:, ::-1], axis=1
+    )[:, ::-1]
+    has_previous = previous >= 0
+    has_following = following < n_pixels
+    previous = previous.clip(min=0)
+    following = following.clip(max=n_pixels - 1)
+
+    previous_flux = np.take_along_axis(flux, previous, axis=1)
+    following_flux = np.take_along_axis(flux, following, axis=1)
+    span = wavelength[following] - wavelength[previous]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(span > 0, (wavelength - wavelength[previous]) / span, 0.0)
+    interpolated = previous_flux + t * (following_flux - previous_flux)
+    interpolated = np.where(has_previous, interpolated, following_flux)
+    interpolated = np.where(has_following, interpolated, previous_flux)
+    interpolated[~(has_previous | has_following)] = np.nan
+    return np.where(valid, flux, interpolated)
+
+
+def resample(
+    wavelength,
+    flux,
+    output_grid,
+    method="linear",
+    mask=None,
+    ivar=None,
+):
+    """Resample spectra sharing one wavelength grid onto `output_grid`.
+
+    Parameters:
+    - wavelength (array-like): The wavelengths of the input pixels, shared
+      by all spectra.
+    - flux (array-like): One spectrum, or spectra of shape
+      (n_spectra, n_pixels).
+    - output_grid (array-like): The wavelengths of the output pixels.
+    - method (str, optional): "linear" or "flux_conserving". Defaults to
+      "linear".
+    - mask (array-like of bool, optional): The valid pixels (True), of the
+      shape of `flux`.
+    - ivar (array-like, optional): The inverse variance of the pixels:
+      pixels with a zero inverse variance are invalid.
+
+    Returns:
+    - numpy.ndarray: The resampled flux, of shape (len(output_grid),) for
+      one spectrum, else (n_spectra, len(output_grid)). Output pixels that
+      cannot be resampled are NaN.
+
+    Raises:
+    - ValueError: If the method is unknown, or the shapes do not match.
+
+    Example:
+    >>> grid = 10 ** np.arange(3.6, 3.9, 1e-4)
+    >>> resampled = resample(wavelength, fluxes, grid, ivar=ivars)
+    """
+    flux = np.asarray(flux, dtype=np.float64)
+    one_spectrum = flux.ndim == 1
+    flux = np.atleast_2d(flux)
+    wavelength = np.asarray(wavelength, dtype=np.float64)
+    if flux.ndim != 2 or flux.shape[1] != len(wavelength):
+        raise ValueError("The flux does not match the wavelength grid.")
+
+    operator = get_operator(wavelength, output_grid, method)
+
+    valid = np.ones(flux.shape, dtype=bool)
+    if mask is not None:
+        valid &= np.atleast_2d(np.asarray(mask, dtype=bool))
+    if ivar is not None:
+        valid &= np.atleast_2d(np.asarray(ivar)) > 0
+    flux = fill_invalid(wavelength, flux, valid)
+
+    resampled = flux @ operator.T
+    resampled[:, np.diff(operator.indptr) == 0] = np.nan
+    return resampled[0] if one_spectrum else resampled
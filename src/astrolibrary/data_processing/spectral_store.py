@@ -0,0 +1,440 @@
+"""Spectral Store Module.
+
+Allows end-users to:
+    - Consolidate many spectra into one local store, indexed by their
+      (plate, mjd, fiberid) key, instead of one FITS or CSV file each:
+
+      >>> store = SpectralStore("spectra.store", columns=["LOGLAM", "FLUX"])
+      >>> store.ingest_files(glob.glob("spec-*.fits"))
+      >>> store.ingest_downloads([(7644, 57327, 529)], dr_number=17)
+      >>> df = store.get(7644, 57327, 528)
+      >>> batch = store.to_batch()
+
+    - Read one spectrum as zero-copy views of memory-mapped files, or many
+      spectra at once as a `SpectrumBatch`.
+
+Advantages/Design Considerations:
+    - A store is a directory with one append-only raw binary file per
+      column, in which the pixels of all the spectra follow each other, and
+      an append-only index of (plate, mjd, fiberid, offset, length) records.
+      Nothing is parsed when reading: columns are memory-mapped.
+    - Bulk reads gather the spectra in the order of their offsets, so the
+      column files are read sequentially: a `SpectrumBatch` of 10^5 SDSS
+      spectra is read in seconds, and a single spectrum in microseconds.
+    - Data is appended before its index record, and data after the last
+      record (e.g. of an interrupted ingestion) is truncated when the store
+      is opened, so the store is always consistent.
+
+Limitations:
+    - Append-only: ingesting a key again with `replace=True` appends a new
+      version of the spectrum, and the old one keeps its space.
+    - One process may write to a store at a time. Its column and index
+      files stay open for appending until `close`, or the end of a `with`
+      block.
+
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from ..data_acquisition.spectra_data_retrieval import get_spectra_data_bulk
+from .data_preprocessing import DataPreprocessing, SpectrumBatch
+from .metadata_extractor import BatchMetaDataExtractor
+
+DEFAULT_DTYPE = "<f4"
+
+_INDEX_DTYPE = np.dtype(
+    [
+        ("plate", "<i8"),
+        ("mjd", "<i8"),
+        ("fiberid", "<i8"),
+        ("offset", "<i8"),
+        ("length", "<i8"),
+    ]
+)
+_FILE_NAME = re.compile(r"spec-(\d+)-(\d+)-(\d+)\.(?:fits|csv)$")
+
+
+def key_from_path(file_path):
+    """
+    Get the (plate, mjd, fiberid) key of a spectrum file.
+
+    The key is parsed from `spec-PPPP-MJD-FFFF` file names, as written by
+    `get_spectra_data`, or else read from the FITS headers.
+    """
+    match = _FILE_NAME.search(os.path.basename(str(file_path)))
+    if match:
+        return tuple(int(group) for group in match.groups())
+    if str(file_path).endswith(".fits"):
+        return BatchMetaDataExtractor.key_from_file(str(file_path))
+    raise ValueError(f"No plate, mjd and fiberid found for '{file_path}'.")
+
+
+class SpectralStore:
+    """An append-only store of spectra, indexed by (plate, mjd, fiberid)."""
+
+    def __init__(self, path, columns=None):
+        """
+        Open a store, or create it.
+
+        Parameters:
+        - path (str): The directory of the store.
+        - columns (list of str or dict, optional): The columns to store, or
+          a dict mapping them to NumPy dtypes (float32 by default). Needed
+          to create a store; checked against the columns of an existing one.
+
+        Raises:
+        - ValueError: If the store does not exist and no columns are given,
+          or if they differ from those of the store.
+        """
+        self.path = str(path)
+        self._lock = threading.Lock()
+        layout_path = os.path.join(self.path, "store.json")
+
+        if columns is not None and not isinstance(columns, dict):
+            columns = dict.fromkeys(columns, DEFAULT_DTYPE)
+        if columns is not None:
+            columns = {
+                name: np.dtype(dtype).newbyteorder("<").str
+                for name, dtype in columns.items()
+            }
+
+        if os.path.exists(layout_path):
+            with open(layout_path) as file:
+                stored = json.load(file)["columns"]
+            if columns is not None and columns != stored:
+                raise ValueError(
+                    f"The store has columns {stored}, not {columns}."
+                )
+            columns = stored
+        elif columns is None:
+            raise ValueError(f"No store at '{self.path}': give its columns.")
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            with open(layout_path, "w") as file:
+                json.dump({"version": 1, "columns": columns}, file)
+
+        self.columns = {
+            name: np.dtype(dtype) for name, dtype in columns.items()
+        }
+        # Drop a record whose writing was interrupted.
+        with open(self._index_path, "ab") as file:
+            size = file.tell()
+            file.truncate(size - size % _INDEX_DTYPE.itemsize)
+        self._records = np.fromfile(self._index_path, dtype=_INDEX_DTYPE)
+        self._size = len(self._records)
+        self._rows = {
+            key: row
+            for row, key in enumerate(
+                zip(
+                    *(
+                        self._records[field].tolist()
+                        for field in ("plate", "mjd", "fiberid")
+                    )
+                )
+            )
+        }
+        self._maps = {}
+        self._files = {}
+
+        # Drop the data of an interrupted ingestion, after the last record.
+        for name, dtype in self.columns.items():
+            with open(self._column_path(name), "ab") as file:
+                file.truncate(self.n_pixels * dtype.itemsize)
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.path, "index.bin")
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    @property
+    def n_pixels(self):
+        """The number of pixels stored, in every column file."""
+        if not self._size:
+            return 0
+        last = self._records[self._size - 1]
+        return int(last["offset"] + last["length"])
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key):
+        return tuple(int(value) for value in key) in self._rows
+
+    def keys(self):
+        """The keys of the spectra, in the order they were stored."""
+        return sorted(self._rows, key=self._rows.get)
+
+    def append(self, key, spectrum, replace=False):
+        """
+        Store a spectrum.
+
+        Parameters:
+        - key (tuple): Its (plate, mjd, fiberid).
+        - spectrum (DataFrame or dict): Maps the columns of the store to
+          1-D arrays of the same length. Other columns are ignored.
+        - replace (bool): Whether to store a new version of a spectrum
+          already stored. Defaults to False, skipping it.
+
+        Returns:
+        - bool: Whether the spectrum was stored.
+
+        Raises:
+        - ValueError: If a column is missing, or columns differ in length.
+        """
+        key = tuple(int(value) for value in key)
+        missing = [name for name in self.columns if name not in spectrum]
+        if missing:
+            raise ValueError(f"Columns {missing} are missing for {key}.")
+        values = {
+            name: np.ascontiguousarray(spectrum[name], dtype=dtype)
+            for name, dtype in self.columns.items()
+        }
+        lengths = {len(array) for array in values.values()}
+        if len(lengths) != 1:
+            raise ValueError(f"The columns of {key} differ in length.")
+
+        with self._lock:
+            if key in self._rows and not replace:
+                return False
+            record = np.array(
+                [(*key, self.n_pixels, lengths.pop())], dtype=_INDEX_DTYPE
+            )
+            # Data first, then its index record.
+            for name, array in values.items():
+                self._write(self._column_path(name), array)
+            self._write(self._index_path, record)
+            if self._size == len(self._records):
+                # Grow the records geometrically, so appends are O(1).
+                self._records = np.resize(self._records, 2 * self._size + 1)
+            self._records[self._size] = record[0]
+            self._rows[key] = self._size
+            self._size += 1
+        return True
+
+    def _write(self, path, array):
+        if path not in self._files:
+            self._files[path] = open(path, "ab")
+        self._files[path].write(array.tobytes())
+        # Flushed for the memory maps, and to keep data before its record.
+        self._files[path].flush()
+
+    def close(self):
+        """Close the files open for appending. The store stays readable."""
+        with self._lock:
+            for file in self._files.values():
+                file.close()
+            self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def ingest_file(self, file_path, key=None, replace=False):
+        """
+        Store the spectrum of a FITS or CSV file.
+
+        Only the columns of the store are read. The key defaults to the one
+        of the file; see `key_from_path`.
+
+        Returns:
+        - bool: Whether the spectrum was stored.
+        """
+        key = key_from_path(file_path) if key is None else key
+        if key in self and not replace:
+            return False
+        df = DataPreprocessing(
+            str(file_path), -np.inf, np.inf, columns=list(self.columns)
+        ).df
+        return self.append(key, df, replace=replace)
+
+    def ingest_files(self, file_paths, replace=False):
+        """
+        Store the spectra of many files.
+
+        Returns:
+        - int: The number of spectra stored.
+        """
+        return sum(
+            self.ingest_file(file_path, replace=replace)
+            for file_path in file_paths
+        )
+
+    def ingest_downloads(
+        self, identifiers, remove_files=True, replace=False, **kwargs
+    ):
+        """
+        Download spectra with `get_spectra_data_bulk`, and store them.
+
+        Spectra already stored are not downloaded, unless `replace`.
+
+        Parameters:
+        - identifiers (iterable): (plateid, mjd, fiberid) of the spectra.
+        - remove_files (bool): Whether to remove the downloaded files once
+          stored. Defaults to True, downloading to a temporary directory
+          unless an `output_dir` is given. Files that were already in
+          `output_dir`, and so skipped by the download, are kept.
+        - replace (bool): As in `append`.
+        - kwargs: The other arguments of `get_spectra_data_bulk`.
+
+        Returns:
+        - list of dict: The download manifest, whose entries have a 'stored'
+          key, and the error of the ingestion if any.
+        """
+        identifiers = [
+            identifier
+            for identifier in identifiers
+            if replace or tuple(identifier) not in self
+        ]
+        temporary = None
+        if remove_files and "output_dir" not in kwargs:
+            temporary = kwargs["output_dir"] = tempfile.mkdtemp(
+                prefix="spectra-", dir=self.path
+            )
+        try:
+            manifest = get_spectra_data_bulk(identifiers, **kwargs)
+            for entry in manifest:
+                entry["stored"] = False
+                if entry["status"] == "error":
+                    continue
+                downloaded = entry["status"] == "downloaded"
+                try:
+                    entry["stored"] = self.ingest_file(
+                        entry["path"],
+                        key=(entry["plateid"], entry["mjd"], entry["fiberid"]),
+                        replace=replace,
+                    )
+                except Exception as e:
+                    entry["status"], entry["error"] = "error", str(e)
+                if remove_files and (downloaded or temporary is not None):
+                    try:
+                        os.remove(entry["path"])
+                    except OSError:
+                        continue
+                    entry["path"] = None
+        finally:
+            if temporary is not None:
+                shutil.rmtree(temporary, ignore_errors=True)
+        return manifest
+
+    def _column(self, name):
+        """The memory map of a column file, remapped once it grew."""
+        n_pixels = self.n_pixels
+        mapped = self._maps.get(name)
+        if mapped is None or len(mapped) != n_pixels:
+            if n_pixels == 0:
+                mapped = np.empty(0, dtype=self.columns[name])
+            else:
+                mapped = np.memmap(
+                    self._column_path(name),
+                    dtype=self.columns[name],
+                    mode="r",
+                    shape=(n_pixels,),
+                )
+            self._maps[name] = mapped
+        return mapped
+
+    def _row(self, key):
+        key = tuple(int(value) for value in key)
+        if key not in self._rows:
+            raise KeyError(f"Spectrum {key} is not in the store.")
+        return self._rows[key]
+
+    def _check_columns(self, columns):
+        columns = list(self.columns) if columns is None else list(columns)
+        missing = [name for name in columns if name not in self.columns]
+        if missing:
+            raise ValueError(f"Columns {missing} are not in the store.")
+        return columns
+
+    def read(self, plate, mjd, fiberid, columns=None):
+        """
+        Read a spectrum, without copying it.
+
+        Returns:
+        - dict: Maps the columns to read-only views of the memory-mapped
+          column files.
+
+        Raises:
+        - KeyError: If the spectrum is not in the store.
+        """
+        record = self._records[self._row((plate, mjd, fiberid))]
+        start, stop = record["offset"], record["offset"] + record["length"]
+        return {
+            name: self._column(name)[start:stop]
+            for name in self._check_columns(columns)
+        }
+
+    def get(self, plate, mjd, fiberid, columns=None):
+        """
+        Read a spectrum as a DataFrame, whose columns are the views of
+        `read`.
+        """
+        return pd.DataFrame(
+            self.read(plate, mjd, fiberid, columns), copy=False
+        )
+
+    def to_batch(
+        self,
+        keys=None,
+        columns=None,
+        min_target_wavelength=-np.inf,
+        max_target_wavelength=np.inf,
+        redshift=0.0,
+        dtype=np.float64,
+    ):
+        """
+        Read many spectra into a `SpectrumBatch`.
+
+        The pixels are gathered in the order of their offsets, so the column
+        files are read sequentially.
+
+        Parameters:
+        - keys (list of tuple, optional): The spectra, in the order of the
+          rows of the batch. Defaults to all of them, in `keys()` order.
+        - columns (list of str, optional): Defaults to all of them.
+        - min_target_wavelength, max_target_wavelength, redshift, dtype: As
+          in `SpectrumBatch`. A float32 batch of float32 columns is half
+          the size, and exact.
+
+        Raises:
+        - KeyError: If a spectrum is not in the store.
+        """
+        keys = self.keys() if keys is None else keys
+        columns = self._check_columns(columns)
+        records = self._records[
+            np.fromiter(map(self._row, keys), dtype=np.intp, count=len(keys))
+        ]
+        lengths = records["length"]
+        width = int(lengths.max(initial=0))
+
+        # Spectra are copied by increasing offset, so the column files are
+        # read sequentially, one slice per spectrum.
+        order = np.argsort(records["offset"], kind="stable")
+        starts = records["offset"][order].tolist()
+        stops = (records["offset"] + lengths)[order].tolist()
+        batch_columns = {}
+        for name in columns:
+            column = self._column(name)
+            values = np.full((len(records), width), np.nan, dtype=dtype)
+            for row, start, stop in zip(order.tolist(), starts, stops):
+                values[row, : stop - start] = column[start:stop]
+            batch_columns[name] = values
+        return SpectrumBatch(
+            batch_columns,
+            min_target_wavelength,
+            max_target_wavelength,
+            mask=np.arange(width) < lengths[:, None],
+            redshift=redshift,
+            dtype=dtype,
+        )
@@ -0,0 +1,394 @@
+"""Streaming Statistics Module.
+
+Allows end-users to:
+    - Compute the mean, standard deviation and quartiles of columns over
+      many spectra files, chunk by chunk, without loading them all:
+
+      >>> statistics = StreamingStatistics.from_files(paths, ["FLUX"])
+      >>> statistics.normalizer("FLUX"), statistics.outlier_bounds("FLUX")
+
+    - Apply the fitted normalization and outlier bounds to new data in a
+      second streaming pass, with `transform_files`, or spectrum by
+      spectrum with `DataPreprocessing.normalize_column(column, statistics)`
+      and `DataPreprocessing.remove_outliers_column(column, statistics)`.
+    - Merge partial statistics, e.g. computed by several processes on parts
+      of a survey, with `merge`. Statistics are plain picklable objects.
+
+Advantages/Design Considerations:
+    - Means and variances are merged with Chan et al.'s parallel update of
+      Welford's algorithm, which is exact and numerically stable: a chunk
+      is summarized with NumPy, then merged in O(1).
+    - Quartiles are estimated with a KLL sketch, a hierarchy of compactors
+      of bounded size: its memory is O(k) whatever the number of values,
+      and its rank error is about 1/k. Sketches merge level by level.
+      Until the sketch has compacted anything, its percentiles are exact.
+
+Limitations:
+    - NaN and infinite values are ignored.
+    - Quartiles are approximate once more than about k values were seen.
+      Compactions are randomized: pass a `seed` to make them reproducible.
+
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from astropy.io import fits
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+def _finite(values):
+    values = np.asarray(values, dtype=np.float64).ravel()
+    return values[np.isfinite(values)]
+
+
+class RunningMoments:
+    """The count, mean and variance of a stream of values."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # The sum of squared deviations from the mean.
+
+    def update(self, values):
+        """Add the finite `values` to the stream."""
+        values = _finite(values)
+        if len(values):
+            mean = values.mean()
+            self._merge(len(values), mean, np.square(values - mean).sum())
+        return self
+
+    def merge(self, other):
+        """Add the values of `other`, another `RunningMoments`."""
+        self._merge(other.count, other.mean, other.m2)
+        return self
+
+    def _merge(self, count, mean, m2):
+        if not count:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+
+    @property
+    def variance(self):
+        """The population variance, as `np.var`."""
+        return self.m2 / self.count if self.count else np.nan
+
+    @property
+    def std(self):
+        """The population standard deviation, as `np.std`."""
+        return np.sqrt(self.variance)
+
+
+class QuantileSketch:
+    """A KLL sketch of the quantiles of a stream of values."""
+
+    def __init__(self, k=200, seed=None):
+        """
+        Initialize an empty sketch.
+
+        Parameters:
+        - k (int): The capacity of the top compactor. The rank error is
+          about 1/k, and the sketch holds about 3k values.
+        - seed (int, optional): The seed of the random compactions.
+        """
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        """Add the finite `values` to the stream."""
+        values = _finite(values)
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Add the values of `other`, another `QuantileSketch`."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                # Half of the sorted items, every other one from a random
+                # start, move up a level, where they weigh twice as much.
+                items = np.sort(items)
+                odd = len(items) % 2
+                offset = self._rng.integers(2)
+                self.levels[level] = items[:odd]
+                self.levels[level + 1] = np.concatenate(
+                    [self.levels[level + 1], items[odd + offset :: 2]]
+                )
+            level += 1
+
+    def percentile(self, percentile):
+        """
+        Estimate a percentile of the values, as `np.percentile`.
+
+        Returns NaN if the sketch is empty.
+        """
+        if not self.count:
+            return np.nan
+        if len(self.levels) == 1:
+            return np.percentile(self.levels[0], percentile)
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [
+                np.full(len(level_items), 2.0**level)
+                for level, level_items in enumerate(self.levels)
+            ]
+        )
+        order = np.argsort(items, kind="stable")
+        ranks = np.cumsum(weights[order])
+        index = np.searchsorted(ranks, percentile / 100 * ranks[-1])
+        return items[order[min(index, len(items) - 1)]]
+
+
+class StreamingStatistics:
+    """Streaming moments and quartiles of the columns of many spectra."""
+
+    def __init__(self, columns=None, k=200, seed=None):
+        """
+        Initialize empty statistics.
+
+        Parameters:
+        - columns (list of str, optional): The columns to follow. Defaults
+          to the numeric columns of the first chunk.
+        - k (int): The size of the quantile sketches. See `QuantileSketch`.
+        - seed (int, optional): The seed of the quantile sketches.
+        """
+        self.columns = None if columns is None else list(columns)
+        self.k = k
+        self.seed = seed
+        self.moments = {}
+        self.sketches = {}
+
+    @classmethod
+    def from_files(
+        cls,
+        file_paths,
+        columns=None,
+        chunk_rows=DEFAULT_CHUNK_ROWS,
+        k=200,
+        seed=None,
+    ):
+        """
+        Compute the statistics of the columns of FITS or CSV files.
+
+        The files are read by chunks of `chunk_rows` rows; see `iter_chunks`.
+        """
+        statistics = cls(columns, k=k, seed=seed)
+        for chunk in iter_chunks(file_paths, columns, chunk_rows):
+            statistics.update(chunk)
+        return statistics
+
+    def update(self, chunk):
+        """
+        Add a chunk of rows to the statistics.
+
+        Parameters:
+        - chunk (DataFrame or dict): Maps the columns to 1-D arrays.
+
+        Raises:
+        - ValueError: If a followed column is not in the chunk.
+        """
+        if self.columns is None:
+            self.columns = [
+                name
+                for name in chunk.keys()
+                if np.asarray(chunk[name]).dtype.kind in "biuf"
+            ]
+        for name in self.columns:
+            if name not in chunk:
+                raise ValueError(f"Column '{name}' is not in the chunk.")
+            values = np.asarray(chunk[name])
+            self._moments(name).update(values)
+            self._sketch(name).update(values)
+        return self
+
+    def merge(self, other):
+        """
+        Add the partial statistics `other`, e.g. of another process.
+        """
+        if self.columns is None:
+            self.columns = other.columns
+        for name in other.moments:
+            self._moments(name).merge(other.moments[name])
+            self._sketch(name).merge(other.sketches[name])
+        return self
+
+    def _moments(self, name):
+        return self.moments.setdefault(name, RunningMoments())
+
+    def _sketch(self, name):
+        if name not in self.sketches:
+            seed = (
+                None if self.seed is None else [self.seed, len(self.sketches)]
+            )
+            self.sketches[name] = QuantileSketch(self.k, seed)
+        return self.sketches[name]
+
+    def _check(self, column_name):
+        if column_name not in self.moments:
+            raise ValueError(f"Column '{column_name}' has no statistics.")
+
+    def count(self, column_name):
+        """The number of finite values seen in a column."""
+        self._check(column_name)
+        return self.moments[column_name].count
+
+    def normalizer(self, column_name):
+        """
+        Get the fitted normalization of a column.
+
+        Returns:
+        - tuple: The mean and the (population) standard deviation.
+        """
+        self._check(column_name)
+        moments = self.moments[column_name]
+        return moments.mean, moments.std
+
+    def percentile(self, column_name, percentile):
+        """Estimate a percentile of a column."""
+        self._check(column_name)
+        return self.sketches[column_name].percentile(percentile)
+
+    def outlier_bounds(self, column_name):
+        """
+        Get the fitted IQR-rule outlier bounds of a column.
+
+        Returns:
+        - tuple: The lower and upper bounds, Q1 - 1.5 IQR and Q3 + 1.5 IQR.
+        """
+        q1 = self.percentile(column_name, 25)
+        q3 = self.percentile(column_name, 75)
+        iqr = q3 - q1
+        return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+    def transform(self, chunk, normalize=(), remove_outliers=()):
+        """
+        Apply the fitted statistics to a chunk of rows.
+
+        Parameters:
+        - chunk (DataFrame or dict): The rows.
+        - normalize (list of str): The columns to normalize.
+        - remove_outliers (list of str): The columns whose outliers are
+          removed. Bounds are those of the values before normalization.
+
+        Returns:
+        - pandas.DataFrame: The rows kept, transformed.
+        """
+        df = pd.DataFrame(chunk)
+        keep = np.ones(len(df), dtype=bool)
+        for name in remove_outliers:
+            lower_bound, upper_bound = self.outlier_bounds(name)
+            values = df[name].to_numpy()
+            keep &= (values >= lower_bound) & (values <= upper_bound)
+        if not keep.all():
+            df = df[keep]
+        for name in normalize:
+            mean, std = self.normalizer(name)
+            df[name] = (df[name] - mean) / std
+        return df
+
+    def transform_files(
+        self,
+        file_paths,
+        normalize=(),
+        remove_outliers=(),
+        columns=None,
+        chunk_rows=DEFAULT_CHUNK_ROWS,
+    ):
+        """
+        Apply the fitted statistics to files, in a second streaming pass.
+
+        Yields:
+        - pandas.DataFrame: Every transformed chunk of the files. See
+          `transform` and `iter_chunks`.
+        """
+        for chunk in iter_chunks(file_paths, columns, chunk_rows):
+            yield self.transform(chunk, normalize, remove_outliers)
+
+
+def iter_chunks(file_paths, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Read the columns of FITS or CSV files, by chunks of rows.
+
+    FITS files are memory-mapped, so only the chunk being processed is
+    loaded; CSV files are parsed by chunks.
+
+    Parameters:
+    - file_paths (str or iterable of str): The files.
+    - columns (list of str, optional): The columns to read. Defaults to all
+      the one-dimensional ones.
+    - chunk_rows (int): The maximum number of rows of a chunk.
+
+    Yields:
+    - dict: Maps the columns to 1-D arrays, in the native byte order.
+
+    Raises:
+    - ValueError: If a file is not a FITS or CSV file, or lacks a column.
+    """
+    if isinstance(file_paths, (str, os.PathLike)):
+        file_paths = [file_paths]
+    for file_path in map(str, file_paths):
+        if file_path.endswith(".fits"):
+            yield from _iter_fits_chunks(file_path, columns, chunk_rows)
+        elif file_path.endswith(".csv"):
+            try:
+                reader = pd.read_csv(
+                    file_path, usecols=columns, chunksize=chunk_rows
+                )
+            except ValueError as e:
+                raise ValueError(f"Cannot read '{file_path}': {e}") from e
+            for df in reader:
+                yield {name: df[name].to_numpy() for name in df.columns}
+        else:
+            raise ValueError(
+                f"Unsupported file format for the file: '{file_path}'."
+            )
+
+
+def _iter_fits_chunks(file_path, columns, chunk_rows):
+    with fits.open(file_path, memmap=True) as hdul:
+        data = hdul[1].data
+        names = [
+            name
+            for name in data.dtype.names
+            if data.dtype.fields[name][0].shape == ()
+        ]
+        if columns is None:
+            columns = names
+        missing = [name for name in columns if name not in names]
+        if missing:
+            raise ValueError(
+                f"Columns {missing} do not exist in '{file_path}'."
+            )
+        for start in range(0, len(data), chunk_rows):
+            rows = data[start : start + chunk_rows]
+            chunk = {}
+            for name in columns:
+                values = rows[name]
+                chunk[name] = values.astype(values.dtype.newbyteorder("="))
+            yield chunk
@@ -1,7 +1,8 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from scipy.ndimage import uniform_filter1d
+
+from ..data_processing.continuum import fit_continuum
 
 """
 Data Visualization Module:
@@ -10,7 +11,7 @@ Data Visualization Module:
 """
 
 
-def plot (data, window_size = 1):
+def plot (data, window_size = 1, dtype = None, method = "median", **options):
     """
         Parameters
         ----------
@@ -20,6 +21,15 @@ def plot (data, window_size = 1):
         attributes: list 
             List of attributes that will be extracted from the 'data' dictionary
 
+        dtype: str or np.dtype, optional
+            Floating-point dtype of the plotted arrays, e.g. "float32" to keep
+            float32 spectra from being upcast. Defaults to the dtypes of `data`
+
+        method: str, optional
+            Continuum estimator: "median" (running median, robust to lines),
+            "boxcar" (running mean) or "spline". See `continuum.fit_continuum`,
+            which also takes the other `options`. Defaults to "median"
+
         Returns 
         ----------
         A matplotlib that displays the spectral data with inferred continuum
@@ -51,9 +61,19 @@ def plot (data, window_size = 1):
     except KeyError as e:
         raise ValueError(f"The DataFrame must contain 'Wavelength' and 'flux' columns. Error: {e}")
 
+    if dtype is not None:
+        wavelength = np.asarray(wavelength, dtype=dtype)
+        flux = np.asarray(flux, dtype=dtype)
+
 
     # Add inferred continuum 
-    continuum = uniform_filter1d(flux, size=window_size)
+    continuum, _ = fit_continuum(
+        np.asarray(flux),
+        np.asarray(wavelength) if method == "spline" else None,
+        method=method,
+        window=window_size,
+        **options,
+    )
 
     # Plot the data 
     fig, ax = plt.subplots()
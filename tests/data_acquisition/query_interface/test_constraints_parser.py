@@ -0,0 +1,167 @@
+"""
+This test suite (a module) runs tests for
+query_interface/_constraints_parser.py module.
+"""
+
+import math
+
+import numpy as np
+import pytest
+from astropy.table import Table
+from astroquery.sdss import SDSS
+
+from astrolibrary import QueryHandler
+from astrolibrary.data_acquisition.query_interface._constraints_parser import (
+    ConstraintsParser,
+    sql_literal,
+)
+
+
+@pytest.fixture
+def parser():
+    return ConstraintsParser()
+
+
+class TestConstraintsParser:
+    """Tests for the ConstraintsParser class."""
+
+    def test_table_only(self, parser):
+        assert parser.parse({"table": "SpecObj"}) == "SELECT * FROM SpecObj"
+
+    def test_projection_predicates_and_top(self, parser):
+        query = parser.parse(
+            {
+                "table": "SpecObj",
+                "columns": ["specobjid", "z", "class"],
+                "where": {
+                    "z": (0.1, 0.3),
+                    "class": ["GALAXY", "QSO"],
+                    "zWarning": 0,
+                    "r": (None, 19.5),
+                    "g": (15, None),
+                },
+                "top": 100,
+            }
+        )
+        assert query == (
+            "SELECT TOP 100 specobjid, z, class FROM SpecObj WHERE "
+            "z BETWEEN 0.1 AND 0.3 AND class IN ('GALAXY', 'QSO') AND "
+            "zWarning = 0 AND r <= 19.5 AND g >= 15"
+        )
+
+    def test_literals_are_escaped(self, parser):
+        query = parser.parse(
+            {"table": "SpecObj", "where": {"class": "x' OR '1'='1 {0}"}}
+        )
+        assert query.endswith("WHERE class = 'x'' OR ''1''=''1 {0}'")
+        assert sql_literal(np.int64(3)) == "3"
+        with pytest.raises(ValueError):
+            sql_literal(float("nan"))
+
+    def test_single_column_as_str(self, parser):
+        single = parser.parse({"table": "SpecObj", "columns": "class"})
+        listed = parser.parse({"table": "SpecObj", "columns": ["class"]})
+        assert single == listed
+        assert single.startswith("SELECT class FROM SpecObj")
+
+    @pytest.mark.parametrize(
+        "constraints",
+        [
+            {},
+            {"table": "SpecObj; DROP TABLE SpecObj"},
+            {"table": "SpecObj", "columns": ["z --"]},
+            {"table": "SpecObj", "columns": {"z"}},
+            {"table": "SpecObj", "columns": [1]},
+            {"table": "SpecObj", "where": {"1=1 OR z": 0}},
+            {"table": "SpecObj", "where": {"z": (1, 2, 3)}},
+            {"table": "SpecObj", "where": {"class": []}},
+            {"table": "SpecObj", "where": {"class": None}},
+            {"table": "SpecObj", "top": 0},
+            {"table": "SpecObj", "limit": 10},
+            {"table": "SpecObj", "cone": {"ra": 1.0, "dec": 2.0}},
+            {"table": "SpecObj", "cone": {"ra": 0, "dec": 0, "radius": -1}},
+        ],
+    )
+    def test_invalid_constraints(self, parser, constraints):
+        with pytest.raises(ValueError):
+            parser.parse(constraints)
+
+    def test_cone_predicate_matches_angular_separation(self, parser):
+        ra0, dec0, radius = 150.0, 30.0, 6.0  # radius in arcmin
+        query = parser.parse(
+            {
+                "table": "PhotoObj",
+                "cone": {"ra": ra0, "dec": dec0, "radius": radius},
+            }
+        )
+        assert "dec BETWEEN 29.9 AND 30.1" in query
+
+        # Evaluate the compiled predicate in Python, on points just inside
+        # and just outside the cone.
+        predicate = query.split(" AND ", 2)[-1]
+        for sql, python in (
+            ("SIN", "math.sin"),
+            ("COS", "math.cos"),
+            ("RADIANS", "math.radians"),
+        ):
+            predicate = predicate.replace(sql, python)
+        predicate = predicate.replace(">=", "- 1e-15 >=")
+
+        def inside(ra, dec):
+            return eval(predicate, {"math": math, "ra": ra, "dec": dec})
+
+        step = radius / 60 / math.cos(math.radians(dec0))
+        assert inside(ra0, dec0)
+        assert inside(ra0 + 0.99 * step, dec0)
+        assert not inside(ra0 + 1.01 * step, dec0)
+        assert inside(ra0, dec0 - 0.99 * radius / 60)
+        assert not inside(ra0, dec0 + 1.01 * radius / 60)
+
+    def test_templates_are_cached_per_shape(self, parser):
+        before = parser.cache_info()
+        for z_max in (0.2, 0.3, 0.4):
+            parser.parse(
+                {"table": "CachedShape", "where": {"z": (0.1, z_max)}}
+            )
+        after = parser.cache_info()
+        assert after.misses - before.misses == 1
+        assert after.hits - before.hits == 2
+
+        # A different IN-list size is a different shape.
+        parser.parse({"table": "CachedShape", "where": {"z": [1, 2]}})
+        parser.parse({"table": "CachedShape", "where": {"z": [1, 2, 3]}})
+        assert parser.cache_info().misses - after.misses == 2
+
+
+class TestQueryHandlerWithConstraints:
+    """Tests for QueryHandler.run_constraints."""
+
+    def test_run_constraints(self, monkeypatch):
+        queries = []
+
+        def query_sql(query):
+            queries.append(query)
+            return Table({"specobjid": [1], "z": [0.2]})
+
+        monkeypatch.setattr(SDSS, "query_sql", query_sql)
+        query_handler = QueryHandler(dataset_name="SDSS")
+        query_id = query_handler.run_constraints(
+            {
+                "table": "SpecObj",
+                "columns": ["specobjid", "z"],
+                "where": {"z": (0.1, 0.3)},
+                "top": 5,
+            }
+        )
+
+        assert query_handler.get_results(query_id)["z"][0] == 0.2
+        assert queries == [
+            "SELECT TOP 5 specobjid, z FROM SpecObj "
+            "WHERE z BETWEEN 0.1 AND 0.3"
+        ]
+
+    def test_invalid_constraints_are_raised_right_away(self):
+        query_handler = QueryHandler(dataset_name="SDSS")
+        with pytest.raises(ValueError):
+            query_handler.run_constraints({"table": "Spec Obj"})
+        assert query_handler.jobs == {}
@@ -1,8 +1,13 @@
+import numpy as np
+import pandas as pd
 import pytest
+from astropy import units as u
+from astropy.coordinates import SkyCoord
 from astropy.table import Table
 import requests_mock
+from astroquery.gaia import Gaia
 from astroquery.sdss import SDSS
-from astrolibrary import cross_match
+from astrolibrary import cross_match, local_cross_match
 
 
 non_empty_objid_list = [1237645879551066262,1237645879578460255, 1237645941291614227, 1237645941824356443]
@@ -38,5 +43,150 @@ def test_cross_match_data_valid_no_crossmatch_two_args():
     assert valid3
 
 
+class FakeGaiaJob:
+    """Stands in for the astroquery job returned by `Gaia.launch_job_async`."""
 
+    def __init__(self, query):
+        ids = query.split("IN (")[1].rstrip(")").split(",")
+        # Every other identifier has a match; the first one has two.
+        matched = [int(i) for i in ids if int(i) % 2 == 0]
+        self.results = Table(
+            {
+                "source_id": [i * 10 for i in matched],
+                "original_ext_source_id": matched,
+                "angular_distance": [0.5] * len(matched),
+            }
+        )
 
+    def get_results(self):
+        return self.results
+
+
+def test_cross_match_in_batches(monkeypatch):
+    queries = []
+
+    def launch_job_async(query):
+        queries.append(query)
+        return FakeGaiaJob(query)
+
+    monkeypatch.setattr(Gaia, "launch_job_async", launch_job_async)
+    objids = list(range(1, 101)) + [2, 4]  # Duplicates are queried once.
+
+    table = cross_match(objids, 1.5, batch_size=30, max_workers=3)
+
+    assert len(queries) == 4
+    assert all("angular_distance < 1.5" in query for query in queries)
+    assert sorted(table["original_ext_source_id"]) == list(range(2, 101, 2))
+
+    report = table.meta["batch_report"]
+    assert [batch["size"] for batch in report] == [30, 30, 30, 10]
+    assert sum(batch["rows"] for batch in report) == 50
+    assert all(batch["seconds"] >= 0 for batch in report)
+
+
+def test_cross_match_batches_without_matches(monkeypatch):
+    monkeypatch.setattr(Gaia, "launch_job_async", FakeGaiaJob)
+    table = cross_match([1, 3, 5, 7], batch_size=2)
+    assert len(table) == 0
+    assert len(table.meta["batch_report"]) == 2
+
+
+def test_cross_match_small_list_is_not_batched(monkeypatch):
+    monkeypatch.setattr(Gaia, "launch_job_async", FakeGaiaJob)
+    table = cross_match([2, 3], batch_size=10)
+    assert list(table["original_ext_source_id"]) == [2]
+    [report] = table.meta["batch_report"]
+    assert report["batch"] == 0 and report["size"] == 2
+    assert report["rows"] == 1 and report["seconds"] >= 0
+
+
+def test_cross_match_invalid_batch_parameters(monkeypatch):
+    monkeypatch.setattr(Gaia, "launch_job_async", FakeGaiaJob)
+    with pytest.raises(ValueError):
+        cross_match([2, 3, 4], batch_size=0)
+    with pytest.raises(ValueError):
+        cross_match([2, 3, 4], batch_size=1, max_workers=0)
+    # Also when the list fits in a single query.
+    with pytest.raises(ValueError):
+        cross_match([2, 3, 4], max_workers=0)
+    with pytest.raises(ValueError):
+        cross_match([2, 3, 4], batch_size=10, max_workers=-1)
+
+
+def test_local_cross_match_separations():
+    rng = np.random.default_rng(15)
+    ra = rng.uniform(0, 360, 500)
+    dec = rng.uniform(-89, 89, 500)
+    gaia = Table({"source_id": np.arange(500), "ra": ra, "dec": dec})
+    # Shift every SDSS source by 0 to 3 arcsec in a random direction.
+    offsets = SkyCoord(ra * u.deg, dec * u.deg).directional_offset_by(
+        rng.uniform(0, 360, 500) * u.deg, rng.uniform(0, 3, 500) * u.arcsec
+    )
+    sdss = Table(
+        {
+            "objid": np.arange(500) + 10**18,
+            "ra": offsets.ra.deg,
+            "dec": offsets.dec.deg,
+        }
+    )
+
+    table = local_cross_match(sdss, gaia, angular_distance_max=2.0)
+
+    expected = SkyCoord(ra * u.deg, dec * u.deg).separation(offsets).arcsec
+    assert len(table) == np.sum(expected < 2.0)
+    assert list(table["source_id"] + 10**18) == list(
+        table["original_ext_source_id"]
+    )
+    np.testing.assert_allclose(
+        table["angular_distance"],
+        expected[table["source_id"]],
+        atol=1e-6,
+    )
+    assert table.colnames == [
+        "source_id",
+        "clean_sdssdr13_oid",
+        "original_ext_source_id",
+        "angular_distance",
+        "number_of_neighbours",
+        "number_of_mates",
+        "xm_flag",
+    ]
+
+
+def test_local_cross_match_neighbours_and_mates():
+    # Ten Gaia sources within 1 arcsec of the origin, and two SDSS sources
+    # on top of the first one.
+    gaia = pd.DataFrame(
+        {
+            "source_id": np.arange(10),
+            "ra": np.arange(10) * 0.1 / 3600,
+            "dec": np.zeros(10),
+        }
+    )
+    sdss = pd.DataFrame(
+        {"objid": [1, 2, 3], "ra": [0.0, 0.0, 180.0], "dec": [0.0, 0.0, 0.0]}
+    )
+
+    table = local_cross_match(sdss, gaia, angular_distance_max=1.5)
+
+    assert list(table["clean_sdssdr13_oid"]) == [1, 2]
+    assert list(table["source_id"]) == [0, 0]
+    assert list(table["number_of_neighbours"]) == [10, 10]
+    assert list(table["number_of_mates"]) == [1, 1]
+
+
+def test_local_cross_match_handles_ra_wrap_around():
+    gaia = Table({"source_id": [7], "ra": [359.9999], "dec": [0.0]})
+    sdss = Table({"objid": [1], "ra": [0.0001], "dec": [0.0]})
+    table = local_cross_match(sdss, gaia, angular_distance_max=1.0)
+    np.testing.assert_allclose(table["angular_distance"], [0.72], atol=1e-6)
+
+
+def test_local_cross_match_invalid_input():
+    gaia = Table({"source_id": [7], "ra": [0.0], "dec": [0.0]})
+    with pytest.raises(ValueError):
+        local_cross_match(Table({"ra": [0.0], "dec": [0.0]}), gaia)
+    with pytest.raises(ValueError):
+        local_cross_match(gaia, gaia, 0, sdss_id_column="source_id")
+    empty = Table({"objid": [], "ra": [], "dec": []})
+    assert len(local_cross_match(empty, gaia)) == 0
@@ -0,0 +1,200 @@
+"""
+This test suite (a module) runs tests for query_interface/_gaia_connector.py
+module, and for its use by the QueryHandler.
+"""
+import threading
+
+import pytest
+import requests
+from astropy.table import Table
+from astroquery.gaia import Gaia
+
+from astrolibrary import QueryCache, QueryHandler
+from astrolibrary.data_acquisition.query_interface._gaia_connector import (
+    GaiaConnector,
+)
+from astrolibrary.data_acquisition.query_interface._resilience import (
+    CircuitBreaker,
+    RetryPolicy,
+    TokenBucket,
+)
+
+query_input = "SELECT TOP 10 source_id, ra, dec FROM gaiadr3.gaia_source"
+success_results = Table({"source_id": [1, 2], "ra": [0.1, 0.2]})
+
+
+class FakeGaiaJob:
+    """A local fake of the astroquery TAP job API.
+
+    The job runs for `polls` phase updates, then ends in `final_phase`.
+    """
+
+    def __init__(self, query, polls=2, final_phase="COMPLETED", results=None):
+        self.query = query
+        self.jobid = "1700000000000O"
+        self.polls = polls
+        self.final_phase = final_phase
+        self.results = success_results if results is None else results
+        self.phase_requests = 0
+        self.result_requests = 0
+
+    def get_phase(self, update=False):
+        self.phase_requests += 1
+        if self.phase_requests > self.polls:
+            return self.final_phase
+        return "EXECUTING"
+
+    def get_results(self):
+        # The real job waits for the end of the job before downloading.
+        self.result_requests += 1
+        self.phase_requests = max(self.phase_requests, self.polls)
+        return self.results
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """Fakes `Gaia.launch_job_async`, and returns the launched jobs."""
+    launched = []
+
+    def launch_job_async(query, background=False, **kwargs):
+        assert background, "Gaia jobs must not block the caller."
+        launched.append(FakeGaiaJob(query))
+        return launched[-1]
+
+    monkeypatch.setattr(Gaia, "launch_job_async", launch_job_async)
+    monkeypatch.setattr(
+        GaiaConnector, "retry_policy", RetryPolicy(max_attempts=1)
+    )
+    monkeypatch.setattr(
+        GaiaConnector, "rate_limiter", TokenBucket(rate=1e6, capacity=1e6)
+    )
+    monkeypatch.setattr(GaiaConnector, "circuit_breaker", CircuitBreaker())
+    return launched
+
+
+class TestGaiaConnector:
+    """Tests for the GaiaConnector class."""
+
+    def test_run_query_does_not_wait_for_the_job(self, jobs):
+        GaiaConnector().run_query(query_input)
+        assert jobs[0].query == query_input
+        assert jobs[0].phase_requests == 0
+        assert jobs[0].result_requests == 0
+
+    def test_status_follows_the_job_phase(self, jobs):
+        connector = GaiaConnector().run_query(query_input)
+        assert connector.check_status() == "RUNNING"
+        assert connector.check_status() == "RUNNING"
+        assert connector.check_status() == "COMPLETED"
+        # A finished job is not polled anymore.
+        assert connector.check_status() == "COMPLETED"
+        assert jobs[0].phase_requests == 3
+
+    def test_results_are_fetched_once_on_demand(self, jobs):
+        connector = GaiaConnector().run_query(query_input)
+        assert connector.get_results() is success_results
+        assert connector.get_results() is success_results
+        assert connector.check_status() == "COMPLETED"
+        assert jobs[0].result_requests == 1
+
+    @pytest.mark.parametrize("phase", ["ERROR", "ABORTED"])
+    def test_failed_jobs(self, jobs, phase):
+        connector = GaiaConnector().run_query(query_input)
+        jobs[0].polls, jobs[0].final_phase = 0, phase
+        assert connector.check_status() == "ERROR"
+        with pytest.raises(ValueError):
+            connector.get_results()
+        assert jobs[0].result_requests == 0
+
+    def test_submission_is_not_retried(self, jobs, monkeypatch):
+        attempts = []
+
+        def launch_job_async(query, background=False, **kwargs):
+            attempts.append(query)
+            raise requests.exceptions.ReadTimeout("No answer.")
+
+        monkeypatch.setattr(Gaia, "launch_job_async", launch_job_async)
+        monkeypatch.setattr(
+            GaiaConnector,
+            "retry_policy",
+            RetryPolicy(max_attempts=3, sleep=lambda seconds: None),
+        )
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            GaiaConnector().run_query(query_input)
+        assert len(attempts) == 1
+
+    def test_download_does_not_block_status(self, jobs):
+        connector = GaiaConnector().run_query(query_input)
+        downloading, release = threading.Event(), threading.Event()
+
+        def get_results():
+            downloading.set()
+            release.wait(timeout=5)
+            return success_results
+
+        jobs[0].get_results = get_results
+        thread = threading.Thread(target=connector.get_results)
+        thread.start()
+        assert downloading.wait(timeout=5)
+        assert connector.check_status() == "RUNNING"
+        release.set()
+        thread.join(timeout=5)
+        assert connector.get_results() is success_results
+
+    def test_empty_results(self, jobs):
+        connector = GaiaConnector().run_query(query_input)
+        jobs[0].results = Table({"source_id": []})
+        assert connector.get_results() is None
+        assert connector.check_status() == "SUCCESS_NO_RESULTS"
+
+
+class TestQueryHandlerWithGaia:
+    """Tests for running Gaia jobs through the QueryHandler."""
+
+    def test_many_jobs_with_one_worker(self, jobs):
+        with QueryHandler(dataset_name="Gaia", max_workers=1) as handler:
+            query_ids = [
+                handler.run_query(f"{query_input} WHERE ra > {i}")
+                for i in range(5)
+            ]
+            for query_id in query_ids:
+                handler.jobs[query_id].result(timeout=5)
+
+            # All five jobs are in flight, though only one worker exists.
+            assert len(jobs) == 5
+            assert all(job.result_requests == 0 for job in jobs)
+            assert {handler.check_status(i) for i in query_ids} == {"RUNNING"}
+            for query_id in query_ids:
+                assert handler.get_results(query_id) is success_results
+
+    def test_get_results_without_waiting(self, jobs):
+        handler = QueryHandler(dataset_name="Gaia")
+        query_id = handler.run_query(query_input)
+        handler.jobs[query_id].result(timeout=5)
+        jobs[0].polls = 100
+
+        with pytest.raises(TimeoutError):
+            handler.get_results(query_id, wait=False)
+        with pytest.raises(TimeoutError):
+            handler.get_results(query_id, timeout=0.01)
+        assert jobs[0].result_requests == 0
+
+        jobs[0].polls = 0
+        assert handler.get_results(query_id, wait=False) is success_results
+
+    def test_results_are_cached_once_fetched(self, jobs, tmp_path):
+        cache = QueryCache(cache_dir=str(tmp_path / "cache"))
+        handler = QueryHandler(dataset_name="Gaia", cache=cache)
+        query_id = handler.run_query(query_input)
+        handler.jobs[query_id].result(timeout=5)
+        # Submitting the job does not poll it.
+        assert jobs[0].phase_requests == 0
+        assert cache.stats()["entries"] == 0
+
+        handler.get_results(query_id)
+        handler.get_results(query_id)
+        assert cache.stats()["entries"] == 1
+
+        query_id = handler.run_query(query_input)
+        assert list(handler.get_results(query_id)["source_id"]) == [1, 2]
+        assert len(jobs) == 1
@@ -0,0 +1,185 @@
+"""
+This test suite (a module) runs tests for
+query_interface/_local_catalog_connector.py module.
+"""
+import numpy as np
+import pytest
+from astropy.table import MaskedColumn, Table
+
+from astrolibrary import LocalCatalog, QueryCache, QueryHandler
+from astrolibrary.data_acquisition.query_interface import (
+    _local_catalog_connector as local_connector,
+)
+
+spec_obj = Table(
+    {
+        "specObjID": [10, 11, 12, 13],
+        "plate": [7644, 7644, 7644, 266],
+        "mjd": [57327, 57327, 57327, 51630],
+        "fiberID": [528, 529, 530, 1],
+        "ra": [150.0, 150.01, 151.0, 10.0],
+        "dec": [30.0, 30.01, 31.0, -5.0],
+        "z": [0.1, 0.2, 0.3, 1.5],
+        "class": ["GALAXY", "GALAXY", "STAR", "QSO"],
+    }
+)
+
+
+@pytest.fixture
+def catalog():
+    with LocalCatalog() as catalog:
+        catalog.ingest(spec_obj, "SpecObj")
+        yield catalog
+
+
+class TestLocalCatalog:
+    """Tests for the LocalCatalog class."""
+
+    def test_translate_top(self):
+        translate_top = local_connector.translate_top
+        assert translate_top("SELECT TOP 10 z FROM SpecObj;") == (
+            "SELECT z FROM SpecObj LIMIT 10"
+        )
+        assert translate_top(
+            "SELECT TOP 5 * FROM (SELECT DISTINCT TOP 50 z FROM t "
+            "WHERE c IN ('a)', 'b')) AS page ORDER BY page.z"
+        ) == (
+            "SELECT * FROM (SELECT DISTINCT z FROM t "
+            "WHERE c IN ('a)', 'b') LIMIT 50) AS page ORDER BY page.z LIMIT 5"
+        )
+
+    def test_ingest_and_query(self, catalog):
+        results = catalog.query(
+            "SELECT TOP 1 specObjID, class FROM SpecObj "
+            "WHERE z > 0.15 ORDER BY z"
+        )
+        assert len(results) == 1
+        assert results["specObjID"][0] == 11
+        assert results["class"][0] == "GALAXY"
+
+    def test_indexes_and_zone_column(self, catalog):
+        indexes = {
+            row[0]
+            for row in catalog._connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+        assert indexes == {
+            "SpecObj_specobjid",
+            "SpecObj_plate_mjd_fiberid",
+            "SpecObj_zone_ra",
+            "SpecObj_dec",
+        }
+        zones = catalog.query("SELECT zone FROM SpecObj ORDER BY specObjID")
+        assert list(zones["zone"]) == [14400, 14401, 14520, 10200]
+
+        plan = catalog.query(
+            "EXPLAIN QUERY PLAN SELECT * FROM SpecObj "
+            "WHERE plate = 7644 AND mjd = 57327 AND fiberid = 528"
+        )
+        assert "SpecObj_plate_mjd_fiberid" in " ".join(plan["detail"])
+
+    def test_append_replace_and_masked_values(self, catalog):
+        more = spec_obj[:2].copy()
+        more["z"] = MaskedColumn([0.5, 0.6], mask=[True, False])
+        assert catalog.ingest(more, "SpecObj") == 2
+        assert len(catalog.query("SELECT * FROM SpecObj")) == 6
+        assert len(catalog.query("SELECT * FROM SpecObj WHERE z IS NULL")) == 1
+
+        # Math functions of NULL values are NULL.
+        results = catalog.query(
+            "SELECT SIN(RADIANS(z)) AS s, POWER(z, 2) AS p FROM SpecObj "
+            "WHERE z IS NULL"
+        )
+        assert list(results["s"]) == list(results["p"]) == [None]
+
+        catalog.ingest(spec_obj[:1], "SpecObj", replace=True)
+        assert len(catalog.query("SELECT * FROM SpecObj")) == 1
+        assert catalog.tables() == ["SpecObj"]
+
+        with pytest.raises(ValueError):
+            catalog.ingest(Table({"unknown": [1]}), "SpecObj")
+        with pytest.raises(ValueError):
+            catalog.ingest(Table({"flux": np.zeros((2, 3))}), "Spectra")
+
+    def test_empty_results_keep_their_columns(self, catalog):
+        results = catalog.query("SELECT z, ra FROM SpecObj WHERE z > 10")
+        assert len(results) == 0
+        assert results.colnames == ["z", "ra"]
+
+    def test_invalid_query(self, catalog):
+        with pytest.raises(ValueError):
+            catalog.query("SELECT * FROM PhotoObj")
+
+    def test_persists_to_disk(self, tmp_path):
+        path = str(tmp_path / "catalog.db")
+        with LocalCatalog(path) as catalog:
+            catalog.ingest(spec_obj, "SpecObj")
+        with LocalCatalog(path) as catalog:
+            assert len(catalog.query("SELECT * FROM SpecObj")) == 4
+
+
+class TestQueryHandlerWithLocalCatalog:
+    """Tests for running SQL queries against a LocalCatalog."""
+
+    def test_connector_statuses(self, catalog):
+        connector = local_connector.LocalCatalogConnector(catalog)
+        assert connector.run_query("SELECT * FROM SpecObj WHERE z > 10")
+        assert connector.check_status() == "SUCCESS_NO_RESULTS"
+        assert connector.get_results() is None
+        with pytest.raises(ValueError):
+            connector.run_query("SELECT nothing")
+        assert connector.check_status() == "ERROR"
+
+    def test_run_constraints_with_cone(self, catalog):
+        handler = QueryHandler(dataset_name="Local", catalog=catalog)
+        query_id = handler.run_constraints(
+            {
+                "table": "SpecObj",
+                "columns": ["specObjID"],
+                "where": {"class": ["GALAXY", "QSO"]},
+                "cone": {"ra": 150.0, "dec": 30.0, "radius": 1.0},
+                "top": 10,
+            }
+        )
+        assert list(handler.get_results(query_id)["specObjID"]) == [10, 11]
+
+    def test_iter_query(self, catalog):
+        handler = QueryHandler(dataset_name="Local", catalog=catalog)
+        chunks = list(
+            handler.iter_query("SELECT * FROM SpecObj", "specObjID", 3)
+        )
+        assert [len(chunk) for chunk in chunks] == [3, 1]
+
+    def test_catalogs_are_not_shared_between_handlers(self, catalog):
+        with LocalCatalog() as other:
+            other.ingest(spec_obj[:1], "SpecObj")
+            first = QueryHandler(dataset_name="Local", catalog=catalog)
+            second = QueryHandler(dataset_name="Local", catalog=other)
+            query = "SELECT * FROM SpecObj"
+            assert len(first.get_results(first.run_query(query))) == 4
+            assert len(second.get_results(second.run_query(query))) == 1
+
+    def test_cached_results_are_kept_per_catalog(self, tmp_path):
+        cache = QueryCache(cache_dir=str(tmp_path / "cache"))
+        query = "SELECT * FROM SpecObj"
+        lengths = []
+        for name, rows in [("first", 4), ("second", 1), ("first", 4)]:
+            with LocalCatalog(str(tmp_path / f"{name}.db")) as catalog:
+                if not catalog.tables():
+                    catalog.ingest(spec_obj[:rows], "SpecObj")
+                handler = QueryHandler("Local", cache=cache, catalog=catalog)
+                query_id = handler.run_query(query)
+                lengths.append(len(handler.get_results(query_id)))
+        assert lengths == [4, 1, 4]
+        assert cache.stats()["entries"] == 2
+        assert cache.stats()["hits"] == 1
+
+        with LocalCatalog() as catalog:
+            catalog.ingest(spec_obj, "SpecObj")
+            handler = QueryHandler("Local", cache=cache, catalog=catalog)
+            assert handler.cache is None
+
+    def test_local_dataset_needs_a_catalog(self):
+        with pytest.raises(ValueError):
+            QueryHandler(dataset_name="Local")
@@ -0,0 +1,148 @@
+"""
+This test suite (a module) runs tests for query_interface/_query_cache.py
+module.
+"""
+import os
+
+import pytest
+from astropy.table import Table
+from astroquery.sdss import SDSS
+
+from astrolibrary import QueryCache, QueryHandler
+from astrolibrary.data_acquisition.query_interface._query_cache import (
+    normalize_query,
+)
+
+query_input = """
+                SELECT top 10 z, ra, dec, bestObjID
+                FROM specObj
+                WHERE class = 'galaxy' AND z > 0.3 AND zWarning = 0
+              """
+success_results = Table(
+    {"z": [0.3], "ra": [0.3], "dec": [0.3], "bestObjID": [1237645879551066262]}
+)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Returns an empty QueryCache stored in a temporary directory."""
+    return QueryCache(cache_dir=str(tmp_path / "cache"))
+
+
+class TestQueryCache:
+    """Tests for the QueryCache class."""
+
+    def test_normalize_query(self):
+        assert normalize_query("  SELECT  TOP 10\n\tz FROM specObj ") == (
+            "select top 10 z from specobj"
+        )
+
+    def test_normalize_query_keeps_quoted_text(self):
+        query = "SELECT z FROM specObj WHERE class='GALAXY'"
+        galaxies = normalize_query(query)
+        assert galaxies == "select z from specobj where class='GALAXY'"
+        assert galaxies != normalize_query(
+            "SELECT z FROM specObj WHERE class='galaxy'"
+        )
+        assert normalize_query("SELECT  'It''s  A'  AS \"Note  X\"") == (
+            "select 'It''s  A' as \"Note  X\""
+        )
+
+    def test_invalid_parameters(self, tmp_path):
+        with pytest.raises(ValueError):
+            QueryCache(cache_dir=str(tmp_path), max_bytes=-1)
+        with pytest.raises(ValueError):
+            QueryCache(cache_dir=str(tmp_path), ttl=-1)
+
+    def test_put_and_get_round_trip(self, cache):
+        assert cache.get("SDSS", query_input) is None
+        cache.put("SDSS", query_input, success_results)
+
+        results = cache.get("SDSS", query_input)
+        assert results.colnames == success_results.colnames
+        assert results["bestObjID"][0] == 1237645879551066262
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+        assert stats["bytes_written"] == stats["bytes_read"] > 0
+
+    def test_key_is_normalized_and_dataset_specific(self, cache):
+        cache.put("SDSS", query_input, success_results)
+        respelled = query_input.replace("top", "TOP").replace("FROM", "from")
+        assert cache.get("SDSS", " ".join(respelled.split()))
+        assert cache.get("Gaia", query_input) is None
+
+    def test_expired_entries_are_misses(self, cache):
+        cache.put("SDSS", query_input, success_results, ttl=0)
+        assert cache.get("SDSS", query_input) is None
+        assert cache.stats()["entries"] == 0
+
+    def test_lru_eviction_under_byte_budget(self, tmp_path):
+        cache = QueryCache(cache_dir=str(tmp_path))
+        cache.put("SDSS", "SELECT 1", success_results)
+        entry_size = cache.size
+        cache.max_bytes = 2 * entry_size
+
+        cache.put("SDSS", "SELECT 2", success_results)
+        cache.get("SDSS", "SELECT 1")  # "SELECT 2" is now least recent.
+        cache.put("SDSS", "SELECT 3", success_results)
+
+        assert cache.stats()["evictions"] == 1
+        assert cache.size <= cache.max_bytes
+        assert cache.get("SDSS", "SELECT 2") is None
+        assert cache.get("SDSS", "SELECT 1") is not None
+        assert cache.get("SDSS", "SELECT 3") is not None
+
+    def test_index_persists_across_instances(self, cache):
+        cache.put("SDSS", query_input, success_results)
+        reopened = QueryCache(cache_dir=cache.cache_dir)
+        assert reopened.get("SDSS", query_input) is not None
+
+    def test_missing_file_is_a_miss(self, cache):
+        cache.put("SDSS", query_input, success_results)
+        os.remove(cache._path(cache.key("SDSS", query_input)))
+        assert cache.get("SDSS", query_input) is None
+
+    def test_clear(self, cache):
+        cache.put("SDSS", query_input, success_results)
+        cache.clear()
+        assert cache.stats()["entries"] == 0
+        assert cache.get("SDSS", query_input) is None
+
+
+class TestQueryHandlerWithCache:
+    """Tests for the QueryHandler's use of a QueryCache."""
+
+    def test_repeated_query_is_served_from_cache(self, cache, monkeypatch):
+        calls = []
+
+        def query_sql(query):
+            calls.append(query)
+            return success_results
+
+        monkeypatch.setattr(SDSS, "query_sql", query_sql)
+        query_handler = QueryHandler(dataset_name="SDSS", cache=cache)
+
+        first_id = query_handler.run_query(query_input)
+        query_handler.get_results(first_id)
+        second_id = query_handler.run_query(query_input.replace("top", "TOP"))
+
+        assert (
+            query_handler.get_results(first_id)["z"][0]
+            == query_handler.get_results(second_id)["z"][0]
+        )
+        assert len(calls) == 1
+        assert query_handler.check_status(second_id) == "COMPLETED"
+        assert cache.stats()["hits"] == 1
+
+    def test_errors_are_not_cached(self, cache, monkeypatch):
+        errored_results = Table({"error_message": ["error"]})
+        monkeypatch.setattr(SDSS, "query_sql", lambda x: errored_results)
+        query_handler = QueryHandler(dataset_name="SDSS", cache=cache)
+
+        query_id = query_handler.run_query(query_input)
+        with pytest.raises(ValueError):
+            query_handler.get_results(query_id)
+        assert cache.stats()["entries"] == 0
@@ -2,10 +2,18 @@
 This test suite (a module) runs tests for query_interface/query_handler.py
 module.
 """
+import re
+import threading
+import time
+
 import pytest
 from astropy.table import Table
 from astroquery.sdss import SDSS
 from astrolibrary import QueryHandler
+from astrolibrary.data_acquisition._single_flight import SingleFlight
+from astrolibrary.data_acquisition.query_interface import (
+    query_handler as query_handler_module,
+)
 
 
 @pytest.fixture
@@ -55,9 +63,11 @@ class TestQueryHandler:
 
         monkeypatch.setattr(SDSS, "query_sql", lambda x: errored_results)
 
-        # Test invalid query
+        # Test invalid query: the error surfaces once the job has run
+        query_id = query_handler.run_query("invalid_query")
         with pytest.raises(Exception):
-            query_handler.run_query("invalid_query")
+            query_handler.get_results(query_id)
+        assert query_handler.check_status(query_id) == "ERROR"
 
         # Test empty query
         with pytest.raises(ValueError):
@@ -69,8 +79,10 @@ class TestQueryHandler:
         """Test handling of exceptions such as network/connection issues."""
         # Mock the SDSS.query_sql method
         monkeypatch.setattr(SDSS, "query_sql", lambda x: mocked_exception())
+        query_id = query_handler.run_query(query_input)
         with pytest.raises(Exception):
-            query_handler.run_query(query_input)
+            query_handler.get_results(query_id)
+        assert query_handler.check_status(query_id) == "ERROR"
 
     def test_query_handler_valid_check_status(self, query_handler, monkeypatch):
         """Tests that the query handler checks the status of a query."""
@@ -114,3 +126,167 @@ class TestQueryHandler:
         # Test empty results
         with pytest.raises(ValueError):
             query_handler.get_results("")
+
+    def test_query_handler_invalid_max_workers(self):
+        """Tests that the worker pool size is validated."""
+        with pytest.raises(ValueError):
+            QueryHandler(dataset_name="SDSS", max_workers=0)
+
+
+class TestAsynchronousQueryHandler:
+    """Tests for the asynchronous behavior of the QueryHandler class."""
+
+    def test_run_query_returns_before_query_finishes(
+        self, query_handler, monkeypatch
+    ):
+        """Tests that `run_query` does not block on the SDSS API."""
+        release = threading.Event()
+
+        def blocking_query_sql(query):
+            release.wait(timeout=5)
+            return success_results
+
+        monkeypatch.setattr(SDSS, "query_sql", blocking_query_sql)
+        query_id = query_handler.run_query(query_input)
+        assert query_handler.check_status(query_id) == "RUNNING"
+
+        with pytest.raises(TimeoutError):
+            query_handler.get_results(query_id, wait=False)
+        with pytest.raises(TimeoutError):
+            query_handler.get_results(query_id, timeout=0.01)
+
+        release.set()
+        assert len(query_handler.get_results(query_id, timeout=5)) == 1
+        assert query_handler.check_status(query_id) == "COMPLETED"
+
+    def test_jobs_do_not_share_connectors(self, query_handler, monkeypatch):
+        """Tests that a second query does not overwrite the first one."""
+        monkeypatch.setattr(
+            SDSS, "query_sql", lambda x: Table({"query": [x]})
+        )
+        first_id = query_handler.run_query("SELECT 1")
+        second_id = query_handler.run_query("SELECT 2")
+
+        assert first_id != second_id
+        assert query_handler.get_results(first_id)["query"][0] == "SELECT 1"
+        assert query_handler.get_results(second_id)["query"][0] == "SELECT 2"
+
+    def test_many_queries_in_flight(self, monkeypatch):
+        """Tests that queries run concurrently up to `max_workers`."""
+        barrier = threading.Barrier(4, timeout=5)
+
+        def query_sql(query):
+            barrier.wait()  # Only passes if 4 queries run at the same time.
+            return success_results
+
+        monkeypatch.setattr(SDSS, "query_sql", query_sql)
+        with QueryHandler(dataset_name="SDSS", max_workers=4) as handler:
+            # Distinct queries, as identical ones would share a single call.
+            query_ids = [handler.run_query(f"SELECT {i}") for i in range(4)]
+            for query_id in query_ids:
+                assert handler.get_results(query_id, timeout=5)
+
+    def test_identical_queries_share_one_call(self, monkeypatch):
+        """Tests that concurrent identical queries are coalesced."""
+        flights = SingleFlight()
+        monkeypatch.setattr(query_handler_module, "_QUERY_FLIGHTS", flights)
+        release = threading.Event()
+        calls = []
+
+        def query_sql(query):
+            calls.append(query)
+            release.wait(timeout=5)
+            return success_results
+
+        monkeypatch.setattr(SDSS, "query_sql", query_sql)
+        first = QueryHandler(dataset_name="SDSS", max_workers=4)
+        second = QueryHandler(dataset_name="SDSS")
+        query_ids = [first.run_query(query_input) for _ in range(3)]
+        other_id = second.run_query(query_input.replace("top", "TOP"))
+
+        deadline = time.monotonic() + 5
+        while flights.stats()["shared"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+
+        results = [first.get_results(query_id) for query_id in query_ids]
+        assert second.get_results(other_id) is results[0]
+        assert len(calls) == 1
+        assert flights.stats() == {"calls": 4, "shared": 3}
+
+    def test_identical_queries_share_one_error(
+        self, query_handler, monkeypatch
+    ):
+        """Tests that every coalesced query gets the error."""
+        release = threading.Event()
+
+        def query_sql(query):
+            release.wait(timeout=5)
+            raise ValueError("SDSS is down")
+
+        monkeypatch.setattr(SDSS, "query_sql", query_sql)
+        query_ids = [query_handler.run_query(query_input) for _ in range(2)]
+        release.set()
+        for query_id in query_ids:
+            with pytest.raises(ValueError, match="SDSS is down"):
+                query_handler.get_results(query_id)
+            assert query_handler.check_status(query_id) == "ERROR"
+
+
+class TestStreamingQueryHandler:
+    """Tests for streaming results with `QueryHandler.iter_query`."""
+
+    @staticmethod
+    def paged_query_sql(n_rows, calls):
+        """Fakes SDSS.query_sql over a table of `n_rows` keyed by objid."""
+
+        def query_sql(query):
+            calls.append(query)
+            top = int(re.search(r"TOP (\d+)", query).group(1))
+            after = re.search(r"page\.objid > (\d+)", query)
+            first = int(after.group(1)) + 1 if after else 0
+            keys = list(range(first, min(first + top, n_rows)))
+            return Table({"objid": keys, "z": [k / 10 for k in keys]})
+
+        return query_sql
+
+    def test_iter_query_yields_bounded_chunks(
+        self, query_handler, monkeypatch
+    ):
+        calls = []
+        monkeypatch.setattr(SDSS, "query_sql", self.paged_query_sql(25, calls))
+
+        chunks = list(
+            query_handler.iter_query(
+                "SELECT objid, z FROM SpecObj", "objid", chunk_rows=10
+            )
+        )
+
+        assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+        assert [k for chunk in chunks for k in chunk["objid"]] == list(
+            range(25)
+        )
+        assert "WHERE" not in calls[0]
+        assert "page.objid > 9" in calls[1]
+        assert all(call.endswith("ORDER BY page.objid") for call in calls)
+        assert query_handler.jobs == {}
+
+    def test_iter_query_stops_on_empty_page(self, query_handler, monkeypatch):
+        calls = []
+        monkeypatch.setattr(SDSS, "query_sql", self.paged_query_sql(20, calls))
+
+        chunks = list(
+            query_handler.iter_query("SELECT objid FROM SpecObj", "objid", 10)
+        )
+
+        assert [len(chunk) for chunk in chunks] == [10, 10]
+        assert len(calls) == 3
+
+    def test_iter_query_invalid_arguments(self, query_handler, monkeypatch):
+        monkeypatch.setattr(SDSS, "query_sql", lambda x: success_results)
+        with pytest.raises(ValueError):
+            next(query_handler.iter_query(query_input, "objid; DROP", 10))
+        with pytest.raises(ValueError):
+            next(query_handler.iter_query(query_input, "objid", 0))
+        with pytest.raises(ValueError):
+            next(query_handler.iter_query(query_input, "objid", 10))
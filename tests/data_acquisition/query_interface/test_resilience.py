@@ -0,0 +1,220 @@
+"""
+This test suite (a module) runs tests for query_interface/_resilience.py
+module, and for its use by the SDSS connector.
+"""
+import pytest
+import requests
+from astropy.table import Table
+from astroquery.sdss import SDSS
+
+from astrolibrary import QueryHandler
+from astrolibrary.data_acquisition.query_interface._resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilienceMetrics,
+    RetryPolicy,
+    TokenBucket,
+    is_transient,
+    resilient_call,
+)
+from astrolibrary.data_acquisition.query_interface._sdss_connector import (
+    SDSSConnector,
+)
+
+success_results = Table({"z": [0.3], "ra": [0.3], "dec": [0.3]})
+
+
+class FakeClock:
+    """A clock that only moves when something sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(response=response)
+
+
+def flaky(failures, error=requests.exceptions.ConnectionError):
+    """Returns a function failing `failures` times before succeeding."""
+    calls = []
+
+    def function():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error()
+        return "ok"
+
+    function.calls = calls
+    return function
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def no_wait_retry(clock):
+    return RetryPolicy(max_attempts=4, sleep=clock.sleep, random=lambda: 1.0)
+
+
+class TestResiliencePolicies:
+    """Tests for the retry, rate limiting and circuit breaking policies."""
+
+    def test_is_transient(self):
+        assert is_transient(requests.exceptions.Timeout())
+        assert is_transient(requests.exceptions.ConnectionError())
+        assert is_transient(http_error(503))
+        assert is_transient(http_error(429))
+        assert not is_transient(http_error(400))
+        assert not is_transient(ValueError())
+
+    def test_retry_backoff_is_exponential_and_capped(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=5.0, random=lambda: 1)
+        assert [policy.delay(i) for i in range(5)] == [1, 2, 4, 5, 5]
+        jittered = RetryPolicy(base_delay=1.0, random=lambda: 0.5)
+        assert jittered.delay(2) == 2.0
+        with pytest.raises(ValueError):
+            RetryPolicy(max_attempts=0)
+
+    def test_transient_errors_are_retried(self, clock, no_wait_retry):
+        function = flaky(2)
+        metrics = ResilienceMetrics()
+        assert resilient_call(function, no_wait_retry, metrics=metrics) == "ok"
+        assert len(function.calls) == 3
+        assert clock.sleeps == [0.5, 1.0]
+        assert metrics.snapshot()["retries"] == 2
+        assert metrics.snapshot()["failures"] == 2
+
+    def test_retries_are_bounded(self, no_wait_retry):
+        function = flaky(10)
+        with pytest.raises(requests.exceptions.ConnectionError):
+            resilient_call(function, no_wait_retry)
+        assert len(function.calls) == 4
+
+    def test_other_errors_are_not_retried(self, no_wait_retry):
+        function = flaky(1, error=ValueError)
+        with pytest.raises(ValueError):
+            resilient_call(function, no_wait_retry)
+        assert len(function.calls) == 1
+
+    def test_token_bucket_throttles_bursts(self, clock):
+        bucket = TokenBucket(
+            rate=2.0, capacity=2, clock=clock, sleep=clock.sleep
+        )
+        waits = [bucket.acquire() for _ in range(4)]
+        assert waits == [0.0, 0.0, 0.5, 0.5]
+        clock.now += 10  # The bucket refills up to its capacity only.
+        assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.5]
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0, capacity=1)
+
+    def test_throttle_waits_are_counted(self, clock, no_wait_retry):
+        bucket = TokenBucket(
+            rate=1.0, capacity=1, clock=clock, sleep=clock.sleep
+        )
+        metrics = ResilienceMetrics()
+        for _ in range(3):
+            resilient_call(
+                lambda: "ok", no_wait_retry, bucket, metrics=metrics
+            )
+        snapshot = metrics.snapshot()
+        assert snapshot["calls"] == 3
+        assert snapshot["throttle_waits"] == 2
+        assert snapshot["throttle_wait_seconds"] == pytest.approx(2.0)
+
+    def test_circuit_breaker_fails_fast_then_recovers(self, clock):
+        breaker = CircuitBreaker(
+            failure_threshold=2, reset_timeout=10, clock=clock
+        )
+        retry = RetryPolicy(max_attempts=1)
+        metrics = ResilienceMetrics()
+        failing = flaky(100)
+
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                resilient_call(failing, retry, circuit_breaker=breaker)
+        assert breaker.state == CircuitBreaker.OPEN
+
+        with pytest.raises(CircuitOpenError):
+            resilient_call(failing, retry, None, breaker, metrics)
+        assert len(failing.calls) == 2
+        assert metrics.snapshot()["short_circuits"] == 1
+
+        # After the reset timeout, a failing trial call re-opens it...
+        clock.now += 10
+        with pytest.raises(requests.exceptions.ConnectionError):
+            resilient_call(failing, retry, circuit_breaker=breaker)
+        assert breaker.state == CircuitBreaker.OPEN
+
+        # ...and a successful one closes it.
+        clock.now += 10
+        assert resilient_call(lambda: "ok", retry, None, breaker) == "ok"
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestResilientSDSSConnector:
+    """Tests for the resilience of the SDSS connector."""
+
+    @pytest.fixture(autouse=True)
+    def policies(self, monkeypatch, clock, no_wait_retry):
+        """Gives the SDSS connector fresh policies that never really wait."""
+        monkeypatch.setattr(SDSSConnector, "retry_policy", no_wait_retry)
+        monkeypatch.setattr(
+            SDSSConnector,
+            "rate_limiter",
+            TokenBucket(rate=1.0, capacity=1, clock=clock, sleep=clock.sleep),
+        )
+        monkeypatch.setattr(
+            SDSSConnector, "circuit_breaker", CircuitBreaker(clock=clock)
+        )
+        monkeypatch.setattr(SDSSConnector, "metrics", ResilienceMetrics())
+
+    def test_transient_sdss_errors_are_retried(self, monkeypatch):
+        errors = [http_error(503), requests.exceptions.Timeout()]
+
+        def query_sql(query):
+            if errors:
+                raise errors.pop()
+            return success_results
+
+        monkeypatch.setattr(SDSS, "query_sql", query_sql)
+        query_handler = QueryHandler(dataset_name="SDSS")
+        query_id = query_handler.run_query("SELECT TOP 1 z FROM SpecObj")
+
+        assert query_handler.get_results(query_id, timeout=5)
+        snapshot = SDSSConnector.metrics.snapshot()
+        assert snapshot["retries"] == 2
+        # The second backoff (1 s) refilled the bucket, the first (0.5 s)
+        # did not.
+        assert snapshot["throttle_waits"] == 1
+
+    def test_circuit_opens_while_sdss_is_down(self, monkeypatch):
+        calls = []
+
+        def query_sql(query):
+            calls.append(query)
+            raise http_error(502)
+
+        monkeypatch.setattr(SDSS, "query_sql", query_sql)
+        for _ in range(2):
+            with pytest.raises(Exception):
+                SDSSConnector().run_query("SELECT 1")
+
+        # Five failures opened the circuit: the second call fails fast.
+        assert len(calls) == 5
+        assert SDSSConnector.circuit_breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            SDSSConnector().run_query("SELECT 1")
+        assert len(calls) == 5
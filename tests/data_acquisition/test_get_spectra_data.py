@@ -1,9 +1,17 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch
 
 import pytest
 import requests
+import requests_mock
+from astropy.io import fits
 
-from astrolibrary import get_spectra_data
+from astrolibrary import get_spectra_data, get_spectra_data_bulk
+from astrolibrary.data_acquisition import spectra_data_retrieval
+from astrolibrary.data_acquisition._single_flight import SingleFlight
 
 
 def test_invalid_id_types():
@@ -88,7 +96,8 @@ def test_invalid_none_parameters():
 @patch("requests.get")
 def test_successful_api_call(mock_get):
     mock_get.return_value.status_code = 200
-    mock_get.return_value.content = b"some data"
+    mock_get.return_value.headers = {}
+    mock_get.return_value.iter_content.return_value = [fits_bytes()]
     file_path = get_spectra_data(**sample_valid_args)
     assert file_path.endswith(".fits")
 
@@ -97,3 +106,209 @@ def test_successful_api_call(mock_get):
 def test_timeout_exception(mock_get):
     with pytest.raises(RuntimeError):
         get_spectra_data(**sample_valid_args)
+
+
+def fits_bytes():
+    """Returns the content of a small, valid FITS file."""
+    table = fits.BinTableHDU.from_columns(
+        [fits.Column(name="flux", format="E", array=[1.0, 2.0])]
+    )
+    buffer = io.BytesIO()
+    fits.HDUList([fits.PrimaryHDU(), table]).writeto(buffer)
+    return buffer.getvalue()
+
+
+bulk_args = {"survey": "eboss", "run2d": "v5_13_2", "dr_number": 17}
+dr17_url = (
+    "http://dr17.sdss.org/sas/dr17/eboss/spectro/redux/v5_13_2/spectra/lite/"
+    "7644/spec-7644-57327-{:04d}.fits"
+)
+
+
+def test_bulk_download_manifest(tmp_path):
+    content = fits_bytes()
+    with requests_mock.Mocker() as mock:
+        mock.get(dr17_url.format(528), content=content)
+        mock.get(dr17_url.format(529), content=content)
+        mock.get(dr17_url.format(530), status_code=404)
+        manifest = get_spectra_data_bulk(
+            [(7644, 57327, 528), (7644, 57327, 529), (7644, 57327, 530)],
+            output_dir=str(tmp_path),
+            max_workers=2,
+            **bulk_args,
+        )
+
+    assert [entry["fiberid"] for entry in manifest] == [528, 529, 530]
+    assert [entry["status"] for entry in manifest] == [
+        "downloaded",
+        "downloaded",
+        "error",
+    ]
+    assert manifest[0]["path"] == str(tmp_path / "spec-7644-57327-0528.fits")
+    assert manifest[0]["bytes"] == len(content)
+    assert manifest[0]["seconds"] >= 0
+    assert manifest[2]["path"] is None
+    assert "404" in manifest[2]["error"]
+
+
+def test_bulk_download_skips_complete_files(tmp_path):
+    content = fits_bytes()
+    (tmp_path / "spec-7644-57327-0528.fits").write_bytes(content)
+    # A truncated file is downloaded again.
+    truncated = content[: len(content) // 2]
+    (tmp_path / "spec-7644-57327-0529.fits").write_bytes(truncated)
+
+    with requests_mock.Mocker() as mock:
+        mock.get(dr17_url.format(529), content=content)
+        manifest = get_spectra_data_bulk(
+            [(7644, 57327, 528), (7644, 57327, 529)],
+            output_dir=str(tmp_path),
+            **bulk_args,
+        )
+        assert mock.call_count == 1
+
+    assert [entry["status"] for entry in manifest] == ["skipped", "downloaded"]
+    assert (tmp_path / "spec-7644-57327-0529.fits").read_bytes() == content
+
+
+def test_bulk_download_replaces_files_with_broken_headers(tmp_path):
+    content = fits_bytes()
+    # The table header lacks NAXIS1, so its data size is unknown.
+    broken = content.replace(b"NAXIS1  = ", b"COMMENT   ", 1)
+    assert broken != content
+    (tmp_path / "spec-7644-57327-0528.fits").write_bytes(broken)
+
+    with requests_mock.Mocker() as mock:
+        mock.get(dr17_url.format(528), content=content)
+        manifest = get_spectra_data_bulk(
+            [(7644, 57327, 528)], output_dir=str(tmp_path), **bulk_args
+        )
+
+    assert manifest[0]["status"] == "downloaded"
+    assert (tmp_path / "spec-7644-57327-0528.fits").read_bytes() == content
+
+
+def test_bulk_download_collects_invalid_identifiers(tmp_path):
+    manifest = get_spectra_data_bulk(
+        [(-1, 57327, 528), ("abc", 1, 2), (1, 2)],
+        output_dir=str(tmp_path),
+        **bulk_args,
+    )
+    assert all(entry["status"] == "error" for entry in manifest)
+    assert all(entry["error"] for entry in manifest)
+
+
+def test_bulk_download_invalid_max_workers():
+    with pytest.raises(ValueError):
+        get_spectra_data_bulk([(7644, 57327, 528)], max_workers=0, **bulk_args)
+
+
+dr17_args = {**bulk_args, "plateid": 7644, "mjd": 57327, "fiberid": 528}
+
+
+def test_download_is_published_atomically(tmp_path):
+    content = fits_bytes()
+    with requests_mock.Mocker() as mock:
+        mock.get(dr17_url.format(528), content=content[:-2880])
+        with pytest.raises(RuntimeError):
+            get_spectra_data(output_dir=str(tmp_path), **dr17_args)
+
+    # The truncated body never reaches the final path.
+    assert not (tmp_path / "spec-7644-57327-0528.fits").exists()
+
+
+def test_download_checks_content_length(tmp_path):
+    content = fits_bytes()
+    with requests_mock.Mocker() as mock:
+        mock.get(
+            dr17_url.format(528),
+            content=content,
+            headers={"Content-Length": str(len(content) + 1)},
+        )
+        with pytest.raises(RuntimeError):
+            get_spectra_data(output_dir=str(tmp_path), **dr17_args)
+
+    assert not (tmp_path / "spec-7644-57327-0528.fits").exists()
+
+
+def test_download_resumes_with_range_request(tmp_path):
+    content = fits_bytes()
+    half = len(content) // 2
+    (tmp_path / "spec-7644-57327-0528.fits.part").write_bytes(content[:half])
+
+    def partial_content(request, context):
+        assert request.headers["Range"] == f"bytes={half}-"
+        context.status_code = 206
+        end = len(content) - 1
+        context.headers["Content-Range"] = f"bytes {half}-{end}/{len(content)}"
+        return content[half:]
+
+    with requests_mock.Mocker() as mock:
+        mock.get(dr17_url.format(528), content=partial_content)
+        file_path = get_spectra_data(output_dir=str(tmp_path), **dr17_args)
+
+    with open(file_path, "rb") as file:
+        assert file.read() == content
+    assert not (tmp_path / "spec-7644-57327-0528.fits.part").exists()
+
+
+def test_download_restarts_when_range_is_ignored(tmp_path):
+    content = fits_bytes()
+    (tmp_path / "spec-7644-57327-0528.fits.part").write_bytes(b"stale")
+
+    with requests_mock.Mocker() as mock:
+        mock.get(dr17_url.format(528), content=content)
+        file_path = get_spectra_data(output_dir=str(tmp_path), **dr17_args)
+
+    with open(file_path, "rb") as file:
+        assert file.read() == content
+
+
+def test_download_restarts_when_range_is_not_satisfiable(tmp_path):
+    content = fits_bytes()
+    (tmp_path / "spec-7644-57327-0528.fits.part").write_bytes(content + b"x")
+
+    with requests_mock.Mocker() as mock:
+        mock.get(
+            dr17_url.format(528),
+            [{"status_code": 416}, {"content": content}],
+        )
+        file_path = get_spectra_data(output_dir=str(tmp_path), **dr17_args)
+        assert "Range" not in mock.last_request.headers
+
+    with open(file_path, "rb") as file:
+        assert file.read() == content
+
+
+def test_concurrent_identical_downloads_share_one_request(
+    tmp_path, monkeypatch
+):
+    flights = SingleFlight()
+    monkeypatch.setattr(spectra_data_retrieval, "_DOWNLOAD_FLIGHTS", flights)
+    content = fits_bytes()
+    release = threading.Event()
+
+    def slow_content(request, context):
+        release.wait(timeout=5)
+        return content
+
+    with requests_mock.Mocker() as mock:
+        mock.get(dr17_url.format(528), content=slow_content)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [
+                executor.submit(
+                    get_spectra_data, output_dir=str(tmp_path), **dr17_args
+                )
+                for _ in range(3)
+            ]
+            deadline = time.monotonic() + 5
+            while flights.stats()["shared"] < 2:
+                assert time.monotonic() < deadline
+                time.sleep(0.001)
+            release.set()
+            paths = {future.result() for future in futures}
+        assert mock.call_count == 1
+
+    assert len(paths) == 1
+    with open(paths.pop(), "rb") as file:
+        assert file.read() == content
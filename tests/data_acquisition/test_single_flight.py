@@ -0,0 +1,69 @@
+"""
+This test suite (a module) runs tests for data_acquisition/_single_flight.py
+module.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from astrolibrary.data_acquisition._single_flight import SingleFlight
+
+
+def wait_for_shared(flights, shared, timeout=5):
+    """Waits until `shared` callers joined an in-flight call."""
+    deadline = time.monotonic() + timeout
+    while flights.stats()["shared"] < shared:
+        assert time.monotonic() < deadline, "callers never joined the flight"
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_result():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def function():
+        calls.append(1)
+        release.wait(timeout=5)
+        return object()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(flights.do, "key", function) for _ in range(4)
+        ]
+        wait_for_shared(flights, 3)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flights.stats() == {"calls": 4, "shared": 3}
+
+
+def test_concurrent_calls_share_one_exception():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def function():
+        release.wait(timeout=5)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [
+            executor.submit(flights.do, "key", function) for _ in range(3)
+        ]
+        wait_for_shared(flights, 2)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError, match="boom"):
+                future.result()
+
+
+def test_different_keys_and_sequential_calls_are_not_shared():
+    flights = SingleFlight()
+    assert flights.do("a", lambda: 1) == 1
+    assert flights.do("a", lambda: 2) == 2
+    assert flights.do("b", lambda: 3) == 3
+    assert flights.stats() == {"calls": 3, "shared": 0}
@@ -0,0 +1,197 @@
+"""
+This test suite (a module) runs tests for data_processing/continuum.py module.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.ndimage import median_filter, uniform_filter1d
+
+from astrolibrary import DataPreprocessing, MachineLearning, SpectrumBatch
+from astrolibrary.data_processing import continuum
+
+N_PIXELS = 2000
+loglam = 3.5523 + 1e-4 * np.arange(N_PIXELS)
+wavelength = 10**loglam
+true_continuum = 10 + 3 * np.sin(loglam * 20)
+
+
+@pytest.fixture
+def spectra():
+    """Noisy spectra on a smooth continuum, with an emission line."""
+    rng = np.random.default_rng(0)
+    flux = true_continuum + rng.normal(scale=0.2, size=(50, N_PIXELS))
+    flux[:, 800:806] += 40
+    return flux
+
+
+def test_running_median_matches_scipy(spectra):
+    np.testing.assert_allclose(
+        continuum.running_median(spectra, 51),
+        median_filter(spectra, size=(1, 51)),
+    )
+    np.testing.assert_allclose(
+        continuum.running_median(spectra[0], 51),
+        median_filter(spectra[0], size=51),
+    )
+
+
+def test_running_median_fills_masked_pixels():
+    flux = np.arange(10.0)
+    mask = np.ones(10, dtype=bool)
+    mask[4:6] = False
+    flux[4:6] = 1e9
+    np.testing.assert_allclose(
+        continuum.running_median(flux, 3, mask=mask)[1:-1], np.arange(1.0, 9)
+    )
+    assert np.isnan(continuum.running_median([[np.nan, np.nan]], 3)).all()
+    with pytest.raises(ValueError, match="window"):
+        continuum.running_median(flux, 0)
+
+
+def test_clipped_smooth_rejects_lines(spectra):
+    boxcar = uniform_filter1d(spectra, size=101, axis=1)
+    clipped, keep = continuum.clipped_smooth(spectra, 101, method="boxcar")
+    line = slice(795, 811)
+    assert not keep[:, 800:806].any()
+    assert np.abs(boxcar[:, line] - true_continuum[line]).max() > 1
+    assert np.abs(clipped[:, line] - true_continuum[line]).max() < 0.2
+
+    unclipped, _ = continuum.clipped_smooth(
+        spectra, 101, method="boxcar", iterations=0
+    )
+    np.testing.assert_allclose(unclipped, boxcar)
+    with pytest.raises(ValueError, match="Unknown method"):
+        continuum.clipped_smooth(spectra, 101, method="mean")
+
+
+@pytest.mark.parametrize("method", continuum.METHODS)
+def test_fit_continuum(spectra, method):
+    fitted, normalized = continuum.fit_continuum(spectra, wavelength, method)
+    inner = slice(100, N_PIXELS - 100)
+    assert np.abs(fitted[:, inner] - true_continuum[inner]).max() < 0.3
+    np.testing.assert_allclose(normalized, spectra / fitted)
+
+    single, _ = continuum.fit_continuum(spectra[0], wavelength, method)
+    np.testing.assert_allclose(single, fitted[0])
+
+
+def test_fit_continuum_keeps_float32(spectra):
+    fitted, normalized = continuum.fit_continuum(spectra.astype(np.float32))
+    assert fitted.dtype == normalized.dtype == np.float32
+    reference, _ = continuum.fit_continuum(spectra)
+    np.testing.assert_allclose(fitted, reference, rtol=1e-6)
+    with pytest.raises(ValueError, match="Unknown method"):
+        continuum.fit_continuum(spectra, method="polynomial")
+
+
+def test_spline_weights_and_masks(spectra):
+    ivar = np.full(spectra.shape, 25.0)
+    ivar[:, 1000:1100] = 0
+    spectra = spectra.copy()
+    spectra[:, 1000:1100] = np.nan
+    fitted, keep = continuum.spline_continuum(spectra, wavelength, ivar=ivar)
+    assert not keep[:, 1000:1100].any()
+    # Smooth across the masked gap.
+    np.testing.assert_allclose(
+        fitted[:, 1000:1100],
+        np.broadcast_to(true_continuum[1000:1100], (50, 100)),
+        atol=0.3,
+    )
+
+    # Pixel indices give the same knots on a log-lambda grid, up to the
+    # slight curvature of 10 ** loglam.
+    by_pixel, _ = continuum.spline_continuum(spectra, ivar=ivar)
+    np.testing.assert_allclose(by_pixel, fitted, atol=0.05)
+
+
+def test_spline_edges_and_empty_spectra(spectra):
+    spectra = spectra[:3].copy()
+    spectra[0, :300] = np.nan
+    spectra[0, -300:] = np.nan
+    spectra[1] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        fitted, keep = continuum.spline_continuum(spectra, wavelength)
+        smoothed, _ = continuum.clipped_smooth(spectra, 101, method="boxcar")
+
+    # Held at the first and last valid pixels, not extrapolated.
+    first, last = 300, N_PIXELS - 301
+    assert (fitted[0, :first] == fitted[0, first]).all()
+    assert (fitted[0, last:] == fitted[0, last]).all()
+    inner = slice(first, last + 1)
+    assert np.abs(fitted[0, inner] - true_continuum[inner]).max() < 0.3
+    assert np.isnan(fitted[1]).all() and not keep[1].any()
+    assert np.isnan(smoothed[1]).all()
+    np.testing.assert_allclose(
+        fitted[2], continuum.spline_continuum(spectra[2], wavelength)[0]
+    )
+
+
+def test_spline_basis_is_cached(spectra):
+    continuum.spline_continuum(spectra, wavelength, n_knots=25, iterations=0)
+    basis = continuum._spline_basis(
+        continuum._check_grid(wavelength, "wavelength"), 25, 3
+    )
+    assert basis.basis.shape == (N_PIXELS, 29)
+    assert basis is continuum._spline_basis(
+        continuum._check_grid(wavelength, "wavelength"), 25, 3
+    )
+
+
+def test_data_preprocessing_normalize_continuum(spectra):
+    data_processor = DataPreprocessing.__new__(DataPreprocessing)
+    data_processor.dtype = None
+    data_processor.df = pd.DataFrame(
+        {
+            "Wavelength": wavelength,
+            "Flux": spectra[0].astype(np.float32),
+            "IVAR": np.ones(N_PIXELS),
+        }
+    )
+    data_processor.normalize_continuum(method="spline", ivar_column="IVAR")
+    fitted, normalized = continuum.fit_continuum(
+        spectra[0].astype(np.float32),
+        wavelength,
+        method="spline",
+        ivar=np.ones(N_PIXELS),
+    )
+    np.testing.assert_array_equal(data_processor.df["Flux_continuum"], fitted)
+    np.testing.assert_array_equal(
+        data_processor.df["Flux_normalized"], normalized
+    )
+    with pytest.raises(ValueError):
+        data_processor.normalize_continuum(flux_column="Nonexistent")
+
+
+def test_batch_normalize_continuum_and_features(spectra):
+    batch = SpectrumBatch(
+        {"Wavelength": np.tile(wavelength, (50, 1)), "Flux": spectra},
+        3000,
+        10000,
+    )
+    batch.normalize_continuum(method="spline")
+    fitted, normalized = continuum.fit_continuum(
+        spectra, wavelength, method="spline"
+    )
+    np.testing.assert_allclose(batch.columns["Flux_continuum"], fitted)
+    np.testing.assert_allclose(MachineLearning.features(batch), normalized)
+
+    ragged = SpectrumBatch.from_spectra(
+        [
+            {"Wavelength": wavelength[:length], "Flux": flux[:length]}
+            for flux, length in [(spectra[0], N_PIXELS), (spectra[1], 1500)]
+        ],
+        3000,
+        10000,
+    )
+    ragged.normalize_continuum(method="median")
+    np.testing.assert_allclose(
+        ragged.columns["Flux_continuum"][1, 100:1400],
+        true_continuum[100:1400],
+        atol=0.2,
+    )
+    features = MachineLearning.features(ragged)
+    assert features.shape == (2, N_PIXELS)
+    assert (features[1, 1500:] == 1).all()
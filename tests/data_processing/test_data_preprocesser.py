@@ -1,8 +1,13 @@
+import os
 import pytest
 import pandas as pd
 import numpy as np
 from unittest.mock import patch
-from astrolibrary import DataPreprocessing
+from astropy.io import fits
+
+from astrolibrary import DataPreprocessing, SpectrumBatch
+from astrolibrary.data_processing import _csv_reader as csv_reader, resampling
+from astrolibrary.data_processing.data_preprocessing import _native_byte_order
 
 data = {
     "Column1": [1, 2, 3, 10, 15, 20, 1000],
@@ -241,3 +246,476 @@ def test_correct_redshift_with_flux_column(sample_data_wave_align):
 
     corrected_column_name = "LOGLAM_corrected"
     assert corrected_column_name in data_processor.df.columns
+
+
+@pytest.fixture
+def ragged_batch():
+    spectra = [
+        {
+            "Wavelength": [100.0, 200, 300, 400, 500],
+            "Flux": [1.0, 2, 3, 4, 50],
+        },
+        pd.DataFrame({"Wavelength": [150.0, 250, 350], "Flux": [3.0, 1, 2]}),
+    ]
+    return SpectrumBatch.from_spectra(spectra, 200, 400, redshift=[0.0, 1.0])
+
+
+def test_batch_from_ragged_spectra(ragged_batch):
+    assert ragged_batch.columns["Flux"].shape == (2, 5)
+    assert list(ragged_batch.lengths) == [5, 3]
+    assert list(ragged_batch.redshift) == [0.0, 1.0]
+    pd.testing.assert_frame_equal(
+        ragged_batch.spectrum(1),
+        pd.DataFrame({"Wavelength": [150.0, 250, 350], "Flux": [3.0, 1, 2]}),
+    )
+
+
+def test_batch_operations_match_single_spectrum_ones(ragged_batch):
+    ragged_batch.normalize_column("Flux")
+    for index, flux in enumerate([[1.0, 2, 3, 4, 50], [3.0, 1, 2]]):
+        expected = (np.array(flux) - np.mean(flux)) / np.std(flux)
+        np.testing.assert_allclose(
+            ragged_batch.spectrum(index)["Flux"], expected
+        )
+
+    lower, upper = ragged_batch.remove_outliers_column("Wavelength")
+    assert lower[0] == 200 - 1.5 * 200
+    assert upper[1] == 300 + 1.5 * 100
+    assert list(ragged_batch.lengths) == [5, 3]
+
+
+def test_batch_outliers_are_masked_per_spectrum():
+    batch = SpectrumBatch.from_spectra(
+        [{"Column1": data["Column1"]}, {"Column1": [1000, 1001, 1002]}], 0, 1
+    )
+    batch.remove_outliers_column("Column1")
+    assert 1000 not in batch.spectrum(0)["Column1"].values
+    assert list(batch.spectrum(1)["Column1"]) == [1000, 1001, 1002]
+
+
+def test_batch_correct_redshift_per_spectrum(ragged_batch):
+    ragged_batch.correct_redshift("Wavelength", "Flux")
+    np.testing.assert_allclose(
+        ragged_batch.spectrum(1)["Flux_corrected"],
+        np.array([3.0, 1, 2]) / (np.array([150.0, 250, 350]) * 2),
+    )
+    with pytest.raises(ValueError):
+        ragged_batch.correct_redshift("Wavelength", "NonexistentColumn")
+
+
+def test_batch_wave_align_and_compact(ragged_batch):
+    ragged_batch.wave_align("Wavelength", "LOGLAM")
+    assert list(ragged_batch.lengths) == [3, 2]
+
+    ragged_batch.compact()
+    assert ragged_batch.columns["Wavelength"].shape == (2, 3)
+    assert list(ragged_batch.spectrum(0)["Wavelength"]) == [200, 300, 400]
+    assert list(ragged_batch.spectrum(1)["Wavelength"]) == [250, 350]
+
+
+def test_batch_from_files():
+    with pytest.raises(ValueError):  # No column in common.
+        SpectrumBatch.from_files(
+            ["mock_data_wave_align.csv", "mock_data.csv"], 200, 500
+        )
+    batch = SpectrumBatch.from_files(
+        ["mock_data_wave_align.csv"] * 2, 200, 500
+    )
+    batch.wave_align()
+    single = DataPreprocessing("mock_data_wave_align.csv", 200, 500)
+    single.wave_align()
+    assert list(batch.lengths) == [len(single.df)] * 2
+    np.testing.assert_allclose(
+        batch.spectrum(1)["Wavelength"], single.df["Wavelength"]
+    )
+
+
+def test_batch_invalid_shapes():
+    with pytest.raises(ValueError):
+        SpectrumBatch({"Flux": np.zeros(3)}, 0, 1)
+    with pytest.raises(ValueError):
+        SpectrumBatch({"Flux": np.zeros((2, 3))}, 0, 1, mask=np.ones((2, 2)))
+    with pytest.raises(ValueError):
+        SpectrumBatch({"Flux": np.zeros((2, 3))}, 0, 1, redshift=[0, 1, 2])
+
+
+N_PIXELS = 100_000
+
+
+@pytest.fixture
+def spectrum_file(tmp_path):
+    """Writes a big-endian FITS table, as SDSS spectra files."""
+    n_pixels = N_PIXELS
+    table = fits.BinTableHDU.from_columns(
+        [
+            fits.Column(name=name, format="E", array=values)
+            for name, values in {
+                "loglam": np.linspace(3.6, 4.0, n_pixels),
+                "flux": np.arange(n_pixels),
+                "ivar": np.ones(n_pixels),
+                "sky": np.zeros(n_pixels),
+            }.items()
+        ]
+    )
+    path = str(tmp_path / "spec.fits")
+    fits.HDUList([fits.PrimaryHDU(), table]).writeto(path)
+    return path
+
+
+def test_read_data_fits_column_projection(spectrum_file):
+    data_processor = DataPreprocessing(
+        spectrum_file, 4000, 9000, columns=["loglam", "flux"]
+    )
+    assert list(data_processor.df.columns) == ["loglam", "flux"]
+    assert data_processor.df["flux"].dtype.isnative
+    np.testing.assert_array_equal(
+        data_processor.df["flux"], np.arange(N_PIXELS)
+    )
+
+    stats = data_processor.load_stats
+    assert stats["columns"] == ["loglam", "flux"]
+    assert stats["bytes_read"] == 2 * 4 * N_PIXELS
+    assert stats["bytes_total"] == 4 * 4 * N_PIXELS
+
+
+def test_read_data_fits_all_columns_and_memory(spectrum_file):
+    data_processor = DataPreprocessing(spectrum_file, 4000, 9000)
+    data_processor.read_data(spectrum_file, track_memory=True)
+    assert list(data_processor.df.columns) == ["loglam", "flux", "ivar", "sky"]
+    assert data_processor.load_stats["bytes_read"] == 4 * 4 * N_PIXELS
+    # The columns are views of the mapped file, not copies.
+    assert data_processor.load_stats["peak_memory"] < 4 * N_PIXELS
+    assert not data_processor.df["flux"].to_numpy().flags.owndata
+
+    # The file itself is left untouched by the in-place byte swaps.
+    with fits.open(spectrum_file) as hdul:
+        np.testing.assert_array_equal(
+            hdul[1].data["flux"], np.arange(N_PIXELS)
+        )
+
+
+def test_read_data_fits_missing_columns(spectrum_file):
+    with pytest.raises(ValueError):
+        DataPreprocessing(spectrum_file, 4000, 9000, columns=["Flux"])
+
+
+def test_read_data_csv_column_projection():
+    data_processor = DataPreprocessing(
+        "mock_data.csv", 100, 700, columns=["Column2"]
+    )
+    assert list(data_processor.df.columns) == ["Column2"]
+
+
+def test_native_byte_order():
+    big_endian = np.arange(4, dtype=">f8")
+    native = _native_byte_order(big_endian.copy())
+    assert native.dtype.isnative
+    np.testing.assert_array_equal(native, np.arange(4))
+
+    read_only = big_endian.copy()
+    read_only.flags.writeable = False
+    np.testing.assert_array_equal(_native_byte_order(read_only), np.arange(4))
+    np.testing.assert_array_equal(read_only, np.arange(4))
+
+
+def test_interpolate_onto_a_grid(spectrum_file):
+    data_processor = DataPreprocessing(
+        spectrum_file, 4000, 9000, columns=["loglam", "flux", "ivar"]
+    )
+    # Around 4500 Angstroms.
+    data_processor.df.loc[13290:13310, "ivar"] = 0
+    data_processor.df.loc[13290:13310, "flux"] = 1e9
+    grid = np.linspace(4000, 9000, 500)
+    data_processor.interpolate(
+        grid, loglam_column="loglam", ivar_column="ivar"
+    )
+
+    assert list(data_processor.df.columns) == ["Wavelength", "loglam", "flux"]
+    loglam = np.linspace(3.6, 4.0, N_PIXELS, dtype=np.float32)
+    np.testing.assert_allclose(
+        data_processor.df["flux"],
+        np.interp(grid, 10 ** loglam.astype(np.float64), np.arange(N_PIXELS)),
+    )
+
+    with pytest.raises(ValueError):
+        data_processor.interpolate(grid, columns=["Flux"])
+
+
+def test_batch_resample_shares_one_operator():
+    # Spectra on the same log-lambda lattice, starting at different pixels.
+    loglam = np.arange(3.6, 3.7, 1e-4)
+    spectra = [
+        {
+            "LOGLAM": loglam[i : len(loglam) - 2 * i],
+            "Flux": np.sin(loglam[i : len(loglam) - 2 * i] * 1000),
+        }
+        for i in range(3)
+    ]
+    batch = SpectrumBatch.from_spectra(spectra, 4000, 5000)
+    batch.mask[0, 50] = False
+    grid = np.linspace(4000, 5000, 200)
+
+    resampling.clear_operator_cache()
+    batch.resample(grid)
+    assert resampling.operator_cache_info()["misses"] == 1
+    assert batch.columns["Flux"].shape == (3, 200)
+    assert list(batch.columns) == ["Wavelength", "LOGLAM", "Flux"]
+    for index, spectrum in enumerate(spectra):
+        wavelengths = 10 ** spectrum["LOGLAM"]
+        inside = (grid >= wavelengths[0]) & (grid <= wavelengths[-1])
+        np.testing.assert_array_equal(batch.mask[index], inside)
+        np.testing.assert_allclose(
+            batch.spectrum(index)["Flux"],
+            np.interp(grid[inside], wavelengths, spectrum["Flux"]),
+        )
+
+
+@pytest.mark.parametrize(
+    "wavelengths",
+    [
+        # The same step, with offsets that are not a whole number of steps.
+        [np.arange(4000.0, 4100, 1), np.arange(4000.3, 4100, 1)],
+        # Nested grids: every other pixel of the first one.
+        [np.arange(4000.0, 4100, 1), np.arange(4000.0, 4100, 2)],
+    ],
+)
+def test_batch_resample_unrelated_grids(wavelengths):
+    rng = np.random.default_rng(0)
+    spectra = [
+        {"Wavelength": wavelength, "Flux": rng.normal(size=len(wavelength))}
+        for wavelength in wavelengths
+    ]
+    batch = SpectrumBatch.from_spectra(spectra, 4000, 4100)
+    grid = np.linspace(4010, 4090, 33)
+    batch.resample(grid, method="flux_conserving")
+    for index, spectrum in enumerate(spectra):
+        np.testing.assert_allclose(
+            batch.columns["Flux"][index],
+            resampling.resample(
+                spectrum["Wavelength"],
+                spectrum["Flux"],
+                grid,
+                method="flux_conserving",
+            ),
+        )
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "spec-7644-57327-0528.csv"
+    pd.DataFrame(
+        {
+            "Wavelength": [3610.772, 3611.602, 3612.435],
+            "Flux": [1.161, -1.535, -2.473],
+            "SkyFlux": [5.222, 5.611, 6.212],
+        }
+    ).to_csv(path, index=False)
+    return str(path)
+
+
+def test_read_data_csv_sidecar(csv_file):
+    sidecar = csv_reader.sidecar_path(csv_file)
+    assert sidecar.endswith(".spec-7644-57327-0528.csv.npz")
+    # The sidecar is opt-in.
+    DataPreprocessing(csv_file, 100, 700)
+    assert not os.path.exists(sidecar)
+
+    parsed, _ = csv_reader.read_csv(csv_file, ["Flux"], cache=True)
+    assert os.path.exists(sidecar)
+    with patch("pandas.read_csv") as mock_read_csv:
+        cached, bytes_read = csv_reader.read_csv(
+            csv_file, ["Flux"], cache=True
+        )
+        mock_read_csv.assert_not_called()
+    pd.testing.assert_frame_equal(cached, parsed)
+    assert bytes_read == 3 * 8
+
+    # Columns read later are parsed once, then cached too.
+    full, _ = csv_reader.read_csv(csv_file, cache=True)
+    assert list(full.columns) == ["Wavelength", "Flux", "SkyFlux"]
+    data_processor = DataPreprocessing(csv_file, 100, 700, columns=["Flux"])
+    with patch("pandas.read_csv") as mock_read_csv:
+        data_processor.read_data(csv_file, cache=True)
+        mock_read_csv.assert_not_called()
+    pd.testing.assert_frame_equal(data_processor.df, full)
+
+
+def test_read_data_csv_sidecar_invalidated(csv_file):
+    csv_reader.read_csv(csv_file, cache=True)
+    pd.DataFrame({"Wavelength": [1.0], "Flux": [2.0]}).to_csv(
+        csv_file, index=False
+    )
+    df, _ = csv_reader.read_csv(csv_file, cache=True)
+    assert list(df.columns) == ["Wavelength", "Flux"]
+    assert df["Flux"].tolist() == [2.0]
+
+
+def test_read_data_csv_typed(csv_file):
+    df = DataPreprocessing(csv_file, 100, 700).df
+    for cache in (True, False, True):
+        data_processor = DataPreprocessing(csv_file, 100, 700)
+        data_processor.read_data(
+            csv_file,
+            columns=["Flux", "Wavelength"],
+            csv_dtype={"Flux": np.float32},
+            engine="c",
+            cache=cache,
+        )
+        assert list(data_processor.df.columns) == ["Wavelength", "Flux"]
+        assert data_processor.df["Flux"].dtype == np.float32
+        np.testing.assert_array_equal(
+            data_processor.df["Flux"], df["Flux"].astype(np.float32)
+        )
+
+
+def test_read_csv_defaults_to_the_c_engine(csv_file):
+    with patch("pandas.read_csv", wraps=pd.read_csv) as read_csv:
+        _, bytes_read = csv_reader.read_csv(csv_file)
+    assert read_csv.call_args.kwargs["engine"] == "c"
+    assert bytes_read == os.path.getsize(csv_file)
+
+
+def test_read_data_csv_pyarrow(csv_file):
+    pytest.importorskip("pyarrow")
+    data_processor = DataPreprocessing(csv_file, 100, 700)
+    data_processor.read_data(csv_file, engine="pyarrow", cache=False)
+    assert data_processor.df["Flux"].tolist() == [1.161, -1.535, -2.473]
+
+
+def test_read_data_csv_errors(csv_file, tmp_path):
+    with pytest.raises(ValueError, match="does not exist; relative paths"):
+        DataPreprocessing(str(tmp_path / "missing.csv"), 100, 700)
+    with pytest.raises(ValueError, match="Cannot read the CSV file"):
+        DataPreprocessing(csv_file, 100, 700, columns=["FLUX"])
+    # Also once the columns come from the sidecar.
+    csv_reader.read_csv(csv_file, cache=True)
+    with pytest.raises(ValueError, match=r"\['FLUX'\] do not exist"):
+        csv_reader.read_csv(csv_file, ["FLUX"], cache=True)
+
+
+@pytest.fixture
+def sdss_like_file(tmp_path):
+    """A float32 spectrum on SDSS's log-lambda grid, as on disk."""
+    n_pixels = 4000
+    loglam = 3.5523 + 1e-4 * np.arange(n_pixels)
+    rng = np.random.default_rng(1)
+    flux = 20 + 5 * np.sin(loglam * 300) + rng.normal(size=n_pixels)
+    table = fits.BinTableHDU.from_columns(
+        [
+            fits.Column(name="LOGLAM", format="E", array=loglam),
+            fits.Column(name="flux", format="E", array=flux),
+            fits.Column(name="ivar", format="E", array=np.ones(n_pixels)),
+        ]
+    )
+    path = str(tmp_path / "spec-float32.fits")
+    fits.HDUList([fits.PrimaryHDU(), table]).writeto(path)
+    return path
+
+
+def preprocess(data_processor):
+    data_processor.wave_align("Wavelength", "LOGLAM")
+    data_processor.correct_redshift("Wavelength", "flux")
+    data_processor.normalize_column("flux")
+    data_processor.to_rest_frame("Wavelength", "flux", "ivar")
+    return data_processor.df
+
+
+def test_float32_policy_drift(sdss_like_file):
+    reference = preprocess(
+        DataPreprocessing(sdss_like_file, 4000, 9000, 0.1, dtype="float64")
+    )
+    compact = preprocess(
+        DataPreprocessing(sdss_like_file, 4000, 9000, 0.1, dtype="float32")
+    )
+
+    assert (compact.dtypes == np.float32).all()
+    assert (reference.dtypes == np.float64).all()
+    assert compact.memory_usage(index=False).sum() * 2 == (
+        reference.memory_usage(index=False).sum()
+    )
+    pd.testing.assert_index_equal(compact.index, reference.index)
+    # Within a few float32 ulps of float64 processing.
+    for name, rtol in [
+        ("Wavelength", 1.2e-7),
+        ("flux_corrected", 2.5e-7),
+        ("Wavelength_rest", 2.5e-7),
+    ]:
+        np.testing.assert_allclose(compact[name], reference[name], rtol=rtol)
+    # Normalized values are O(1): the error is absolute.
+    np.testing.assert_allclose(compact["flux"], reference["flux"], atol=1e-6)
+
+
+def test_float32_policy_drift_with_a_missing_pixel(sdss_like_file):
+    frames = []
+    for dtype in (None, "float64", "float32"):
+        data_processor = DataPreprocessing(
+            sdss_like_file, 4000, 9000, 0.1, dtype=dtype
+        )
+        data_processor.df.loc[1000, "flux"] = np.nan
+        frames.append(preprocess(data_processor))
+    unset, reference, compact = frames
+
+    # One missing pixel does not turn the whole column into NaN.
+    assert reference["flux"].isna().sum() == compact["flux"].isna().sum() == 1
+    np.testing.assert_allclose(reference["flux"], unset["flux"], atol=1e-6)
+    np.testing.assert_allclose(compact["flux"], reference["flux"], atol=1e-6)
+
+
+def test_float32_policy_csv_and_interpolate(tmp_path):
+    path = str(tmp_path / "spectrum.csv")
+    pd.DataFrame(
+        {"Wavelength": np.linspace(4000, 5000, 50), "Flux": np.arange(50.0)}
+    ).to_csv(path, index=False)
+    data_processor = DataPreprocessing(path, 4000, 5000, dtype=np.float32)
+    assert (data_processor.df.dtypes == np.float32).all()
+    data_processor.interpolate(np.linspace(4100, 4900, 20))
+    assert (data_processor.df.dtypes == np.float32).all()
+    # The policy applies to columns parsed with an explicit dtype too.
+    data_processor.read_data(path, csv_dtype={"Flux": np.float64})
+    assert (data_processor.df.dtypes == np.float32).all()
+
+    with pytest.raises(ValueError, match="floating-point"):
+        DataPreprocessing(path, 4000, 5000, dtype=np.int32)
+
+
+def test_batch_float32_drift(sdss_like_file):
+    batches = [
+        SpectrumBatch.from_files(
+            [sdss_like_file] * 3, 4000, 9000, redshift=0.1, dtype=dtype
+        )
+        for dtype in (np.float64, np.float32)
+    ]
+    for batch in batches:
+        batch.columns["flux"][1, 1000] = np.nan
+        batch.wave_align("Wavelength", "LOGLAM")
+        batch.correct_redshift("Wavelength", "flux")
+        batch.normalize_column("flux")
+        batch.to_rest_frame("Wavelength", "flux", "ivar")
+    reference, compact = batches
+
+    np.testing.assert_array_equal(compact.mask, reference.mask)
+    for name, values in compact.columns.items():
+        assert values.dtype == np.float32
+        assert values.nbytes * 2 == reference.columns[name].nbytes
+    np.testing.assert_allclose(
+        compact.columns["Wavelength"],
+        reference.columns["Wavelength"],
+        rtol=1.2e-7,
+    )
+    np.testing.assert_allclose(
+        compact.columns["flux_corrected"],
+        reference.columns["flux_corrected"],
+        rtol=2.5e-7,
+    )
+    np.testing.assert_allclose(
+        np.where(compact.mask, compact.columns["flux"], 0),
+        np.where(reference.mask, reference.columns["flux"], 0),
+        atol=1e-6,
+    )
+    # The missing pixel does not spread over its spectrum.
+    assert np.isnan(compact.columns["flux"][compact.mask]).sum() == 1
+
+    compact.resample(np.linspace(4500, 8500, 1000), columns=["flux"])
+    assert all(
+        values.dtype == np.float32 for values in compact.columns.values()
+    )
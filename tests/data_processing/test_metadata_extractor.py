@@ -1,10 +1,14 @@
+import re
+
+import numpy as np
 import pandas as pd
 import pytest
 from astropy.io import fits
 from astropy.table import Table
 from astroquery.sdss import SDSS
 
-from astrolibrary import MetaDataExtractor
+from astrolibrary import BatchMetaDataExtractor, MetaDataExtractor
+from astrolibrary.data_processing import metadata_extractor
 
 # Load the FITS file
 FITS_FILE_PATH = "tests/data_processing/dr18webexample.fits"
@@ -31,6 +35,13 @@ data = {
 }
 
 mocked_sdss_data = Table(data)
+data_row = {name: values[0] for name, values in data.items()}
+
+
+@pytest.fixture(autouse=True)
+def fresh_shared_batch(monkeypatch):
+    """Keeps spectra resolved by one test from serving the others."""
+    monkeypatch.setattr(metadata_extractor, "_shared_batch", None)
 
 
 @pytest.fixture
@@ -87,6 +98,21 @@ def test_query_handler_mocked_response(fits_extractor, monkeypatch):
     assert result is None or result.empty
 
 
+def test_queried_metadata_are_scalars(fits_extractor, monkeypatch):
+    monkeypatch.setattr(SDSS, "query_sql", lambda x: mocked_sdss_data)
+    assert fits_extractor.get_class_of_object() == "GALAXY"
+    assert fits_extractor.get_redshift() == pytest.approx(0.03212454)
+
+
+@pytest.mark.parametrize("results", [None, mocked_sdss_data[:0]])
+def test_no_queried_row(fits_extractor, monkeypatch, results):
+    monkeypatch.setattr(SDSS, "query_sql", lambda x: results)
+    with pytest.raises(ValueError, match="SDSS has no metadata"):
+        fits_extractor.get_class_of_object()
+    with pytest.raises(ValueError, match="SDSS has no metadata"):
+        fits_extractor.get_redshift()
+
+
 def test_extract_more_metadata_exception_handling(fits_extractor, monkeypatch):
     def mock_query_exception(query):
         raise Exception("Mocked query exception")
@@ -99,3 +125,215 @@ def test_extract_more_metadata_exception_handling(fits_extractor, monkeypatch):
 def test_invalid_file_path():
     with pytest.raises(FileNotFoundError):
         MetaDataExtractor("nonexistent/path/to/file.fits")
+
+
+def test_extract_more_metadata_is_memoized(fits_extractor, monkeypatch):
+    queries = []
+
+    def query_sql(query):
+        queries.append(query)
+        return mocked_sdss_data
+
+    monkeypatch.setattr(SDSS, "query_sql", query_sql)
+    fits_extractor.get_redshift()
+    fits_extractor.get_class_of_object()
+    fits_extractor.get_redshift()
+    assert len(queries) == 1
+
+
+def fake_skyserver(queries):
+    """Fakes SDSS.query_sql, answering for every fiber but the last ones."""
+
+    def query_sql(query):
+        queries.append(query)
+        rows = []
+        for plate, mjd, fibers in re.findall(
+            r"s\.plate = (\d+) AND s\.mjd = (\d+) "
+            r"AND s\.fiberid IN \(([^)]*)\)",
+            query,
+        ):
+            for fiber in map(int, fibers.split(",")):
+                if fiber < 900:
+                    rows.append(
+                        {
+                            **data_row,
+                            "plate": int(plate),
+                            "mjd": int(mjd),
+                            "fiberid": fiber,
+                            "redshift": fiber / 1000,
+                        }
+                    )
+        return Table(rows=rows) if rows else None
+
+    return query_sql
+
+
+def test_batch_extractor_resolves_in_chunks(monkeypatch):
+    queries = []
+    monkeypatch.setattr(SDSS, "query_sql", fake_skyserver(queries))
+    keys = [(382, 51816, fiber) for fiber in range(1, 11)] + [(266, 51630, 5)]
+    extractor = BatchMetaDataExtractor(keys=keys, chunk_size=4)
+
+    assert extractor.get_redshift((382, 51816, 3)) == 0.003
+    assert len(queries) == 3
+    assert extractor.n_queries == 3
+
+    # Every accessor is now served from memory.
+    for key in keys:
+        assert extractor.get_class_of_object(key) == "GALAXY"
+    assert extractor.get_photometry((266, 51630, 5))["r"] == data["r"][0]
+    assert len(queries) == 3
+    assert len(extractor.to_dataframe()) == 11
+
+
+def test_batch_extractor_memoizes_missing_keys(monkeypatch):
+    queries = []
+    monkeypatch.setattr(SDSS, "query_sql", fake_skyserver(queries))
+    extractor = BatchMetaDataExtractor()
+
+    assert extractor.get((382, 51816, 901)) is None
+    assert extractor.get_redshift((382, 51816, 901)) is None
+    assert len(queries) == 1
+
+
+def test_batch_extractor_retries_failed_chunks(monkeypatch):
+    def mock_query_error(query):
+        raise ValueError("Mocked query exception")
+
+    queries = []
+    monkeypatch.setattr(SDSS, "query_sql", mock_query_error)
+    extractor = BatchMetaDataExtractor(keys=[(382, 51816, 1)])
+    with pytest.raises(Exception):
+        extractor.resolve()
+
+    monkeypatch.setattr(SDSS, "query_sql", fake_skyserver(queries))
+    assert extractor.get_redshift((382, 51816, 1)) == 0.001
+
+
+def test_batch_extractor_keeps_chunks_after_a_failed_one(monkeypatch):
+    queries = []
+    answer = fake_skyserver(queries)
+
+    def query_sql(query):
+        if "s.fiberid IN (5, 6)" in query:
+            raise ValueError("Mocked query exception")
+        return answer(query)
+
+    monkeypatch.setattr(SDSS, "query_sql", query_sql)
+    keys = [(382, 51816, fiber) for fiber in range(1, 9)]
+    extractor = BatchMetaDataExtractor(keys=keys, chunk_size=2)
+    with pytest.raises(ValueError, match="Mocked"):
+        extractor.resolve()
+    assert len(queries) == 3
+    assert sorted(extractor._records) == keys[:4] + keys[6:]
+    assert extractor._pending == keys[4:6]
+
+    monkeypatch.setattr(SDSS, "query_sql", answer)
+    assert len(extractor.resolve()) == 8
+    assert len(queries) == 4
+    assert extractor.get_redshift((382, 51816, 8)) == 0.008
+
+
+def test_batch_extractor_keys_from_files(tmp_path):
+    header = fits.Header({"PLATEID": 7644, "MJD": 57327, "FIBERID": 528})
+    path = str(tmp_path / "spec-7644-57327-0528.fits")
+    fits.PrimaryHDU(header=header).writeto(path)
+    extractor = BatchMetaDataExtractor(file_paths=[path])
+    assert extractor._pending == [(7644, 57327, 528)]
+
+    assert BatchMetaDataExtractor.key_from_file(
+        write_spec_file(tmp_path / "spec.fits")
+    ) == (7644, 57327, 528)
+    with pytest.raises(ValueError):
+        BatchMetaDataExtractor(file_paths=[FITS_FILE_PATH])
+    with pytest.raises(ValueError):
+        BatchMetaDataExtractor(chunk_size=0)
+
+
+def mock_query_forbidden(query):
+    raise AssertionError("No query should reach SDSS.")
+
+
+def write_spec_file(path, specobj_columns=("CLASS", "Z")):
+    """Writes a small SDSS-like spec file: coadd in HDU 1, SpecObj in HDU 2."""
+    header = fits.Header(
+        {
+            "PLATEID": 7644,
+            "MJD": 57327,
+            "FIBERID": 528,
+            "PLUG_RA": 150.5,
+            "PLUG_DEC": 2.25,
+        }
+    )
+    coadd = fits.BinTableHDU(
+        Table({"loglam": np.linspace(3.6, 4.0, 4000), "flux": np.ones(4000)})
+    )
+    specobj = {
+        "PLATE": [7644],
+        "MJD": [57327],
+        "FIBERID": [528],
+        "CLASS": ["QSO   "],
+        "Z": [np.float32(2.5)],
+    }
+    specobj = {name: specobj[name] for name in ("PLATE",) + specobj_columns}
+    fits.HDUList(
+        [
+            fits.PrimaryHDU(header=header),
+            coadd,
+            fits.BinTableHDU(Table(specobj)),
+        ]
+    ).writeto(path)
+    return str(path)
+
+
+def test_offline_metadata_needs_no_query(tmp_path, monkeypatch):
+    path = write_spec_file(tmp_path / "spec-7644-57327-0528.fits")
+    monkeypatch.setattr(SDSS, "query_sql", mock_query_forbidden)
+
+    with MetaDataExtractor(path) as extractor:
+        assert extractor.get_class_of_object() == "QSO"
+        assert extractor.get_redshift() == pytest.approx(2.5)
+        assert extractor.get_coordinates() == (150.5, 2.25)
+        assert extractor.get_offline_metadata()["fiberid"] == 528
+        # The flux table was never turned into a dataframe.
+        assert extractor._df is None
+        assert len(extractor.df) == 4000
+
+
+def test_missing_offline_fields_fall_back_to_query(tmp_path, monkeypatch):
+    path = write_spec_file(tmp_path / "spec.fits", specobj_columns=("CLASS",))
+    queries = []
+    key = {"plate": 7644, "mjd": 57327, "fiberid": 528}
+
+    def query_sql(query):
+        queries.append(query)
+        return Table(rows=[{**data_row, **key}])
+
+    monkeypatch.setattr(SDSS, "query_sql", query_sql)
+    with MetaDataExtractor(path) as extractor:
+        assert extractor.get_class_of_object() == "QSO"
+        assert not queries
+        assert extractor.get_redshift() == pytest.approx(0.03212454)
+        assert "s.fiberid IN (528)" in queries[0]
+
+
+def test_extractors_share_resolved_spectra(tmp_path, monkeypatch):
+    queries = []
+    monkeypatch.setattr(SDSS, "query_sql", fake_skyserver(queries))
+    paths = [
+        write_spec_file(tmp_path / f"spec-{i}.fits", specobj_columns=())
+        for i in range(3)
+    ]
+    for path in paths:
+        with MetaDataExtractor(path) as extractor:
+            assert extractor.get_redshift() == pytest.approx(0.528)
+    # One query, by one handler, for the spectrum of every file.
+    assert len(queries) == 1
+    assert metadata_extractor._default_batch().n_queries == 1
+
+    batch = BatchMetaDataExtractor(keys=[(7644, 57327, 528)])
+    batch.resolve()
+    with MetaDataExtractor(paths[0], batch=batch) as extractor:
+        assert extractor.get_class_of_object() == "GALAXY"
+    assert batch.n_queries == 1
+    assert len(queries) == 2
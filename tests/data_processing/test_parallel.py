@@ -0,0 +1,143 @@
+"""
+This test suite (a module) runs tests for data_processing/parallel.py module.
+"""
+import os
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from astrolibrary import (
+    DataPreprocessing,
+    PreprocessingPipeline,
+    preprocess_files,
+)
+from astrolibrary.data_processing import parallel
+
+N_FILES = 12
+grid = np.linspace(4000, 8000, 500)
+
+
+@pytest.fixture
+def spectra_dir(tmp_path):
+    """A directory of FITS spectra of different lengths, and a bad file."""
+    directory = tmp_path / "spectra"
+    directory.mkdir()
+    rng = np.random.default_rng(0)
+    for index in range(N_FILES):
+        n_pixels = 3000 + 100 * index
+        loglam = 3.58 + 1e-4 * np.arange(n_pixels)
+        table = fits.BinTableHDU.from_columns(
+            [
+                fits.Column(name="LOGLAM", format="E", array=loglam),
+                fits.Column(
+                    name="FLUX", format="E", array=rng.normal(size=n_pixels)
+                ),
+            ]
+        )
+        fits.HDUList([fits.PrimaryHDU(), table]).writeto(
+            directory / f"spec-{index:04d}.fits"
+        )
+    (directory / "spec-bad.csv").write_text("not,a\nspectrum")
+    return directory
+
+
+def test_parallel_results_match_serial_ones(spectra_dir, tmp_path):
+    pipeline = (
+        PreprocessingPipeline(4000, 8000)
+        .wave_align()
+        .interpolate(grid, columns=["FLUX"])
+    )
+    progress = []
+    batch, manifest = preprocess_files(
+        spectra_dir,
+        pipeline,
+        tmp_path / "out",
+        ["FLUX"],
+        max_workers=2,
+        chunk_size=5,
+        progress=lambda done, total: progress.append((done, total)),
+    )
+
+    # One call per chunk of 5 files.
+    assert len(progress) == 3 and progress[-1] == (13, 13)
+    assert batch.columns["FLUX"].shape == (N_FILES + 1, len(grid))
+    assert [entry["status"] for entry in manifest] == ["done"] * N_FILES + [
+        "error"
+    ]
+    assert manifest[-1]["error"].startswith("ValueError")
+    assert not batch.mask[-1].any()
+
+    for row in (0, N_FILES - 1):
+        serial = DataPreprocessing(manifest[row]["path"], 4000, 8000)
+        serial.wave_align()
+        serial.interpolate(grid, columns=["FLUX"])
+        np.testing.assert_array_equal(
+            batch.columns["FLUX"][row], serial.df["FLUX"]
+        )
+
+    # The outputs are memory-mapped files, which can be opened again.
+    flux = np.load(tmp_path / "out" / "FLUX.npy", mmap_mode="r")
+    np.testing.assert_array_equal(flux, batch.columns["FLUX"])
+    lengths = np.load(tmp_path / "out" / "lengths.npy")
+    assert list(lengths) == [len(grid)] * N_FILES + [0]
+
+
+def test_manifest_input_and_padding(spectra_dir, tmp_path):
+    manifest = [
+        {"path": str(spectra_dir / "spec-0000.fits"), "status": "downloaded"},
+        {"path": None, "status": "error"},
+        {"path": str(spectra_dir / "spec-0001.fits"), "status": "skipped"},
+    ]
+    batch, results = preprocess_files(
+        manifest, None, tmp_path / "out", ["LOGLAM"], 3100, max_workers=1
+    )
+    assert list(batch.lengths) == [3000, 3100]
+    assert np.isnan(batch.columns["LOGLAM"][0, 3000:]).all()
+    np.testing.assert_allclose(
+        batch.spectrum(1)["LOGLAM"], 3.58 + 1e-4 * np.arange(3100), rtol=1e-6
+    )
+
+    _, results = preprocess_files(
+        manifest, None, tmp_path / "out", ["LOGLAM"], 3050, max_workers=1
+    )
+    assert [entry["status"] for entry in results] == ["done", "error"]
+    assert "more than 3050" in results[1]["error"]
+
+
+def crash_worker(*args):
+    os._exit(1)
+
+
+def test_broken_pool_fails_the_remaining_files(
+    spectra_dir, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(parallel, "_process_chunk", crash_worker)
+    progress = []
+    batch, manifest = preprocess_files(
+        spectra_dir,
+        None,
+        tmp_path / "out",
+        ["FLUX"],
+        10,
+        max_workers=1,
+        chunk_size=2,
+        progress=lambda done, total: progress.append(done),
+    )
+    assert progress[-1] == N_FILES + 1
+    assert {entry["status"] for entry in manifest} == {"error"}
+    assert all(
+        entry["error"].startswith("BrokenProcessPool") for entry in manifest
+    )
+    assert not batch.mask.any()
+
+
+def test_invalid_arguments(spectra_dir, tmp_path):
+    with pytest.raises(ValueError):  # No interpolation, nor n_pixels.
+        preprocess_files(spectra_dir, None, tmp_path, ["FLUX"])
+    with pytest.raises(ValueError):
+        preprocess_files(
+            spectra_dir / "spec-0000.fits", None, tmp_path, ["FLUX"], 10
+        )
+    with pytest.raises(ValueError):
+        preprocess_files(spectra_dir, None, tmp_path, ["FLUX"], 10, 0)
@@ -0,0 +1,127 @@
+"""
+This test suite (a module) runs tests for data_processing/pipeline.py module.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from astrolibrary import DataPreprocessing, PreprocessingPipeline
+
+N_PIXELS = 1000
+STEPS = [
+    ("remove_outliers_column", ("Flux",)),
+    ("normalize_column", ("Flux",)),
+    ("correct_redshift", ("Wavelength", "Flux")),
+    ("wave_align", ()),
+]
+
+
+@pytest.fixture
+def spectrum_file(tmp_path):
+    rng = np.random.default_rng(0)
+    flux = rng.normal(size=N_PIXELS)
+    flux[[5, 500]] = [100, -100]
+    path = str(tmp_path / "spectrum.csv")
+    pd.DataFrame(
+        {
+            "LOGLAM": np.linspace(3.55, 4.0, N_PIXELS),
+            "Flux": flux,
+            "Wavelength": np.linspace(3000, 10000, N_PIXELS),
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+def run_eagerly(file_path, steps):
+    data_processor = DataPreprocessing(file_path, 4000, 9000, redshift=0.5)
+    for name, arguments in steps:
+        getattr(data_processor, name)(*arguments)
+    return data_processor.df
+
+
+def build(steps):
+    pipeline = PreprocessingPipeline(4000, 9000, redshift=0.5)
+    for name, arguments in steps:
+        getattr(pipeline, name)(*arguments)
+    return pipeline
+
+
+@pytest.mark.parametrize(
+    "steps", [STEPS, STEPS[::-1], STEPS[2:] + STEPS[:2], STEPS[1:2]]
+)
+def test_same_results_as_eager_steps(spectrum_file, steps):
+    pd.testing.assert_frame_equal(
+        build(steps).run(spectrum_file), run_eagerly(spectrum_file, steps)
+    )
+
+
+def test_window_is_pushed_ahead_of_row_wise_transforms(spectrum_file):
+    pipeline = build(STEPS[2:] + STEPS[:2])
+    pipeline.run(spectrum_file)
+    plan = pipeline.explain().splitlines()
+    assert plan == [
+        "1. wave_align(Wavelength, [4000, 9000]) [filter] (pushed ahead of "
+        "wavelengths(LOGLAM), correct_redshift(Wavelength, Flux))",
+        "2. gather the rows kept [compact]",
+        "3. correct_redshift(Wavelength, Flux) [transform]",
+        "4. wavelengths(LOGLAM) [transform]",
+        "5. remove_outliers_column(Flux) [statistic]",
+        "6. normalize_column(Flux) [statistic]",
+        "7. gather the rows kept [compact]",
+        "DataFrame copies: 2 eager, 2 fused (0 eliminated).",
+    ]
+
+
+def test_filters_are_not_pushed_ahead_of_statistics(spectrum_file):
+    pipeline = build(STEPS)
+    assert pipeline.explain(spectrum_file).splitlines() == [
+        "1. remove_outliers_column(Flux) [statistic]",
+        "2. normalize_column(Flux) [statistic]",
+        "3. wave_align(Wavelength, [4000, 9000]) [filter] (pushed ahead of "
+        "wavelengths(LOGLAM), correct_redshift(Wavelength, Flux))",
+        "4. gather the rows kept [compact]",
+        "5. correct_redshift(Wavelength, Flux) [transform]",
+        "6. wavelengths(LOGLAM) [transform]",
+        "DataFrame copies: 2 eager, 1 fused (1 eliminated).",
+    ]
+
+
+def test_gathered_columns_are_normalized_in_place(spectrum_file):
+    pipeline = build([STEPS[3], STEPS[1]])
+    df = pipeline.run(spectrum_file)
+    assert df["Flux"].mean() == pytest.approx(0)
+    assert df["Flux"].std(ddof=0) == pytest.approx(1)
+    assert pipeline.explain().splitlines()[-1] == (
+        "DataFrame copies: 1 eager, 1 fused (0 eliminated)."
+    )
+
+
+def test_run_on_a_data_processor(spectrum_file):
+    data_processor = DataPreprocessing(spectrum_file, 4000, 9000)
+    pipeline = PreprocessingPipeline(4000, 9000).remove_outliers_column("Flux")
+    df = pipeline.run(data_processor)
+    assert data_processor.df is df
+
+    eager = DataPreprocessing(spectrum_file, 4000, 9000)
+    bounds = eager.remove_outliers_column("Flux")
+    assert pipeline.bounds["Flux"] == bounds
+    pd.testing.assert_frame_equal(df, eager.df)
+
+
+def test_interpolate(spectrum_file):
+    grid = np.linspace(4000, 9000, 100)
+    steps = [("wave_align", ()), ("interpolate", (grid,))]
+    pd.testing.assert_frame_equal(
+        build(steps).run(spectrum_file), run_eagerly(spectrum_file, steps)
+    )
+
+
+def test_invalid_pipelines(spectrum_file):
+    with pytest.raises(ValueError):
+        build([("normalize_column", ("Nonexistent",))]).run(spectrum_file)
+    with pytest.raises(ValueError):
+        build([("correct_redshift", ("Wavelength", "Nonexistent"))]).run(
+            spectrum_file
+        )
+    with pytest.raises(ValueError):
+        build(STEPS).explain()
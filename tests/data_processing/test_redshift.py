@@ -0,0 +1,131 @@
+"""
+This test suite (a module) runs tests for data_processing/redshift.py module.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from astropy import units as u
+from astropy.cosmology import WMAP9, Planck18
+
+from astrolibrary import DataPreprocessing, SpectrumBatch
+from astrolibrary.data_processing.redshift import (
+    distance_table,
+    luminosity_density,
+    luminosity_distance,
+    to_rest_frame,
+)
+
+redshifts = np.random.default_rng(0).uniform(0, 7, 100_000)
+
+
+def test_luminosity_distances_match_astropy():
+    expected = WMAP9.luminosity_distance(redshifts[:1000]).to_value(u.Mpc)
+    np.testing.assert_allclose(
+        luminosity_distance(redshifts[:1000]), expected, rtol=1e-9
+    )
+    assert luminosity_distance(0.0) == 0.0
+    assert np.ndim(luminosity_distance(0.5)) == 0
+
+    # Redshifts outside of the table are computed by astropy.
+    outside = np.array([-1e-4, 12.0])
+    np.testing.assert_allclose(
+        luminosity_distance(outside),
+        WMAP9.luminosity_distance(outside).to_value(u.Mpc),
+    )
+
+
+def test_tables_are_cached_per_cosmology():
+    assert distance_table() is distance_table(WMAP9)
+    assert distance_table(Planck18) is not distance_table(WMAP9)
+    np.testing.assert_allclose(
+        luminosity_distance(1.0, Planck18),
+        Planck18.luminosity_distance(1.0).to_value(u.Mpc),
+    )
+
+
+def test_many_distances_are_read_from_the_table(monkeypatch):
+    distance_table()
+
+    def integrate(self, z):
+        raise AssertionError("the table should not integrate again")
+
+    monkeypatch.setattr(type(WMAP9), "luminosity_distance", integrate)
+    distances = luminosity_distance(redshifts)
+    assert distances.shape == redshifts.shape
+    assert np.all(np.diff(distances[np.argsort(redshifts)]) >= 0)
+
+
+def test_to_rest_frame_per_spectrum():
+    wavelength = np.array([4000.0, 5000, 6000])
+    flux = np.array([[1.0, 2, 3], [4, 5, 6]])
+    ivar = np.ones_like(flux)
+    rest_wavelength, rest_flux, rest_ivar = to_rest_frame(
+        wavelength, flux, [0.0, 1.0], ivar=ivar
+    )
+    np.testing.assert_allclose(rest_wavelength, [wavelength, wavelength / 2])
+    np.testing.assert_allclose(rest_flux, [flux[0], flux[1] * 2])
+    np.testing.assert_allclose(rest_ivar, [[1, 1, 1], [0.25, 0.25, 0.25]])
+
+    # The flux integrated over the spectrum is unchanged.
+    np.testing.assert_allclose(
+        np.trapezoid(rest_flux[1], rest_wavelength[1]),
+        np.trapezoid(flux[1], wavelength),
+    )
+
+
+def test_luminosity_density_units():
+    flux = np.array([[1.0, 2.0]])
+    z = 0.1
+    distance = WMAP9.luminosity_distance(z)
+    flux_unit = u.erg / u.s / u.cm**2 / u.AA
+    luminosity = 4 * np.pi * distance**2 * (1 + z) * flux * 1e-17 * flux_unit
+    expected = luminosity.to_value(u.erg / u.s / u.AA)
+    np.testing.assert_allclose(luminosity_density(flux, [z]), expected)
+    np.testing.assert_allclose(
+        luminosity_density(flux, z, flux_unit=flux_unit),
+        expected * 1e17,
+    )
+
+
+def test_data_preprocessing_to_rest_frame():
+    data_processor = DataPreprocessing.__new__(DataPreprocessing)
+    data_processor.redshift = 1.0
+    data_processor.dtype = None
+    data_processor.df = pd.DataFrame(
+        {
+            "Wavelength": [4000.0, 6000.0],
+            "Flux": [1.0, 2.0],
+            "IVAR": [4.0, 4.0],
+        }
+    )
+    data_processor.to_rest_frame(ivar_column="IVAR")
+    assert list(data_processor.df["Wavelength_rest"]) == [2000, 3000]
+    assert list(data_processor.df["Flux_rest"]) == [2, 4]
+    assert list(data_processor.df["IVAR_rest"]) == [1, 1]
+    with pytest.raises(ValueError):
+        data_processor.to_rest_frame(flux_column="Nonexistent")
+
+
+def test_batch_to_rest_frame():
+    n_spectra = 1000
+    batch = SpectrumBatch(
+        {
+            "Wavelength": np.tile(np.linspace(4000, 9000, 50), (n_spectra, 1)),
+            "Flux": np.ones((n_spectra, 50)),
+        },
+        4000,
+        9000,
+        redshift=redshifts[:n_spectra],
+    )
+    batch.to_rest_frame()
+    np.testing.assert_allclose(
+        batch.columns["Wavelength_rest"][:, 0], 4000 / (1 + batch.redshift)
+    )
+    np.testing.assert_allclose(
+        batch.columns["Flux_rest"][:, -1], 1 + batch.redshift
+    )
+    np.testing.assert_allclose(
+        batch.luminosity_distance(),
+        WMAP9.luminosity_distance(batch.redshift).to_value(u.Mpc),
+        rtol=1e-9,
+    )
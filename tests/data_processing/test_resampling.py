@@ -0,0 +1,111 @@
+"""
+This test suite (a module) runs tests for data_processing/resampling.py
+module.
+"""
+import numpy as np
+import pytest
+
+from astrolibrary.data_processing.resampling import (
+    clear_operator_cache,
+    fill_invalid,
+    get_operator,
+    operator_cache_info,
+    resample,
+)
+
+# An SDSS-like log-lambda grid.
+wavelength = 10 ** np.arange(3.6, 3.7, 1e-4)
+flux = np.sin(wavelength / 50)
+grid = np.linspace(4000, 5000, 300)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_operator_cache()
+
+
+def test_linear_matches_np_interp():
+    np.testing.assert_allclose(
+        resample(wavelength, flux, grid), np.interp(grid, wavelength, flux)
+    )
+
+
+def test_many_spectra_at_once():
+    fluxes = np.random.default_rng(0).normal(size=(50, len(wavelength)))
+    resampled = resample(wavelength, fluxes, grid)
+    assert resampled.shape == (50, len(grid))
+    for row in (0, 49):
+        np.testing.assert_allclose(
+            resampled[row], np.interp(grid, wavelength, fluxes[row])
+        )
+
+
+def test_pixels_outside_of_the_input_grid_are_nan():
+    resampled = resample(wavelength, flux, [3000, 4500, 9000])
+    assert np.isnan(resampled[[0, 2]]).all()
+    assert np.isfinite(resampled[1])
+
+
+def test_flux_conserving_rebinning():
+    # Rebinning pairs of pixels averages them.
+    fine = np.arange(0.0, 100)
+    coarse = fine[:-1:2] + 0.5
+    values = np.random.default_rng(1).normal(size=100)
+    rebinned = resample(fine, values, coarse, method="flux_conserving")
+    np.testing.assert_allclose(rebinned, (values[::2] + values[1::2]) / 2)
+
+    # The total flux is conserved; output pixels only partly covered by the
+    # input grid are NaN.
+    rebinned = resample(
+        fine, values, np.arange(1.0, 102, 3), "flux_conserving"
+    )
+    assert np.isnan(rebinned[-1])
+    np.testing.assert_allclose(np.sum(rebinned[:-1] * 3), np.sum(values[:99]))
+    np.testing.assert_allclose(
+        resample(
+            wavelength, np.ones_like(wavelength), grid, "flux_conserving"
+        ),
+        1.0,
+    )
+
+
+def test_invalid_pixels_are_filled_by_interpolation():
+    corrupted = flux.copy()
+    corrupted[100:120] = 1e9
+    ivar = np.ones_like(flux)
+    ivar[100:110] = 0
+    mask = np.ones(flux.shape, dtype=bool)
+    mask[110:120] = False
+    np.testing.assert_allclose(
+        resample(wavelength, corrupted, wavelength, mask=mask, ivar=ivar)[
+            100:120
+        ],
+        np.interp(wavelength[100:120], wavelength[[99, 120]], flux[[99, 120]]),
+    )
+
+
+def test_fill_invalid():
+    values = np.array([[np.nan, 1.0, 5.0, 3.0, 0.0], [1.0, 2, 3, 4, 5]])
+    valid = np.array([[True, True, False, True, False], [False] * 5])
+    filled = fill_invalid([0.0, 1, 2, 4, 5], values, valid)
+    np.testing.assert_allclose(filled[0], [1.0, 1, 5 / 3, 3, 3])
+    assert np.isnan(filled[1]).all()
+
+
+def test_operators_are_cached():
+    resample(wavelength, flux, grid)
+    resample(wavelength.copy(), flux[None], grid.copy())
+    resample(wavelength, flux, grid, method="flux_conserving")
+    assert operator_cache_info() == {"hits": 1, "misses": 2, "size": 2}
+    assert get_operator(wavelength, grid) is get_operator(wavelength, grid)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        resample(wavelength, flux, grid, method="cubic")
+    with pytest.raises(ValueError):
+        resample(wavelength[::-1], flux, grid)
+    with pytest.raises(ValueError):
+        resample(wavelength, flux[:-1], grid)
+    with pytest.raises(ValueError):
+        resample(wavelength, flux, [4000])
@@ -0,0 +1,221 @@
+"""
+This test suite (a module) runs tests for data_processing/spectral_store.py
+module.
+"""
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from astrolibrary import DataPreprocessing, SpectralStore
+from astrolibrary.data_processing import spectral_store
+
+N_FILES = 6
+COLUMNS = ["LOGLAM", "FLUX"]
+
+
+def write_spectrum(path, n_pixels, seed):
+    rng = np.random.default_rng(seed)
+    table = fits.BinTableHDU.from_columns(
+        [
+            fits.Column(
+                name="LOGLAM",
+                format="E",
+                array=3.58 + 1e-4 * np.arange(n_pixels),
+            ),
+            fits.Column(
+                name="FLUX", format="E", array=rng.normal(size=n_pixels)
+            ),
+            fits.Column(name="IVAR", format="E", array=np.ones(n_pixels)),
+        ]
+    )
+    fits.HDUList([fits.PrimaryHDU(), table]).writeto(path)
+
+
+@pytest.fixture
+def spectra_files(tmp_path):
+    """FITS spectra of different lengths, named as downloaded."""
+    paths = []
+    for index in range(N_FILES):
+        path = tmp_path / f"spec-{7000 + index}-57327-{index:04d}.fits"
+        write_spectrum(path, 1000 + 100 * index, index)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def store(tmp_path, spectra_files):
+    store = SpectralStore(tmp_path / "store", columns=COLUMNS)
+    store.ingest_files(spectra_files)
+    return store
+
+
+def test_key_from_path():
+    assert spectral_store.key_from_path("out/spec-7644-57327-0528.fits") == (
+        7644,
+        57327,
+        528,
+    )
+    with pytest.raises(ValueError):
+        spectral_store.key_from_path("spectrum.csv")
+
+
+def test_new_store_needs_columns(tmp_path):
+    with pytest.raises(ValueError, match="give its columns"):
+        SpectralStore(tmp_path / "store")
+
+
+def test_read_matches_files(store, spectra_files):
+    assert len(store) == N_FILES
+    assert store.keys()[0] == (7000, 57327, 0)
+    for index, path in enumerate(spectra_files):
+        expected = DataPreprocessing(path, -np.inf, np.inf).df
+        spectrum = store.read(7000 + index, 57327, index)
+        assert isinstance(spectrum["FLUX"], np.memmap)
+        assert not spectrum["FLUX"].flags.writeable
+        for name in COLUMNS:
+            np.testing.assert_array_equal(spectrum[name], expected[name])
+
+    df = store.get(7003, 57327, 3, columns=["FLUX"])
+    assert list(df.columns) == ["FLUX"]
+    assert len(df) == 1300
+
+
+def test_missing_spectrum_and_column(store):
+    with pytest.raises(KeyError):
+        store.read(1, 2, 3)
+    with pytest.raises(ValueError):
+        store.read(7000, 57327, 0, columns=["IVAR"])
+
+
+def test_ingest_skips_or_replaces(store, spectra_files):
+    assert store.ingest_files(spectra_files) == 0
+    assert store.ingest_file(
+        spectra_files[0], key=(7001, 57327, 1), replace=True
+    )
+    assert len(store) == N_FILES
+    np.testing.assert_array_equal(
+        store.read(7001, 57327, 1)["FLUX"], store.read(7000, 57327, 0)["FLUX"]
+    )
+
+
+def test_reopen(store, tmp_path):
+    # An interrupted ingestion left data after the last index record.
+    store.close()
+    with open(tmp_path / "store" / "FLUX.bin", "ab") as file:
+        file.write(b"\0" * 40)
+    with open(tmp_path / "store" / "index.bin", "ab") as file:
+        file.write(b"\0" * 12)
+
+    with SpectralStore(tmp_path / "store") as reopened:
+        assert reopened.append((1, 2, 3), {"LOGLAM": [3.6], "FLUX": [1.0]})
+    assert reopened.columns == store.columns
+    assert reopened.keys() == store.keys() + [(1, 2, 3)]
+    np.testing.assert_array_equal(
+        reopened.read(7005, 57327, 5)["FLUX"],
+        store.read(7005, 57327, 5)["FLUX"],
+    )
+    assert reopened.read(1, 2, 3)["FLUX"][0] == 1.0
+
+    with pytest.raises(ValueError, match="The store has columns"):
+        SpectralStore(tmp_path / "store", columns=["FLUX"])
+
+
+def test_append_checks_columns(store):
+    with pytest.raises(ValueError, match="missing"):
+        store.append((1, 2, 3), {"FLUX": [1.0]})
+    with pytest.raises(ValueError, match="differ in length"):
+        store.append((1, 2, 3), {"LOGLAM": [3.6], "FLUX": [1.0, 2.0]})
+    assert (1, 2, 3) not in store
+
+
+def test_to_batch(store):
+    keys = [(7004, 57327, 4), (7001, 57327, 1)]
+    batch = store.to_batch(keys)
+    assert batch.columns["FLUX"].shape == (2, 1400)
+    np.testing.assert_array_equal(batch.mask.sum(axis=1), [1400, 1100])
+    for row, key in enumerate(keys):
+        spectrum = store.read(*key)
+        length = len(spectrum["FLUX"])
+        np.testing.assert_array_equal(
+            batch.columns["FLUX"][row, :length], spectrum["FLUX"]
+        )
+        assert np.isnan(batch.columns["FLUX"][row, length:]).all()
+
+    batch = store.to_batch(columns=["FLUX"])
+    assert list(batch.columns) == ["FLUX"]
+    assert len(batch.columns["FLUX"]) == N_FILES
+
+
+def test_ingest_downloads(store, tmp_path, monkeypatch):
+    requested = []
+
+    def fake_bulk(identifiers, output_dir, **kwargs):
+        requested.extend(identifiers)
+        manifest = []
+        for plate, mjd, fiber in identifiers:
+            path = f"{output_dir}/spec-{plate}-{mjd}-{fiber:04d}.fits"
+            write_spectrum(path, 800, plate)
+            manifest.append(
+                {
+                    "plateid": plate,
+                    "mjd": mjd,
+                    "fiberid": fiber,
+                    "path": path,
+                    "status": "downloaded",
+                    "error": None,
+                }
+            )
+        return manifest
+
+    monkeypatch.setattr(spectral_store, "get_spectra_data_bulk", fake_bulk)
+    manifest = store.ingest_downloads([(7000, 57327, 0), (8000, 58000, 12)])
+
+    assert requested == [(8000, 58000, 12)]
+    assert manifest[0]["stored"] and manifest[0]["path"] is None
+    assert len(store.read(8000, 58000, 12)["FLUX"]) == 800
+    assert sorted(p.name for p in (tmp_path / "store").iterdir()) == [
+        "FLUX.bin",
+        "LOGLAM.bin",
+        "index.bin",
+        "store.json",
+    ]
+
+
+def test_ingest_downloads_keeps_existing_files(store, tmp_path, monkeypatch):
+    output_dir = tmp_path / "downloads"
+    output_dir.mkdir()
+    existing = output_dir / "spec-8000-58000-0012.fits"
+    write_spectrum(existing, 800, 0)
+
+    def fake_bulk(identifiers, output_dir, **kwargs):
+        corrupt = output_dir / "spec-8001-58000-0013.fits"
+        corrupt.write_bytes(b"not a FITS file")
+        return [
+            {
+                "plateid": 8000,
+                "mjd": 58000,
+                "fiberid": 12,
+                "path": str(existing),
+                "status": "skipped",
+                "error": None,
+            },
+            {
+                "plateid": 8001,
+                "mjd": 58000,
+                "fiberid": 13,
+                "path": str(corrupt),
+                "status": "downloaded",
+                "error": None,
+            },
+        ]
+
+    monkeypatch.setattr(spectral_store, "get_spectra_data_bulk", fake_bulk)
+    manifest = store.ingest_downloads(
+        [(8000, 58000, 12), (8001, 58000, 13)], output_dir=output_dir
+    )
+
+    assert manifest[0]["stored"] and manifest[0]["path"] == str(existing)
+    assert existing.exists()
+    assert not manifest[1]["stored"] and manifest[1]["status"] == "error"
+    assert manifest[1]["error"] and manifest[1]["path"] is None
+    assert list(output_dir.iterdir()) == [existing]
@@ -0,0 +1,197 @@
+"""
+This test suite (a module) runs tests for
+data_processing/streaming_statistics.py module.
+"""
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from astropy.io import fits
+
+from astrolibrary import (
+    DataPreprocessing,
+    PreprocessingPipeline,
+    StreamingStatistics,
+)
+from astrolibrary.data_processing.streaming_statistics import (
+    QuantileSketch,
+    RunningMoments,
+    iter_chunks,
+)
+
+rng = np.random.default_rng(0)
+values = rng.lognormal(size=200_000)
+
+
+def rank_error(sketch, percentile):
+    """The error on the rank of an estimated percentile, in [0, 1]."""
+    estimate = sketch.percentile(percentile)
+    return abs(np.mean(values <= estimate) - percentile / 100)
+
+
+@pytest.fixture
+def spectra_files(tmp_path):
+    """Writes `values` as the FLUX of 3 FITS files and a CSV file."""
+    paths = []
+    for index, part in enumerate(np.array_split(values, 4)):
+        if index < 3:
+            path = str(tmp_path / f"spec-{index}.fits")
+            table = fits.BinTableHDU.from_columns(
+                [
+                    fits.Column(name="FLUX", format="E", array=part),
+                    fits.Column(
+                        name="IVAR", format="E", array=np.ones(len(part))
+                    ),
+                    fits.Column(
+                        name="MODEL",
+                        format="3E",
+                        array=np.zeros((len(part), 3)),
+                    ),
+                ]
+            )
+            fits.HDUList([fits.PrimaryHDU(), table]).writeto(path)
+        else:
+            path = str(tmp_path / "spec.csv")
+            pd.DataFrame({"FLUX": part.astype(np.float32)}).to_csv(
+                path, index=False
+            )
+        paths.append(path)
+    return paths
+
+
+def test_running_moments_merge_chunks():
+    moments = RunningMoments()
+    for chunk in np.array_split(values, 7):
+        moments.merge(RunningMoments().update(chunk))
+    assert moments.count == len(values)
+    np.testing.assert_allclose(moments.mean, values.mean())
+    np.testing.assert_allclose(moments.std, values.std())
+
+    # NaN and infinite values are ignored.
+    moments.update([np.nan, np.inf])
+    assert moments.count == len(values)
+    assert np.isnan(RunningMoments().variance)
+
+
+def test_quantile_sketch_is_exact_for_few_values():
+    sketch = QuantileSketch(k=200).update(values[:100])
+    assert sketch.percentile(25) == np.percentile(values[:100], 25)
+    assert np.isnan(QuantileSketch().percentile(50))
+
+
+@pytest.mark.parametrize("percentile", [1, 25, 50, 75, 99])
+def test_quantile_sketch_error_is_bounded(percentile):
+    sketch = QuantileSketch(k=200, seed=0)
+    for chunk in np.array_split(values, 50):
+        sketch.update(chunk)
+    assert sketch.count == len(values)
+    assert sum(map(len, sketch.levels)) < 3 * 200 + 2 * len(sketch.levels)
+    assert rank_error(sketch, percentile) < 0.02
+
+
+def test_merged_sketches_across_processes():
+    parts = [
+        pickle.loads(pickle.dumps(QuantileSketch(k=200, seed=i).update(chunk)))
+        for i, chunk in enumerate(np.array_split(values, 8))
+    ]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.count == len(values)
+    assert rank_error(merged, 25) < 0.02
+    assert rank_error(merged, 75) < 0.02
+
+
+def test_statistics_from_files(spectra_files):
+    statistics = StreamingStatistics.from_files(
+        spectra_files, ["FLUX"], chunk_rows=10_000, seed=0
+    )
+    assert statistics.count("FLUX") == len(values)
+    mean, std = statistics.normalizer("FLUX")
+    np.testing.assert_allclose(mean, values.mean(), rtol=1e-6)
+    np.testing.assert_allclose(std, values.std(), rtol=1e-6)
+
+    q1, q3 = np.percentile(values, [25, 75])
+    lower, upper = statistics.outlier_bounds("FLUX")
+    np.testing.assert_allclose(
+        [lower, upper], [q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)], rtol=0.05
+    )
+    with pytest.raises(ValueError):
+        statistics.normalizer("IVAR")
+
+
+def test_partial_statistics_merge(spectra_files):
+    merged = StreamingStatistics(seed=0)
+    for path in spectra_files[:3]:
+        part = StreamingStatistics.from_files([path], seed=0)
+        merged.merge(pickle.loads(pickle.dumps(part)))
+    # Multi-dimensional columns are left out.
+    assert merged.columns == ["FLUX", "IVAR"]
+    assert merged.count("IVAR") == 3 * len(values) // 4
+    np.testing.assert_allclose(
+        merged.normalizer("FLUX")[0], values[: 3 * len(values) // 4].mean()
+    )
+
+
+def test_second_pass_applies_the_fitted_statistics(spectra_files):
+    statistics = StreamingStatistics.from_files(spectra_files, ["FLUX"])
+    lower, upper = statistics.outlier_bounds("FLUX")
+    mean, std = statistics.normalizer("FLUX")
+
+    chunks = list(
+        statistics.transform_files(
+            spectra_files,
+            normalize=["FLUX"],
+            remove_outliers=["FLUX"],
+            columns=["FLUX"],
+            chunk_rows=20_000,
+        )
+    )
+    kept = values[(values >= lower) & (values <= upper)]
+    flux = np.concatenate([chunk["FLUX"] for chunk in chunks])
+    np.testing.assert_allclose(flux, (kept - mean) / std, atol=1e-6)
+
+
+def test_data_preprocessing_with_fitted_statistics(spectra_files):
+    statistics = StreamingStatistics.from_files(spectra_files, ["FLUX"])
+    lower, upper = statistics.outlier_bounds("FLUX")
+    mean, std = statistics.normalizer("FLUX")
+
+    data_processor = DataPreprocessing(spectra_files[0], 0, 1)
+    flux = data_processor.df["FLUX"].to_numpy().astype(np.float64)
+    assert data_processor.remove_outliers_column("FLUX", statistics) == (
+        lower,
+        upper,
+    )
+    data_processor.normalize_column("FLUX", statistics)
+    kept = flux[(flux >= lower) & (flux <= upper)]
+    np.testing.assert_allclose(
+        data_processor.df["FLUX"], (kept - mean) / std, atol=1e-6
+    )
+
+    # In a pipeline, the fitted bounds make a filter, pushed ahead of the
+    # fitted normalization.
+    ivar_statistics = StreamingStatistics().update({"IVAR": [1, 3]})
+    pipeline = (
+        PreprocessingPipeline(0, 1)
+        .normalize_column("IVAR", ivar_statistics)
+        .remove_outliers_column("FLUX", statistics)
+    )
+    df = pipeline.run(spectra_files[0])
+    first_step = pipeline.explain().splitlines()[0]
+    assert first_step.startswith(
+        "1. remove_outliers_column(FLUX) [filter] (pushed ahead of"
+    )
+    assert len(df) == len(kept)
+    np.testing.assert_allclose(df["IVAR"], -1.0)
+
+
+def test_iter_chunks(spectra_files):
+    chunks = list(iter_chunks(spectra_files[0], chunk_rows=20_000))
+    assert [len(chunk["FLUX"]) for chunk in chunks] == [20_000, 20_000, 10_000]
+    assert all(chunk["FLUX"].dtype.isnative for chunk in chunks)
+    with pytest.raises(ValueError):
+        next(iter_chunks(spectra_files[0], ["MODEL"]))
+    with pytest.raises(ValueError):
+        next(iter_chunks(["spectrum.txt"]))
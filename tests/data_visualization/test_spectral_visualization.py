@@ -1,7 +1,9 @@
 import pytest
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from unittest.mock import patch
+from scipy.ndimage import uniform_filter1d
 from astrolibrary import plot
 
 def test_plot_invalid_input():
@@ -30,3 +32,29 @@ def test_plot_valid_input():
     assert isinstance(result[1], plt.Axes)
 
 
+
+def test_plot_float32():
+    wavelength = np.linspace(3600, 9000, 1000)
+    df = pd.DataFrame({'Wavelength': wavelength, 'flux': np.sin(wavelength)})
+    with patch('matplotlib.pyplot.show'):
+        fig, ax = plot(
+            df, window_size=5, dtype="float32", method="boxcar", iterations=0
+        )
+    spectrum, continuum = ax.get_lines()
+    assert np.asarray(spectrum.get_ydata()).dtype == np.float32
+    assert np.asarray(continuum.get_ydata()).dtype == np.float32
+    np.testing.assert_allclose(
+        continuum.get_ydata(), uniform_filter1d(df['flux'], size=5), atol=1e-6
+    )
+    plt.close(fig)
+
+
+def test_plot_median_continuum_ignores_lines():
+    wavelength = np.linspace(3600, 9000, 500)
+    flux = np.ones(500)
+    flux[200:205] = 50  # An emission line.
+    df = pd.DataFrame({'Wavelength': wavelength, 'flux': flux})
+    with patch('matplotlib.pyplot.show'):
+        fig, ax = plot(df, window_size=31)
+    np.testing.assert_array_equal(ax.get_lines()[1].get_ydata(), np.ones(500))
+    plt.close(fig)